@@ -0,0 +1 @@
+"""Reference backend package"""
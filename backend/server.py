@@ -0,0 +1,344 @@
+"""
+Reference Backend Server
+Self-contained implementation of BACKEND_API.md on the standard library:
+per-device FIFO command queues, SQLite persistence, ETag/304 and long-poll
+command fetches, compact (MessagePack/CBOR, gzip/zstd) uploads
+
+Usage: python3 -m backend.server [--host 0.0.0.0] [--port 8000] [--db rita.db]
+"""
+
+import json
+import math
+import re
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from backend.store import CommandError, DeviceStore
+from event_log import EventLogError
+from wire_encoding import (
+    BodyTooLarge, UnsupportedEncoding, decode_body, expand_heartbeat, expand_statuses,
+)
+
+# Longest long-poll a client may ask for with ?wait=
+MAX_WAIT = 30
+# Largest request body accepted (a batch of 50 statuses is a few KiB)
+MAX_BODY = 1024 * 1024
+# Largest event log chunk accepted (a chunk is ~128 KiB before compression)
+MAX_EVENT_CHUNK = 4 * 1024 * 1024
+
+DEVICE_ROUTE = re.compile(r"^/api/devices/([^/]+)/(commands|status|heartbeat|state|statuses|events)$")
+FLEET_ROUTE = "/api/fleet/commands"
+
+
+def _etag(seq):
+    return f'"{seq}"'
+
+
+def _parse_etag(value):
+    """Sequence number from an If-None-Match value, or None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.startswith("W/"):
+        value = value[2:]
+    try:
+        return int(value.strip('"'))
+    except ValueError:
+        return None
+
+
+def _command_body(command):
+    return {
+        "command": command["command"],
+        "params": command["params"],
+        "command_id": command["command_id"],
+    }
+
+
+class BackendHandler(BaseHTTPRequestHandler):
+    """Routes for one request; the store is shared through the server"""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "RitaBackend/1.0"
+    # Buffer headers + body into one write and send it immediately, otherwise
+    # Nagle + delayed ACK adds ~40ms to every keep-alive response
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+
+    @property
+    def store(self) -> DeviceStore:
+        return self.server.store
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    # -- helpers -------------------------------------------------------------
+
+    def _send(self, status, payload=None, headers=None):
+        body = b"" if payload is None else json.dumps(payload).encode()
+        self.send_response(status)
+        if payload is not None:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def _read_body(self, limit=MAX_BODY):
+        """The request body, or None after answering 400/413"""
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0 or length > limit:
+            # The body is left unread, so the connection can't be reused
+            self.close_connection = True
+            if length < 0:
+                self._send(400, {"error": "Invalid Content-Length"})
+            else:
+                self._send(413, {"error": f"Request bodies are limited to {limit} bytes"})
+            return None
+        return self.rfile.read(length) if length else b""
+
+    def _decoded_body(self):
+        """Decode the request body, or send 400/413/415 and return None"""
+        body = self._read_body()
+        if body is None:
+            return None
+        try:
+            return decode_body(
+                body,
+                self.headers.get("Content-Type"),
+                self.headers.get("Content-Encoding"),
+            )
+        except BodyTooLarge as e:
+            self._send(413, {"error": str(e)})
+        except UnsupportedEncoding as e:
+            self._send(415, {"error": str(e)})
+        except (ValueError, OSError, EOFError) as e:
+            self._send(400, {"error": f"Invalid body: {e}"})
+        return None
+
+    def _route(self):
+        url = urlsplit(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if url.path == FLEET_ROUTE:
+            return "fleet", None, query
+        match = DEVICE_ROUTE.match(url.path)
+        if not match:
+            return None, None, query
+        return match.group(2), match.group(1), query
+
+    # -- GET -----------------------------------------------------------------
+
+    def do_GET(self):
+        route, device_id, query = self._route()
+
+        if route == "commands":
+            self._get_commands(device_id, query)
+        elif route == "state":
+            self._send(200, self.store.snapshot(device_id))
+        elif route == "statuses":
+            try:
+                limit = max(1, min(int(query.get("limit", 100)), 1000))
+            except ValueError:
+                self._send(400, {"error": "limit must be a number"})
+                return
+            history = self.store.status_history(
+                device_id, query.get("since"), query.get("type"), limit
+            )
+            self._send(200, {"device_id": device_id, "statuses": history})
+        elif route == "events":
+            self._get_events(device_id, query)
+        elif route == "fleet":
+            self._get_fleet_commands(query)
+        else:
+            self._send(404, {"error": "Not found"})
+
+    def _get_commands(self, device_id, query):
+        client_seq = _parse_etag(self.headers.get("If-None-Match"))
+        if client_seq is None and "since" in query:
+            client_seq = _parse_etag(query["since"])
+
+        try:
+            wait = float(query.get("wait", 0))
+        except ValueError:
+            wait = 0.0
+        # nan would never reach the deadline, so it counts as no wait
+        wait = max(0.0, min(wait, MAX_WAIT)) if math.isfinite(wait) else 0.0
+
+        # Long-poll only makes sense while the client is up to date
+        if client_seq is not None and client_seq != self.store.command_seq(device_id):
+            wait = 0.0
+
+        command, seq = self.store.pop_command(device_id, wait=wait, if_seq=client_seq)
+        headers = {"ETag": _etag(seq), "X-Command-Seq": str(seq)}
+
+        if command is None and client_seq == seq:
+            self._send(304, headers=headers)
+        elif command is None:
+            self._send(200, {"command": None}, headers)
+        else:
+            self._send(200, _command_body(command), headers)
+
+    def _get_events(self, device_id, query):
+        try:
+            since = float(query["since"]) if "since" in query else None
+            until = float(query["until"]) if "until" in query else None
+            limit = max(1, min(int(query.get("limit", 1000)), 10000))
+        except ValueError:
+            self._send(400, {"error": "since and until are epoch seconds, limit a number"})
+            return
+        events = self.store.event_history(device_id, since, until, query.get("type"), limit)
+        self._send(200, {"device_id": device_id, "events": events})
+
+    def _get_fleet_commands(self, query):
+        device_ids = [d.strip() for d in query.get("devices", "").split(",") if d.strip()]
+        if not device_ids:
+            self._send(400, {"error": "devices is required"})
+            return
+
+        # Per-device sequences only grow, so their sum changes whenever any does
+        fleet_seq = lambda: sum(self.store.command_seq(d) for d in device_ids)
+
+        client_seq = _parse_etag(self.headers.get("If-None-Match"))
+        pending = any(self.store.peek_command(d) for d in device_ids)
+        if client_seq == fleet_seq() and not pending:
+            self._send(304, headers={"ETag": _etag(client_seq)})
+            return
+
+        commands = {}
+        for device_id in device_ids:
+            command, _ = self.store.pop_command(device_id)
+            commands[device_id] = _command_body(command) if command else None
+        self._send(200, {"commands": commands}, {"ETag": _etag(fleet_seq())})
+
+    # -- POST ----------------------------------------------------------------
+
+    def do_POST(self):
+        route, device_id, _ = self._route()
+
+        if route == "commands":
+            self._post_command(device_id)
+        elif route == "status":
+            self._post_status(device_id)
+        elif route == "heartbeat":
+            self._post_heartbeat(device_id)
+        elif route == "events":
+            self._post_events(device_id)
+        elif self._read_body() is not None:
+            self._send(404, {"error": "Not found"})
+
+    def _post_command(self, device_id):
+        body = self._read_body()
+        if body is None:
+            return
+        try:
+            body = json.loads(body or b"{}")
+        except ValueError:
+            self._send(400, {"error": "Invalid JSON"})
+            return
+        if not isinstance(body, dict):
+            self._send(400, {"error": "Body must be a JSON object"})
+            return
+
+        command = body.get("command")
+        params = body.get("params")
+        try:
+            self.store.enqueue_command(device_id, command, params)
+        except CommandError as e:
+            self._send(400, {"error": str(e)})
+            return
+
+        self._send(200, {
+            "ok": True,
+            "command": command,
+            "params": params,
+            "queued": self.store.queue_length(device_id),
+        })
+
+    def _post_status(self, device_id):
+        payload = self._decoded_body()
+        if payload is None:
+            return
+
+        statuses = expand_statuses(payload)
+        if not statuses or any(not isinstance(s, dict) or not s.get("status_type") for s in statuses):
+            self._send(400, {"error": "status_type is required"})
+            return
+
+        for status in statuses:
+            self.store.add_status(
+                device_id, status["status_type"], status.get("timestamp"), status.get("data")
+            )
+        self._send(200, {"ok": True, "received": len(statuses)})
+
+    def _post_events(self, device_id):
+        """One gzip chunk of the device's event log (event_log.py)"""
+        body = self._read_body(MAX_EVENT_CHUNK)
+        if body is None:
+            return
+        try:
+            records = self.store.add_event_chunk(device_id, body)
+        except EventLogError as e:
+            self._send(400, {"error": str(e)})
+            return
+        self._send(200, {"ok": True, "received": records})
+
+    def _post_heartbeat(self, device_id):
+        payload = self._decoded_body()
+        if payload is None:
+            return
+
+        heartbeat = expand_heartbeat(payload) if isinstance(payload, dict) else {}
+        self.store.set_heartbeat(
+            device_id,
+            heartbeat.get("timestamp"),
+            heartbeat.get("ip_address"),
+            heartbeat.get("locked"),
+            heartbeat.get("fingerprint_count"),
+        )
+        self._send(200, {"ok": True})
+
+
+class BackendServer(ThreadingHTTPServer):
+    """Threaded HTTP server sharing one DeviceStore"""
+
+    daemon_threads = True
+    # Thousands of devices may connect at once after a network blip
+    request_queue_size = 1024
+
+    def __init__(self, address, store: DeviceStore, verbose=False):
+        super().__init__(address, BackendHandler)
+        self.store = store
+        self.verbose = verbose
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="RITA reference backend")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--db", default="rita.db", help="SQLite file (default: rita.db)")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args()
+
+    store = DeviceStore(args.db)
+    server = BackendServer((args.host, args.port), store, args.verbose)
+    print(f"✓ Backend listening on http://{args.host}:{args.port} (db: {args.db})")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n\nShutting down...")
+    finally:
+        server.server_close()
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,525 @@
+"""
+Device Store for the reference backend
+Per-device FIFO command queues in memory, persisted to SQLite
+"""
+
+import json
+import queue
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from event_log import decode as decode_events
+
+
+COMMAND_NAMES = (
+    "unlock",
+    "lock",
+    "dispense",
+    "register_fingerprint",
+    "check_hand",
+    "unlock_and_dispense",
+    "emergency_stop",
+    "update_config",
+    "export_fingerprints",
+    "sync_fingerprints",
+    "register_fingerprint_session",
+    "upload_event_log",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS commands (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    device_id TEXT NOT NULL,
+    command TEXT NOT NULL,
+    params TEXT,
+    issued_at TEXT NOT NULL,
+    delivered_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_commands_pending
+    ON commands (device_id, id) WHERE delivered_at IS NULL;
+
+CREATE TABLE IF NOT EXISTS statuses (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    device_id TEXT NOT NULL,
+    status_type TEXT NOT NULL,
+    timestamp TEXT,
+    data TEXT,
+    received_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_statuses_device_time
+    ON statuses (device_id, received_at);
+CREATE INDEX IF NOT EXISTS idx_statuses_device_type
+    ON statuses (device_id, status_type, received_at);
+
+CREATE TABLE IF NOT EXISTS event_chunks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    device_id TEXT NOT NULL,
+    first_ts REAL,
+    last_ts REAL,
+    records INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    received_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_event_chunks_device_time
+    ON event_chunks (device_id, last_ts);
+
+CREATE TABLE IF NOT EXISTS heartbeats (
+    device_id TEXT PRIMARY KEY,
+    timestamp TEXT,
+    ip_address TEXT,
+    locked INTEGER,
+    fingerprint_count INTEGER,
+    received_at TEXT NOT NULL
+);
+"""
+
+
+class CommandError(ValueError):
+    """Command name or params failed validation"""
+
+
+def validate_command(command, params):
+    """Same rules as the Next.js store (front-end/.../store.ts)"""
+    if command not in COMMAND_NAMES:
+        raise CommandError(f"Invalid command: {command}")
+    if params is not None and not isinstance(params, dict):
+        raise CommandError("params must be an object")
+
+    params = params or {}
+    user_id = params.get("user_id")
+    if command in ("unlock", "unlock_and_dispense") and user_id is not None:
+        if not _is_int(user_id) or user_id < 1:
+            raise CommandError(f"{command} user_id must be a positive integer")
+
+    if command == "dispense":
+        _validate_dispense(params)
+
+    if command == "unlock_and_dispense":
+        dispenses = params.get("dispenses")
+        if not isinstance(dispenses, list) or not dispenses:
+            raise CommandError("unlock_and_dispense requires a non-empty dispenses list")
+        for item in dispenses:
+            _validate_dispense(item if isinstance(item, dict) else {})
+
+    if command == "update_config" and not params.get("reset"):
+        # Individual settings are checked by the Pi (config.py SCHEMA)
+        settings = params.get("settings")
+        if not isinstance(settings, dict) or not all(isinstance(v, dict) for v in settings.values()):
+            raise CommandError("update_config requires settings: {section: {setting: value}} or reset")
+
+    if command == "register_fingerprint_session":
+        count = params.get("count")
+        if not _is_int(count) or not 1 <= count <= 10:
+            raise CommandError("register_fingerprint_session requires count from 1 to 10")
+        retries = params.get("retries")
+        if retries is not None and (not _is_int(retries) or not 0 <= retries <= 5):
+            raise CommandError("register_fingerprint_session retries must be 0 to 5")
+
+    if command == "upload_event_log":
+        for key in ("since", "until"):
+            value = params.get(key)
+            if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+                raise CommandError(f"upload_event_log {key} must be epoch seconds")
+        events = params.get("events")
+        if events is not None and (not isinstance(events, list)
+                                   or not all(isinstance(e, str) for e in events)):
+            raise CommandError("upload_event_log events must be a list of event types")
+
+    if command == "export_fingerprints" and params.get("user_ids") is not None:
+        user_ids = params["user_ids"]
+        if not isinstance(user_ids, list) or not all(_is_int(i) and i >= 1 for i in user_ids):
+            raise CommandError("export_fingerprints user_ids must be a list of positive integers")
+
+    if command == "sync_fingerprints":
+        # The template store itself is checked by the Pi (hardware/templates.py)
+        templates = params.get("templates")
+        if not isinstance(templates, str) or not templates:
+            raise CommandError("sync_fingerprints requires templates (from fingerprints_exported)")
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _validate_dispense(params):
+    motor_id = params.get("motor_id")
+    segment = params.get("segment")
+    if not _is_int(motor_id) or motor_id < 0:
+        raise CommandError("dispense requires numeric motor_id")
+    if not _is_int(segment) or segment < 0:
+        raise CommandError("dispense requires numeric segment")
+
+
+def _now_iso():
+    return datetime.now().isoformat()
+
+
+class DeviceState:
+    """In-memory state for one device"""
+
+    __slots__ = ("queue", "seq", "changed", "last_status", "last_heartbeat")
+
+    def __init__(self, lock):
+        # (row id, command dict) in issue order
+        self.queue = deque()
+        # Monotonic command-slot version, served as the commands ETag
+        self.seq = 0
+        # Per-device condition so a new command only wakes that device's
+        # long-pollers, never the whole fleet
+        self.changed = threading.Condition(lock)
+        self.last_status = None
+        self.last_heartbeat = None
+
+
+class DeviceStore:
+    """
+    Command queues, status history and heartbeats for every device
+
+    Reads are served from memory (O(1) dict + deque lookups). Commands are
+    written to SQLite before they are acknowledged. Statuses and heartbeats
+    go through a background writer that commits them in groups, so a burst
+    of uploads costs one fsync per group instead of one per request.
+    """
+
+    # Max statuses/heartbeats committed per transaction by the writer
+    WRITE_BATCH = 500
+
+    def __init__(self, db_path="rita.db"):
+        """
+        Initialize store
+
+        Args:
+            db_path: SQLite file, or ":memory:" for a throwaway store
+        """
+        self.db_path = db_path
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self.db_lock = threading.Lock()
+
+        self.lock = threading.Lock()
+        self.devices = {}
+
+        self._writes = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+        self._load()
+
+    def _device(self, device_id):
+        """Get or create device state (caller holds self.lock)"""
+        state = self.devices.get(device_id)
+        if state is None:
+            state = self.devices[device_id] = DeviceState(self.lock)
+        return state
+
+    def _load(self):
+        """Restore undelivered commands and latest status/heartbeat after a restart"""
+        with self.db_lock:
+            pending = self.db.execute(
+                "SELECT id, device_id, command, params, issued_at FROM commands "
+                "WHERE delivered_at IS NULL ORDER BY id"
+            ).fetchall()
+            heartbeats = self.db.execute(
+                "SELECT device_id, timestamp, ip_address, locked, fingerprint_count, received_at "
+                "FROM heartbeats"
+            ).fetchall()
+            statuses = self.db.execute(
+                "SELECT s.device_id, s.status_type, s.timestamp, s.data, s.received_at "
+                "FROM statuses s JOIN (SELECT device_id, MAX(id) AS id FROM statuses "
+                "GROUP BY device_id) latest ON s.id = latest.id"
+            ).fetchall()
+
+        with self.lock:
+            for row_id, device_id, command, params, issued_at in pending:
+                self._device(device_id).queue.append((row_id, {
+                    "command_id": str(row_id),
+                    "command": command,
+                    "params": json.loads(params) if params else None,
+                    "issuedAt": issued_at,
+                }))
+            for device_id, timestamp, ip, locked, count, received_at in heartbeats:
+                self._device(device_id).last_heartbeat = {
+                    "device_id": device_id,
+                    "timestamp": timestamp,
+                    "ip_address": ip,
+                    "locked": None if locked is None else bool(locked),
+                    "fingerprint_count": count,
+                    "receivedAt": received_at,
+                }
+            for device_id, status_type, timestamp, data, received_at in statuses:
+                self._device(device_id).last_status = {
+                    "device_id": device_id,
+                    "status_type": status_type,
+                    "timestamp": timestamp,
+                    "data": json.loads(data) if data else {},
+                    "receivedAt": received_at,
+                }
+
+    # -- commands ------------------------------------------------------------
+
+    def enqueue_command(self, device_id, command, params=None):
+        """
+        Validate and queue a command (FIFO, never overwrites)
+
+        Returns:
+            The queued command dict
+        """
+        validate_command(command, params)
+        issued_at = _now_iso()
+
+        with self.db_lock:
+            cursor = self.db.execute(
+                "INSERT INTO commands (device_id, command, params, issued_at) VALUES (?, ?, ?, ?)",
+                (device_id, command, json.dumps(params) if params is not None else None, issued_at)
+            )
+            self.db.commit()
+            row_id = cursor.lastrowid
+
+        entry = {"command_id": str(row_id), "command": command, "params": params,
+                 "issuedAt": issued_at}
+        with self.lock:
+            state = self._device(device_id)
+            state.queue.append((row_id, entry))
+            state.seq += 1
+            state.changed.notify_all()
+        return entry
+
+    def pop_command(self, device_id, wait=0.0, if_seq=None):
+        """
+        Take the oldest queued command for a device
+
+        The command is marked delivered in the database before it is
+        returned, so a restart never hands it out a second time (a
+        repeated dispense would drop a second pill).
+
+        Args:
+            wait: Seconds to long-poll for a command if the queue is empty
+            if_seq: Only wait while the device's sequence still equals this
+                    (the client's ETag); a changed sequence returns at once
+
+        Returns:
+            (command dict or None, current sequence number)
+        """
+        deadline = time.monotonic() + wait
+        with self.lock:
+            state = self._device(device_id)
+            while not state.queue:
+                if if_seq is not None and state.seq != if_seq:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                state.changed.wait(remaining)
+
+            if not state.queue:
+                return None, state.seq
+
+            row_id, entry = state.queue.popleft()
+            state.seq += 1
+            seq = state.seq
+
+        with self.db_lock:
+            self.db.execute(
+                "UPDATE commands SET delivered_at = ? WHERE id = ?", (_now_iso(), row_id)
+            )
+            self.db.commit()
+        return entry, seq
+
+    def peek_command(self, device_id):
+        with self.lock:
+            state = self.devices.get(device_id)
+            return state.queue[0][1] if state and state.queue else None
+
+    def command_seq(self, device_id):
+        with self.lock:
+            state = self.devices.get(device_id)
+            return state.seq if state else 0
+
+    def queue_length(self, device_id):
+        with self.lock:
+            state = self.devices.get(device_id)
+            return len(state.queue) if state else 0
+
+    # -- statuses and heartbeats ---------------------------------------------
+
+    def add_status(self, device_id, status_type, timestamp=None, data=None):
+        status = {
+            "device_id": device_id,
+            "status_type": status_type,
+            "timestamp": timestamp,
+            "data": data or {},
+            "receivedAt": _now_iso(),
+        }
+        with self.lock:
+            self._device(device_id).last_status = status
+        self._writes.put(("status", status))
+        return status
+
+    def set_heartbeat(self, device_id, timestamp=None, ip_address=None, locked=None,
+                      fingerprint_count=None):
+        heartbeat = {
+            "device_id": device_id,
+            "timestamp": timestamp,
+            "ip_address": ip_address,
+            "locked": locked,
+            "fingerprint_count": fingerprint_count,
+            "receivedAt": _now_iso(),
+        }
+        with self.lock:
+            self._device(device_id).last_heartbeat = heartbeat
+        self._writes.put(("heartbeat", heartbeat))
+        return heartbeat
+
+    def status_history(self, device_id, since=None, status_type=None, limit=100):
+        """Statuses for a device, newest first (served from the indexed table)"""
+        self.flush()
+        query = "SELECT status_type, timestamp, data, received_at FROM statuses WHERE device_id = ?"
+        args = [device_id]
+        if status_type:
+            query += " AND status_type = ?"
+            args.append(status_type)
+        if since:
+            query += " AND received_at > ?"
+            args.append(since)
+        query += " ORDER BY received_at DESC LIMIT ?"
+        args.append(limit)
+
+        with self.db_lock:
+            rows = self.db.execute(query, args).fetchall()
+        return [
+            {
+                "device_id": device_id,
+                "status_type": status_type,
+                "timestamp": timestamp,
+                "data": json.loads(data) if data else {},
+                "receivedAt": received_at,
+            }
+            for status_type, timestamp, data, received_at in rows
+        ]
+
+    # -- event logs ----------------------------------------------------------
+
+    def add_event_chunk(self, device_id, data):
+        """
+        Store one uploaded event log chunk (compressed, as received)
+
+        Raises:
+            event_log.EventLogError: not an event log chunk
+
+        Returns:
+            Number of events in the chunk
+        """
+        events = decode_events(data)
+        times = [event["t"] for event in events]
+        with self.db_lock:
+            self.db.execute(
+                "INSERT INTO event_chunks (device_id, first_ts, last_ts, records, data, received_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (device_id, min(times, default=None), max(times, default=None), len(events),
+                 data, _now_iso())
+            )
+            self.db.commit()
+        return len(events)
+
+    def event_history(self, device_id, since=None, until=None, event=None, limit=1000):
+        """
+        Uploaded events for a device, oldest first (the last `limit`)
+
+        A time range uploaded more than once is returned only once.
+        """
+        query = "SELECT data FROM event_chunks WHERE device_id = ?"
+        args = [device_id]
+        if since is not None:
+            query += " AND last_ts >= ?"
+            args.append(since)
+        if until is not None:
+            query += " AND first_ts <= ?"
+            args.append(until)
+        with self.db_lock:
+            chunks = [row[0] for row in self.db.execute(query + " ORDER BY id", args)]
+
+        seen = set()
+        events = []
+        for chunk in chunks:
+            for item in decode_events(chunk):
+                if since is not None and item["t"] < since:
+                    continue
+                if until is not None and item["t"] > until:
+                    continue
+                if event and item["event"] != event:
+                    continue
+                key = tuple(sorted(item.items()))
+                if key not in seen:
+                    seen.add(key)
+                    events.append(item)
+        events.sort(key=lambda item: item["t"])
+        return events[-limit:] if limit > 0 else []
+
+    def snapshot(self, device_id):
+        """Same shape as the Next.js state route"""
+        with self.lock:
+            state = self._device(device_id)
+            return {
+                "device_id": device_id,
+                "pendingCommand": state.queue[0][1] if state.queue else None,
+                "queuedCommands": len(state.queue),
+                "commandSeq": state.seq,
+                "lastStatus": state.last_status,
+                "lastHeartbeat": state.last_heartbeat,
+            }
+
+    # -- persistence ---------------------------------------------------------
+
+    def _write_loop(self):
+        while True:
+            batch = [self._writes.get()]
+            while len(batch) < self.WRITE_BATCH:
+                try:
+                    batch.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+            self._write_batch(batch)
+
+    def _write_batch(self, batch):
+        done_events = []
+        with self.db_lock:
+            for item in batch:
+                kind = item[0]
+                if kind == "status":
+                    s = item[1]
+                    self.db.execute(
+                        "INSERT INTO statuses (device_id, status_type, timestamp, data, received_at) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (s["device_id"], s["status_type"], s["timestamp"],
+                         json.dumps(s["data"]), s["receivedAt"])
+                    )
+                elif kind == "heartbeat":
+                    h = item[1]
+                    self.db.execute(
+                        "INSERT OR REPLACE INTO heartbeats (device_id, timestamp, ip_address, "
+                        "locked, fingerprint_count, received_at) VALUES (?, ?, ?, ?, ?, ?)",
+                        (h["device_id"], h["timestamp"], h["ip_address"],
+                         None if h["locked"] is None else int(h["locked"]),
+                         h["fingerprint_count"], h["receivedAt"])
+                    )
+                elif kind == "flush":
+                    done_events.append(item[1])
+            self.db.commit()
+        for event in done_events:
+            event.set()
+
+    def flush(self, timeout=5):
+        """Block until everything queued so far is committed"""
+        done = threading.Event()
+        self._writes.put(("flush", done))
+        done.wait(timeout)
+
+    def close(self):
+        self.flush()
+        with self.db_lock:
+            self.db.close()
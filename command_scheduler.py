@@ -0,0 +1,179 @@
+"""
+Command Scheduler for the polling client
+Runs backend commands one at a time in priority order and lets urgent
+commands (lock, emergency stop) preempt long hardware waits
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from typing import Callable, Optional
+
+
+# Priority classes (lower runs first)
+PRIORITY_CRITICAL = 0
+PRIORITY_HIGH = 1
+PRIORITY_NORMAL = 2
+PRIORITY_LOW = 3
+
+COMMAND_PRIORITIES = {
+    "emergency_stop": PRIORITY_CRITICAL,
+    "lock": PRIORITY_CRITICAL,
+    "unlock": PRIORITY_HIGH,
+    "update_config": PRIORITY_HIGH,
+    "unlock_and_dispense": PRIORITY_NORMAL,
+    "dispense": PRIORITY_NORMAL,
+    "register_fingerprint": PRIORITY_NORMAL,
+    "register_fingerprint_session": PRIORITY_NORMAL,
+    "sync_fingerprints": PRIORITY_NORMAL,
+    "export_fingerprints": PRIORITY_LOW,
+    "check_hand": PRIORITY_LOW,
+    "upload_event_log": PRIORITY_LOW,
+}
+
+# Commands whose hardware waits (or uploads) honour the cancel event
+PREEMPTIBLE_COMMANDS = ("unlock", "unlock_and_dispense", "dispense", "register_fingerprint",
+                        "register_fingerprint_session", "export_fingerprints",
+                        "sync_fingerprints", "upload_event_log")
+
+
+def preempts(item, current) -> bool:
+    """
+    Whether item cuts the running command short
+
+    Only lock and emergency stop interrupt a patient-facing command (an
+    unlock must not abort a pill-taken wait or an enrolment); background
+    transfers (low priority) give way to any more urgent command.
+    """
+    if current is None or current.name not in PREEMPTIBLE_COMMANDS:
+        return False
+    if item.priority >= current.priority:
+        return False
+    return item.priority == PRIORITY_CRITICAL or current.priority == PRIORITY_LOW
+
+
+class ScheduledCommand:
+    """A backend command waiting for, or running on, the scheduler"""
+
+    __slots__ = ("command", "priority", "seq", "received_at", "started_at", "cancel")
+
+    def __init__(self, command: dict, seq: int):
+        self.command = command
+        self.priority = COMMAND_PRIORITIES.get(command.get("command"), PRIORITY_NORMAL)
+        self.seq = seq
+        self.received_at = time.monotonic()
+        self.started_at = None
+        # Set to abort this command's cancellable hardware waits
+        self.cancel = threading.Event()
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+    @property
+    def name(self):
+        return self.command.get("command")
+
+    @property
+    def queue_delay_ms(self):
+        """Time between receiving the command and starting it"""
+        if self.started_at is None:
+            return None
+        return round((self.started_at - self.received_at) * 1000, 1)
+
+
+class CommandScheduler:
+    """
+    Priority queue plus a single worker thread
+
+    Commands of equal priority run in arrival order. Submitting a command
+    that outranks the running one sets the running command's cancel event,
+    so a 30-second hand wait or fingerprint scan ends immediately and the
+    urgent command runs next.
+    """
+
+    def __init__(self, execute: Callable[[ScheduledCommand], None], name: str = "scheduler"):
+        """
+        Initialize scheduler
+
+        Args:
+            execute: Called on the worker thread for each command
+            name: Worker thread name
+        """
+        self.execute = execute
+        self.name = name
+        self.running = False
+        self.current: Optional[ScheduledCommand] = None
+
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def start(self):
+        """Start the worker thread"""
+        if self.running:
+            return
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 2):
+        """Cancel the running command and stop the worker"""
+        with self._cond:
+            self.running = False
+            if self.current:
+                self.current.cancel.set()
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def submit(self, command: dict) -> ScheduledCommand:
+        """Queue a command, preempting the running one if preempts() says so"""
+        item = ScheduledCommand(command, next(self._seq))
+
+        with self._cond:
+            heapq.heappush(self._heap, item)
+            current = self.current
+            if preempts(item, current):
+                print(f"⚡ Preempting {current.name} for {item.name}")
+                current.cancel.set()
+            self._cond.notify()
+
+        return item
+
+    def drop_pending(self) -> list:
+        """Remove every queued (not yet running) command and return them"""
+        with self._cond:
+            dropped = sorted(self._heap)
+            self._heap.clear()
+        return dropped
+
+    @property
+    def pending_count(self) -> int:
+        with self._cond:
+            return len(self._heap)
+
+    @property
+    def busy(self) -> bool:
+        with self._cond:
+            return self.current is not None or bool(self._heap)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self.running and not self._heap:
+                    self._cond.wait()
+                if not self.running:
+                    return
+                item = heapq.heappop(self._heap)
+                item.started_at = time.monotonic()
+                self.current = item
+
+            try:
+                self.execute(item)
+            except Exception as e:
+                print(f"✗ Command {item.name} crashed: {e}")
+            finally:
+                with self._cond:
+                    self.current = None
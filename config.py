@@ -0,0 +1,388 @@
+"""
+Runtime Configuration for the polling client
+Tunable settings from a JSON file plus backend-pushed overrides, watched
+for changes and applied live to the running client and hardware - no
+restart, no hardware reset
+
+    {
+        "backend_url": "https://your-app.com",
+        "device_id": "pi-001",
+        "client":      {"poll_interval": 5, "pill_taken_timeout": 30},
+        "fingerprint": {"compare_level": 5},
+        "motors":      {"step_delay": 0.01},
+        "infrared":    {"filter_window": 5}
+    }
+
+Each section is applied by one component's configure() (see SCHEMA for the
+settings and their limits). Top-level keys are startup settings: they are
+read once and a change only prints a restart hint.
+
+Precedence, lowest first: DEFAULTS, values given in code or on the command
+line, the config file, backend overrides (update_config command, persisted
+next to the file so they survive restarts).
+
+The file is watched with inotify (through ctypes, no extra package); where
+that isn't available its mtime is polled instead.
+"""
+
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import struct
+import threading
+from typing import Callable, Optional
+
+
+# setting -> (type, minimum, maximum)
+SCHEMA = {
+    "client.poll_interval": (float, 0.2, 3600),
+    "client.heartbeat_interval": (float, 5, 3600),
+    "client.pill_taken_timeout": (float, 1, 600),
+    "client.http_timeout": (float, 1, 120),
+    "fingerprint.compare_level": (int, 0, 9),
+    "fingerprint.scan_timeout": (float, 1, 60),
+    "fingerprint.enroll_timeout": (float, 1, 60),
+    "motors.step_delay": (float, 0, 0.1),
+    "motors.segments_per_rotation": (int, 1, 100),
+    "motors.steps_per_rotation": (int, 1, 10000),
+    "infrared.filter_window": (int, 1, 50),
+}
+
+DEFAULTS = {
+    "client.poll_interval": 5,
+    "client.heartbeat_interval": 60,
+    "client.pill_taken_timeout": 30,
+    "client.http_timeout": 10,
+    "fingerprint.compare_level": 5,
+    "fingerprint.scan_timeout": 5,
+    "fingerprint.enroll_timeout": 6,
+    "motors.step_delay": 0.01,
+    "motors.segments_per_rotation": 15,
+    "motors.steps_per_rotation": 200,
+    "infrared.filter_window": 5,
+}
+
+# Top-level keys read once at startup
+STARTUP_KEYS = ("backend_url", "device_id", "wire_format", "hardware_socket", "lean")
+
+
+def flatten(settings: dict) -> dict:
+    """{"motors": {"step_delay": 0.005}} -> {"motors.step_delay": 0.005}"""
+    flat = {}
+    for section, values in settings.items():
+        if section in STARTUP_KEYS:
+            continue
+        if not isinstance(values, dict):
+            flat[section] = values
+            continue
+        for key, value in values.items():
+            flat[f"{section}.{key}"] = value
+    return flat
+
+
+def validate(flat: dict):
+    """
+    Split settings into valid and rejected ones
+
+    Returns:
+        (accepted dict, rejected dict of setting -> reason)
+
+    Raises:
+        ValueError: flat is not an object (e.g. a broken overrides file)
+    """
+    if not isinstance(flat, dict):
+        raise ValueError(f"settings must be an object, got {type(flat).__name__}")
+    accepted, rejected = {}, {}
+    for name, value in flat.items():
+        if name not in SCHEMA:
+            rejected[name] = "unknown setting"
+            continue
+        kind, low, high = SCHEMA[name]
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            rejected[name] = f"must be a number, got {value!r}"
+            continue
+        if kind is int and value != int(value):
+            rejected[name] = f"must be an integer, got {value!r}"
+            continue
+        if not low <= value <= high:
+            rejected[name] = f"must be between {low} and {high}, got {value!r}"
+            continue
+        accepted[name] = kind(value)
+    return accepted, rejected
+
+
+class RuntimeConfig:
+    """Effective settings and the components they are applied to"""
+
+    # Seconds between mtime checks when inotify isn't available
+    POLL_SECONDS = 2
+
+    def __init__(self, path: Optional[str] = None, base: Optional[dict] = None,
+                 overrides_path: Optional[str] = None):
+        """
+        Initialize configuration (reads the file and saved overrides)
+
+        Args:
+            path: JSON config file, or None for defaults only
+            base: Flat settings given in code or on the command line
+                  (e.g. {"client.poll_interval": 2}); the file overrides them
+            overrides_path: Where backend overrides are saved
+                            (default: <path>.overrides.json)
+        """
+        self.path = path
+        self.overrides_path = overrides_path or (f"{path}.overrides.json" if path else None)
+        self.base, rejected = validate(base or {})
+        self._report_rejected("arguments", rejected)
+
+        self.startup = {}
+        self.values = {}
+        self._file = {}
+        self._overrides = {}
+        self._subscribers = {}
+        self._lock = threading.RLock()
+        self._watcher = None
+        self._stop = threading.Event()
+
+        self._read_overrides()
+        self._read_file()
+        self.values = self._merge()
+
+    def get(self, name: str):
+        return self.values[name]
+
+    def section(self, section: str) -> dict:
+        """Settings of one section without the prefix ({"step_delay": 0.01})"""
+        prefix = section + "."
+        return {name[len(prefix):]: value for name, value in self.values.items()
+                if name.startswith(prefix)}
+
+    def subscribe(self, section: str, apply: Callable[[dict], object]):
+        """
+        Register a component's configure() for a section
+
+        apply is called with the section's changed settings (un-prefixed)
+        from whichever thread noticed the change; see apply_all().
+        """
+        self._subscribers.setdefault(section, []).append(apply)
+
+    def apply_all(self):
+        """Push every current setting to every subscriber (at startup)"""
+        for section in self._subscribers:
+            self._notify(section, self.section(section))
+
+    def reload(self) -> dict:
+        """
+        Re-read the config file and apply what changed
+
+        Returns:
+            dict of setting -> new value
+        """
+        with self._lock:
+            self._read_file()
+            return self._update()
+
+    def apply_overrides(self, settings: Optional[dict], replace: bool = False) -> dict:
+        """
+        Apply backend-pushed settings on top of the file and save them
+
+        Args:
+            settings: Nested settings ({"motors": {"step_delay": 0.005}}),
+                      or None to clear every override
+            replace: Drop earlier overrides instead of adding to them
+
+        Returns:
+            {"applied": {setting: value}, "rejected": {setting: reason}}
+        """
+        if settings is not None and not isinstance(settings, dict):
+            rejected = {"settings": f"must be an object, got {settings!r}"}
+            self._report_rejected("backend", rejected)
+            return {"applied": {}, "rejected": rejected}
+
+        accepted, rejected = validate(flatten(settings or {}))
+        with self._lock:
+            if settings is None or replace:
+                self._overrides = {}
+            self._overrides.update(accepted)
+            self._save_overrides()
+            changed = self._update()
+        self._report_rejected("backend", rejected)
+        return {"applied": changed, "rejected": rejected}
+
+    def _merge(self):
+        return {**DEFAULTS, **self.base, **self._file, **self._overrides}
+
+    def _update(self):
+        values = self._merge()
+        changed = {name: value for name, value in values.items() if self.values.get(name) != value}
+        self.values = values
+        if not changed:
+            return changed
+
+        for name, value in changed.items():
+            print(f"✓ Config: {name} = {value}")
+        sections = {}
+        for name, value in changed.items():
+            section, key = name.split(".", 1)
+            sections.setdefault(section, {})[key] = value
+        for section, values in sections.items():
+            self._notify(section, values)
+        return changed
+
+    def _notify(self, section, values):
+        for apply in self._subscribers.get(section, ()):
+            try:
+                apply(values)
+            except Exception as e:
+                print(f"✗ Could not apply {section} settings {values}: {e}")
+
+    def _read_file(self):
+        """Load the file into self._file; a broken file keeps the last good settings"""
+        if not self.path or not os.path.exists(self.path):
+            self._file = {}
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            if not isinstance(data, dict):
+                raise ValueError("top level must be an object")
+        except (OSError, ValueError) as e:
+            print(f"✗ Config file {self.path} not loaded: {e}")
+            return
+
+        startup = {key: data[key] for key in STARTUP_KEYS if key in data}
+        if self.startup and startup != self.startup:
+            print(f"⚠ Config: {', '.join(sorted(startup.keys() | self.startup.keys()))} "
+                  f"change on restart only")
+        else:
+            self.startup = startup
+
+        self._file, rejected = validate(flatten(data))
+        self._report_rejected(self.path, rejected)
+
+    def _read_overrides(self):
+        if not self.overrides_path or not os.path.exists(self.overrides_path):
+            return
+        try:
+            with open(self.overrides_path) as f:
+                self._overrides, _ = validate(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"✗ Saved overrides {self.overrides_path} not loaded: {e}")
+
+    def _save_overrides(self):
+        if not self.overrides_path:
+            return
+        tmp = self.overrides_path + ".tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(self._overrides, f, indent=2)
+            os.replace(tmp, self.overrides_path)
+        except OSError as e:
+            print(f"⚠ Could not save config overrides: {e}")
+
+    def _report_rejected(self, source, rejected):
+        for name, reason in rejected.items():
+            print(f"⚠ Config ({source}): ignoring {name}: {reason}")
+
+    # -- watching ------------------------------------------------------------
+
+    def watch(self):
+        """Start reloading the file whenever it changes"""
+        if not self.path or self._watcher:
+            return
+        self._stop.clear()
+        inotify = _Inotify.open(os.path.dirname(os.path.abspath(self.path)))
+        target = self._watch_inotify if inotify else self._watch_mtime
+        self._watcher = threading.Thread(target=target, args=(inotify,) if inotify else (),
+                                         name="config-watcher", daemon=True)
+        self._watcher.start()
+        print(f"✓ Watching {self.path} ({'inotify' if inotify else 'mtime polling'})")
+
+    def stop(self):
+        """Stop watching"""
+        self._stop.set()
+        if self._watcher:
+            self._watcher.join(timeout=2)
+            self._watcher = None
+
+    def _watch_inotify(self, inotify):
+        name = os.path.basename(self.path)
+        try:
+            while not self._stop.is_set():
+                names = inotify.read(timeout=0.5)
+                if name in names:
+                    # Let a writer that saves in several steps finish
+                    self._stop.wait(0.05)
+                    inotify.read(timeout=0)
+                    self.reload()
+        finally:
+            inotify.close()
+
+    def _watch_mtime(self):
+        def mtime():
+            try:
+                return os.stat(self.path).st_mtime_ns
+            except OSError:
+                return None
+
+        last = mtime()
+        while not self._stop.wait(self.POLL_SECONDS):
+            current = mtime()
+            if current != last:
+                last = current
+                self.reload()
+
+
+class _Inotify:
+    """Minimal inotify directory watch through libc"""
+
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    EVENT = struct.Struct("iIII")
+
+    def __init__(self, fd):
+        self.fd = fd
+
+    @classmethod
+    def open(cls, directory):
+        """Watch a directory; returns None where inotify isn't available"""
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(cls.IN_NONBLOCK | cls.IN_CLOEXEC)
+            if fd < 0:
+                return None
+            # Editors often save by writing a new file and renaming it over
+            # the old one, so watch the directory rather than the file
+            mask = cls.IN_CLOSE_WRITE | cls.IN_MOVED_TO | cls.IN_CREATE
+            if libc.inotify_add_watch(fd, directory.encode(), mask) < 0:
+                os.close(fd)
+                return None
+        except (OSError, AttributeError):
+            return None
+        return cls(fd)
+
+    def read(self, timeout):
+        """Names of the files changed (empty if none within timeout)"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        try:
+            data = os.read(self.fd, 4096)
+        except BlockingIOError:
+            return set()
+
+        names = set()
+        offset = 0
+        while offset + self.EVENT.size <= len(data):
+            _, _, _, length = self.EVENT.unpack_from(data, offset)
+            offset += self.EVENT.size
+            names.add(data[offset:offset + length].rstrip(b"\0").decode(errors="replace"))
+            offset += length
+        return names
+
+    def close(self):
+        os.close(self.fd)
@@ -0,0 +1,240 @@
+"""
+Connectivity Monitor for the polling client
+Notices when the backend can't be reached, so the client stops spending a
+full HTTP timeout on every poll, heartbeat and status upload, and notices
+the moment it is back, so deferred work goes out at once
+
+Two cheap signals are used:
+
+    link state  /sys/class/net/*/operstate: no interface up means offline,
+                without touching the network
+    probe       a TCP connect to the backend's host and port with a short
+                timeout (no HTTP request, no TLS handshake)
+
+The client reports the outcome of its requests (report_success,
+report_failure). A network error is confirmed with a probe before the
+monitor goes offline, so one dropped request doesn't stop polling. While
+offline, a background thread reads the link state every LINK_INTERVAL
+seconds and probes every PROBE_INTERVAL seconds, or straight away when a
+link comes up. The first probe that connects ends the outage, and every
+subscriber is told how long it lasted.
+"""
+
+import os
+import socket
+import threading
+import time
+from typing import Callable, Optional
+from urllib.parse import urlsplit
+
+NET_CLASS = "/sys/class/net"
+
+
+def link_up(interfaces=None, root: str = NET_CLASS) -> Optional[bool]:
+    """
+    Whether any network interface other than loopback is up
+
+    Args:
+        interfaces: Interface names to check (default: all of them)
+
+    Returns:
+        True or False, or None where interface state can't be read
+    """
+    try:
+        names = interfaces or os.listdir(root)
+    except OSError:
+        return None
+
+    known = False
+    for name in names:
+        if name == "lo":
+            continue
+        try:
+            with open(os.path.join(root, name, "operstate")) as f:
+                state = f.read().strip()
+        except OSError:
+            continue
+        known = True
+        # Tunnels, PPP and some Wi-Fi drivers report "unknown" while working
+        if state in ("up", "unknown"):
+            return True
+    return False if known else None
+
+
+class ConnectivityMonitor:
+    """Online/offline state of the connection to the backend"""
+
+    # Seconds a probe connect may take
+    PROBE_TIMEOUT = 1.5
+    # Seconds between probes while offline
+    PROBE_INTERVAL = 3
+    # Seconds between link state reads while offline
+    LINK_INTERVAL = 0.5
+    # Probes between DNS lookups while offline (lookups can block for seconds)
+    RESOLVE_EVERY = 5
+
+    def __init__(self, backend_url: str, interfaces=None, name: str = "connectivity"):
+        """
+        Initialize monitor (starts online; no thread runs until an outage)
+
+        Args:
+            backend_url: Backend URL; its host and port are probed
+            interfaces: Interfaces whose state counts (default: all but lo)
+            name: Probe thread name
+        """
+        parts = urlsplit(backend_url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.interfaces = interfaces
+        self.name = name
+
+        self.online = True
+        # Epoch seconds the current outage started
+        self.offline_since = None
+        # Whether the link was down at any point of the current outage
+        self.link_down = False
+        self.outages = 0
+        self.last_outage_s = None
+
+        self._went_offline = None
+        self._addresses = None
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._online_event = threading.Event()
+        self._online_event.set()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def subscribe(self, callback: Callable[[bool, Optional[float]], object]):
+        """
+        Register for state changes
+
+        callback(online, offline_s) is called with (False, None) when an
+        outage starts and (True, seconds offline) when it ends, from the
+        thread that noticed.
+        """
+        self._subscribers.append(callback)
+
+    def wait_online(self, timeout: Optional[float] = None) -> bool:
+        """Block until online (returns False if the timeout ran out)"""
+        return self._online_event.wait(timeout)
+
+    def report_success(self):
+        """A request reached the backend"""
+        if not self.online:
+            self._set_online()
+
+    def report_failure(self) -> bool:
+        """
+        A request failed with a network error
+
+        Goes offline when the link is down or a probe can't connect either.
+
+        Returns:
+            bool: True if still online
+        """
+        if not self.online:
+            return False
+        link = link_up(self.interfaces)
+        if link is not False and self.probe():
+            return True
+        self._set_offline(link is False)
+        return False
+
+    def probe(self, resolve: bool = False) -> bool:
+        """
+        Try a TCP connect to the backend
+
+        Args:
+            resolve: Look the host up again instead of using the cached address
+        """
+        try:
+            if resolve or not self._addresses:
+                self._addresses = socket.getaddrinfo(self.host, self.port,
+                                                     type=socket.SOCK_STREAM)
+        except OSError:
+            return False
+
+        for family, kind, proto, _, address in self._addresses:
+            try:
+                with socket.socket(family, kind, proto) as s:
+                    s.settimeout(self.PROBE_TIMEOUT)
+                    s.connect(address)
+                    return True
+            except OSError:
+                continue
+        return False
+
+    def status(self) -> dict:
+        """Current state, for diagnostics"""
+        return {
+            "online": self.online,
+            "offline_since": self.offline_since,
+            "outages": self.outages,
+            "last_outage_s": self.last_outage_s,
+        }
+
+    def stop(self):
+        """Stop probing"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.PROBE_TIMEOUT + 1)
+            self._thread = None
+
+    def _set_offline(self, link_down):
+        with self._lock:
+            if not self.online:
+                return
+            self.online = False
+            self._online_event.clear()
+            self.offline_since = time.time()
+            self.link_down = link_down
+            self._went_offline = time.monotonic()
+            self.outages += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+        reason = "network link down" if link_down else f"{self.host}:{self.port} unreachable"
+        print(f"⚠ Offline ({reason}): polls and heartbeats paused")
+        self._notify(False, None)
+
+    def _set_online(self):
+        with self._lock:
+            if self.online:
+                return
+            offline_s = time.monotonic() - self._went_offline
+            self.online = True
+            self.last_outage_s = offline_s
+            self._online_event.set()
+
+        print(f"✓ Back online after {offline_s:.1f}s")
+        self._notify(True, offline_s)
+
+    def _notify(self, online, offline_s):
+        for callback in self._subscribers:
+            try:
+                callback(online, offline_s)
+            except Exception as e:
+                print(f"✗ Connectivity callback failed: {e}")
+
+    def _run(self):
+        link = link_up(self.interfaces)
+        next_probe = time.monotonic() + self.PROBE_INTERVAL
+        probes = 0
+
+        while self.online is False and not self._stop.wait(self.LINK_INTERVAL):
+            previous, link = link, link_up(self.interfaces)
+            if link is False:
+                self.link_down = True
+                continue
+            # Probe at once when a link comes back, otherwise on schedule
+            if previous is not False and time.monotonic() < next_probe:
+                continue
+
+            probes += 1
+            if self.probe(resolve=probes % self.RESOLVE_EVERY == 0):
+                self._set_online()
+                return
+            next_probe = time.monotonic() + self.PROBE_INTERVAL
@@ -0,0 +1,491 @@
+"""
+Event Log for the polling client
+Append-only local history of what the dispenser did: commands received and
+finished, motor moves, fingerprint results and IR detections
+
+Every event is one fixed 32-byte record:
+
+    time (float64, epoch s) | event code (u16) | reserved (u16)
+    | command hash (u32, zlib.crc32 of command_id) | 4 x int32 fields
+
+The fields of each event type are listed in EVENTS (missing values are
+stored as -1, lists as their length). Records go to segment files of
+up to SEGMENT_RECORDS records, each starting with a 32-byte header; the oldest
+segments are deleted once the log exceeds max_bytes. A small in-memory
+index per segment (time range, event counts, every INDEX_STRIDE-th
+timestamp) lets queries skip straight to the records they need.
+
+Writing an event costs a few microseconds: one struct.pack and a write
+into the file buffer. A background thread flushes the buffer every
+flush_interval seconds.
+
+The backend can ask for the log with the upload_event_log command: the
+matching records are sent in gzip chunks (export_chunks()), which
+decode() turns back into dicts. To read a log on the device:
+
+    python3 event_log.py events/pi-001 [--since EPOCH] [--event motor_done] [--last 50]
+"""
+
+import bisect
+import gzip
+import os
+import struct
+import threading
+import time
+import zlib
+from array import array
+from collections import deque
+from typing import Optional
+
+from wire_encoding import BodyTooLarge, gunzip
+
+MAGIC = b"RITAEVL1"
+VERSION = 1
+HEADER = struct.Struct("<8sHHd12x")
+RECORD = struct.Struct("<dHHI4i")
+
+# Stored for fields an event doesn't have
+MISSING = -1
+INT32_MAX = 2 ** 31 - 1
+
+# event -> (code, fields). Codes are written to disk: never reuse or change
+# one, only add new ones.
+EVENTS = {
+    "command_received": (1, ("command", "queue_delay_ms")),
+    "command_done": (2, ("command", "duration_ms")),
+    "error": (3, ()),
+    "dispense_started": (10, ("motor_id", "segment", "index")),
+    "motor_done": (11, ("motor_id", "segment", "success", "index")),
+    "pill_taken": (12, ("motor_id", "segment", "taken")),
+    "emergency_stopped": (13, ("dropped",)),
+    "hand_detected": (20, ("motor_id", "segment", "after_ms")),
+    "hand_check": (21, ("detected",)),
+    "unlocked": (30, ("user_id",)),
+    "unlock_failed": (31, ("preempted",)),
+    "locked": (32, ()),
+    "fingerprint_ok": (33, ("user_id",)),
+    "dose_complete": (34, ("user_id", "results", "preempted")),
+    "dose_failed": (35, ("preempted",)),
+    "scan_1_ok": (40, ("user_id",)),
+    "scan_2_ok": (41, ("user_id",)),
+    "finger_prompt": (42, ("index", "count", "user_id", "attempt")),
+    "fingerprint_registered": (43, ("user_id",)),
+    "fingerprints_registered": (44, ("user_ids", "failed", "preempted")),
+    "registration_failed": (45, ("preempted",)),
+    "fingerprints_exported": (46, ("user_ids", "failed")),
+    "fingerprints_synced": (47, ("imported", "skipped", "failed", "preempted")),
+    "fingerprint_sync_failed": (48, ("preempted",)),
+    "config_updated": (50, ("applied", "rejected")),
+    "connectivity_lost": (60, ()),
+    "connectivity_restored": (61, ("offline_s", "missed_heartbeats", "queued")),
+}
+EVENT_NAMES = {code: name for name, (code, _) in EVENTS.items()}
+
+# Backend commands, stored by position + 1 (0: unknown). Append only.
+COMMANDS = (
+    "unlock", "lock", "dispense", "register_fingerprint", "check_hand",
+    "unlock_and_dispense", "emergency_stop", "update_config", "export_fingerprints",
+    "sync_fingerprints", "register_fingerprint_session", "upload_event_log",
+)
+COMMAND_CODES = {name: i for i, name in enumerate(COMMANDS, 1)}
+
+CONTENT_TYPE = "application/x-rita-events"
+
+# Most records in one uploaded chunk; decode() rejects anything larger, so a
+# gzip bomb can't exhaust the backend's memory
+MAX_CHUNK_RECORDS = 65536
+MAX_CHUNK_BYTES = HEADER.size + MAX_CHUNK_RECORDS * RECORD.size
+
+
+class EventLogError(ValueError):
+    """Data is not an event log"""
+
+
+def _field(value):
+    """Event data value -> int32 (bools as 0/1, lists and dicts as their length)"""
+    if value is None:
+        return MISSING
+    if isinstance(value, (list, tuple, dict)):
+        value = len(value)
+    try:
+        value = round(value)
+    except TypeError:
+        return MISSING
+    return max(-INT32_MAX, min(INT32_MAX, value))
+
+
+def _decode_record(t, code, command_hash, values):
+    name = EVENT_NAMES.get(code, f"unknown:{code}")
+    event = {"t": t, "event": name}
+    if command_hash:
+        event["command_hash"] = command_hash
+    fields = EVENTS[name][1] if name in EVENTS else ()
+    for field, value in zip(fields, values):
+        if value == MISSING:
+            continue
+        if field == "command":
+            value = COMMANDS[value - 1] if 0 < value <= len(COMMANDS) else None
+        event[field] = value
+    return event
+
+
+def decode(data: bytes) -> list:
+    """
+    Events of an uploaded chunk (gzip or plain: a header, then records)
+
+    Raises:
+        EventLogError: not an event log chunk
+    """
+    if data[:2] == b"\x1f\x8b":
+        try:
+            data = gunzip(data, MAX_CHUNK_BYTES)
+        except BodyTooLarge:
+            raise EventLogError(f"Chunk holds more than {MAX_CHUNK_RECORDS} records")
+        except ValueError as e:
+            raise EventLogError(str(e))
+    elif len(data) > MAX_CHUNK_BYTES:
+        raise EventLogError(f"Chunk holds more than {MAX_CHUNK_RECORDS} records")
+    if len(data) < HEADER.size or data[:len(MAGIC)] != MAGIC:
+        raise EventLogError("Not an event log")
+    _, version, record_size, _ = HEADER.unpack_from(data)
+    if version != VERSION or record_size != RECORD.size:
+        raise EventLogError(f"Unsupported event log version {version}")
+    body = memoryview(data)[HEADER.size:]
+    if len(body) % RECORD.size:
+        raise EventLogError("Event log is truncated")
+    return [_decode_record(t, code, command_hash, values)
+            for t, code, _, command_hash, *values in RECORD.iter_unpack(body)]
+
+
+class _Segment:
+    """Index of one segment file"""
+
+    __slots__ = ("number", "path", "records", "first", "last", "ordered", "counts", "marks")
+
+    def __init__(self, number, path):
+        self.number = number
+        self.path = path
+        self.records = 0
+        self.first = None
+        self.last = None
+        # False once the wall clock stepped back within the segment
+        self.ordered = True
+        # event code -> records
+        self.counts = {}
+        # Timestamp of every INDEX_STRIDE-th record
+        self.marks = array("d")
+
+    def add(self, t, code):
+        if self.records % EventLog.INDEX_STRIDE == 0:
+            self.marks.append(t)
+        if self.first is None:
+            self.first = self.last = t
+        elif t < self.last:
+            self.ordered = False
+            self.first = min(self.first, t)
+        else:
+            self.last = t
+        self.counts[code] = self.counts.get(code, 0) + 1
+        self.records += 1
+
+    def overlaps(self, since, until, codes):
+        if not self.records:
+            return False
+        if since is not None and self.last < since:
+            return False
+        if until is not None and self.first > until:
+            return False
+        return codes is None or any(code in self.counts for code in codes)
+
+    def start_record(self, since):
+        """First record that can be at or after since"""
+        if since is None or not self.ordered:
+            return 0
+        mark = bisect.bisect_left(self.marks, since)
+        return max(mark - 1, 0) * EventLog.INDEX_STRIDE
+
+
+class EventLog:
+    """Fixed-record event log in segment files, with an in-memory index"""
+
+    # Records per segment file (32768 x 32 bytes = 1 MiB)
+    SEGMENT_RECORDS = 32768
+    # One timestamp kept in memory per this many records
+    INDEX_STRIDE = 256
+    # Records per uploaded chunk (128 KiB before compression)
+    CHUNK_RECORDS = 4096
+
+    def __init__(self, directory: str = "events", max_bytes: int = 16 * 1024 * 1024,
+                 flush_interval: float = 1.0):
+        """
+        Initialize event log (reads the index of existing segments)
+
+        Args:
+            directory: Directory of the segment files
+            max_bytes: Oldest segments are deleted beyond this size (default: 16 MiB)
+            flush_interval: Seconds between writes of buffered events to the file
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        # Small logs get smaller segments, so pruning stays close to max_bytes
+        self.segment_records = max(self.INDEX_STRIDE,
+                                   min(self.SEGMENT_RECORDS, max_bytes // RECORD.size // 4))
+        self.written = 0
+        self.closed = False
+
+        self._lock = threading.Lock()
+        self._segments = []
+        self._file = None
+        self._dirty = False
+        self._stop = threading.Event()
+        self._flusher = None
+
+        self._load()
+
+    def log(self, event: str, data: Optional[dict] = None, timestamp: Optional[float] = None):
+        """
+        Append an event (types not in EVENTS are ignored)
+
+        Does nothing after close(), so a late event at shutdown can't reopen
+        a segment or restart the flusher.
+
+        Args:
+            event: Event type, e.g. "motor_done"
+            data: Event data; the fields listed in EVENTS are stored, and
+                  command_id as its hash
+            timestamp: Epoch seconds (default: now)
+        """
+        spec = EVENTS.get(event)
+        if spec is None:
+            return
+        code, fields = spec
+        data = data or {}
+        t = time.time() if timestamp is None else timestamp
+
+        values = [MISSING] * 4
+        for i, field in enumerate(fields):
+            value = data.get(field)
+            if field == "command":
+                values[i] = COMMAND_CODES.get(value, 0)
+            else:
+                values[i] = _field(value)
+        command_id = data.get("command_id")
+        command_hash = zlib.crc32(str(command_id).encode()) if command_id is not None else 0
+        record = RECORD.pack(t, code, 0, command_hash, *values)
+
+        with self._lock:
+            if self.closed:
+                return
+            if self._file is None:
+                self._open_segment()
+            self._file.write(record)
+            segment = self._segments[-1]
+            segment.add(t, code)
+            self._dirty = True
+            self.written += 1
+            if segment.records >= self.segment_records:
+                self._file.close()
+                self._file = None
+
+    def query(self, since: Optional[float] = None, until: Optional[float] = None,
+              events=None, limit: Optional[int] = None) -> list:
+        """
+        Events between since and until (epoch seconds), oldest first
+
+        Args:
+            events: Event types to return (default: all)
+            limit: Return only the last `limit` matches
+        """
+        records = (record for record, _ in self._scan(since, until, events))
+        if limit is not None:
+            records = deque(records, maxlen=limit) if limit > 0 else ()
+        return [_decode_record(t, code, command_hash, values)
+                for t, code, _, command_hash, *values in records]
+
+    def export_chunks(self, since: Optional[float] = None, until: Optional[float] = None,
+                      events=None, chunk_records: Optional[int] = None):
+        """
+        Matching records as gzip chunks for upload
+
+        Segments are read block by block and each chunk is yielded as soon
+        as it is full, so memory use doesn't grow with the size of the log.
+
+        Yields:
+            (chunk bytes, record count); decode() reads a chunk back
+        """
+        chunk_records = min(chunk_records or self.CHUNK_RECORDS, MAX_CHUNK_RECORDS)
+        body = bytearray(HEADER.pack(MAGIC, VERSION, RECORD.size, time.time()))
+        count = 0
+        for _, raw in self._scan(since, until, events):
+            body += raw
+            count += 1
+            if count == chunk_records:
+                yield gzip.compress(body, compresslevel=6), count
+                del body[HEADER.size:]
+                count = 0
+        if count:
+            yield gzip.compress(body, compresslevel=6), count
+
+    def stats(self) -> dict:
+        """Size of the log, for diagnostics"""
+        with self._lock:
+            records = sum(s.records for s in self._segments)
+            return {
+                "segments": len(self._segments),
+                "records": records,
+                "bytes": records * RECORD.size + len(self._segments) * HEADER.size,
+                "first": min((s.first for s in self._segments if s.records), default=None),
+                "last": max((s.last for s in self._segments if s.records), default=None),
+            }
+
+    def flush(self):
+        """Write buffered events to the file"""
+        with self._lock:
+            if self._file is not None and self._dirty:
+                self._file.flush()
+            self._dirty = False
+
+    def close(self):
+        """Flush and stop the background flusher"""
+        with self._lock:
+            self.closed = True
+        self._stop.set()
+        if self._flusher and self._flusher is not threading.current_thread():
+            self._flusher.join(timeout=2)
+        self._flusher = None
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    # -- internals -----------------------------------------------------------
+
+    def _scan(self, since, until, events):
+        """
+        Matching records, oldest first, as (record tuple, raw bytes)
+
+        Reads CHUNK_RECORDS records at a time; the raw bytes are a view
+        into the current block, valid until the next one is read.
+        """
+        codes = None if events is None else {EVENTS[e][0] for e in events if e in EVENTS}
+        self.flush()
+        with self._lock:
+            segments = [s for s in self._segments if s.overlaps(since, until, codes)]
+            starts = [s.start_record(since) for s in segments]
+
+        block_size = self.CHUNK_RECORDS * RECORD.size
+        for segment, start in zip(segments, starts):
+            try:
+                f = open(segment.path, "rb")
+            except OSError:
+                # Deleted by rotation meanwhile
+                continue
+            with f:
+                f.seek(HEADER.size + start * RECORD.size)
+                done = False
+                while not done:
+                    data = f.read(block_size)
+                    # A record still being written is left for the next scan
+                    usable = len(data) - len(data) % RECORD.size
+                    if not usable:
+                        break
+                    view = memoryview(data)[:usable]
+                    for i, record in enumerate(RECORD.iter_unpack(view)):
+                        t, code = record[0], record[1]
+                        if since is not None and t < since:
+                            continue
+                        if until is not None and t > until:
+                            if segment.ordered:
+                                done = True
+                                break
+                            continue
+                        if codes is None or code in codes:
+                            yield record, view[i * RECORD.size:(i + 1) * RECORD.size]
+                    if usable < block_size:
+                        break
+
+    def _load(self):
+        """Index the segments already on disk"""
+        if not os.path.isdir(self.directory):
+            return
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(".evl"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                number = int(name[:-4])
+                with open(path, "rb") as f:
+                    data = f.read()
+            except (ValueError, OSError):
+                continue
+            if len(data) < HEADER.size or data[:len(MAGIC)] != MAGIC:
+                print(f"⚠ Skipping {path}: not an event log segment")
+                continue
+
+            usable = len(data) - (len(data) - HEADER.size) % RECORD.size
+            if usable != len(data):
+                # A record torn by a crash or power cut
+                with open(path, "r+b") as f:
+                    f.truncate(usable)
+            segment = _Segment(number, path)
+            for t, code, *_ in RECORD.iter_unpack(memoryview(data)[HEADER.size:usable]):
+                segment.add(t, code)
+            self._segments.append(segment)
+
+    def _open_segment(self):
+        """Start a new segment file (caller holds self._lock)"""
+        os.makedirs(self.directory, exist_ok=True)
+        number = self._segments[-1].number + 1 if self._segments else 1
+        path = os.path.join(self.directory, f"{number:08d}.evl")
+        self._file = open(path, "ab", buffering=64 * 1024)
+        self._file.write(HEADER.pack(MAGIC, VERSION, RECORD.size, time.time()))
+        self._segments.append(_Segment(number, path))
+        self._prune()
+
+        if self._flusher is None:
+            self._stop.clear()
+            self._flusher = threading.Thread(target=self._flush_loop, name="event-log", daemon=True)
+            self._flusher.start()
+
+    def _prune(self):
+        """Delete the oldest segments beyond max_bytes (caller holds self._lock)"""
+        total = sum(s.records * RECORD.size + HEADER.size for s in self._segments)
+        while len(self._segments) > 1 and total > self.max_bytes:
+            oldest = self._segments.pop(0)
+            total -= oldest.records * RECORD.size + HEADER.size
+            try:
+                os.remove(oldest.path)
+            except OSError:
+                pass
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+        self.flush()
+
+
+def main():
+    import argparse
+    from datetime import datetime
+
+    parser = argparse.ArgumentParser(description="Print a RITA event log")
+    parser.add_argument("directory", nargs="?", default="events", help="Segment directory")
+    parser.add_argument("--since", type=float, help="Epoch seconds")
+    parser.add_argument("--until", type=float, help="Epoch seconds")
+    parser.add_argument("--event", action="append", help="Event type (repeatable)")
+    parser.add_argument("--last", type=int, help="Only the last N events")
+    args = parser.parse_args()
+
+    log = EventLog(args.directory)
+    for event in log.query(args.since, args.until, args.event, args.last):
+        when = datetime.fromtimestamp(event.pop("t")).isoformat(timespec="milliseconds")
+        name = event.pop("event")
+        fields = " ".join(f"{key}={value}" for key, value in event.items())
+        print(f"{when}  {name:<24} {fields}")
+    stats = log.stats()
+    print(f"· {stats['records']} events in {stats['segments']} segments ({stats['bytes'] / 1024:.0f} KiB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""
+Fleet Polling Client for multi-dispenser cabinets
+Drives several dispensers (one Motor HAT each) from a single process with
+one shared HTTP connection pool and one bulk command poll per cycle
+"""
+
+import json
+import threading
+import time
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from wire_encoding import JSON
+from config import RuntimeConfig
+from connectivity import ConnectivityMonitor
+from polling_client import PollingClient
+
+
+class FleetClient:
+    """Polls commands for every dispenser at once and runs them per device"""
+
+    def __init__(self, backend_url: str, devices: list, poll_interval: int = 5,
+                 wire_format: str = JSON, compression: Optional[str] = None,
+                 config: Optional[RuntimeConfig] = None):
+        """
+        Initialize fleet client
+
+        Args:
+            backend_url: Your hosted backend URL (e.g., "https://your-app.com")
+            devices: List of device configs, each a dict with:
+                device_id: Unique identifier (required)
+                motor_address: Motor HAT I2C address (default: 0x60)
+                ir_pin: IR sensor BCM pin (default: 25)
+                fingerprint_port: Fingerprint serial port, or null for none
+                fingerprint_wake_pin: Reader wake pin (default: 23)
+                fingerprint_rst_pin: Reader reset pin (default: 24)
+            poll_interval: How often to poll in seconds (default: 5)
+            wire_format: Upload encoding: "json", "msgpack" or "cbor"
+            compression: Optional upload compression: "gzip" or "zstd"
+            config: Runtime settings (config.py) shared by the fleet and
+                    every device, so a settings file change or an
+                    update_config to any device applies to the whole
+                    cabinet. Its client.poll_interval takes the place of
+                    poll_interval.
+        """
+        self.backend_url = backend_url.rstrip('/')
+        self.config = config or RuntimeConfig(base={"client.poll_interval": poll_interval})
+        self.poll_interval = self.config.get("client.poll_interval")
+        self.heartbeat_interval = self.config.get("client.heartbeat_interval")
+        self.http_timeout = self.config.get("client.http_timeout")
+        self.running = False
+        self._wakeup = threading.Event()
+
+        # One keep-alive pool for every device: polls, statuses and heartbeats
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=len(devices) + 1)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        # Every dispenser shares the cabinet's link, so one monitor decides
+        # for all of them
+        self.connectivity = ConnectivityMonitor(self.backend_url)
+
+        self.clients = {}
+        for config in devices:
+            device_id = config["device_id"]
+            self.clients[device_id] = PollingClient(
+                backend_url, device_id, poll_interval,
+                wire_format=wire_format,
+                compression=compression,
+                motor_address=_parse_address(config.get("motor_address", 0x60)),
+                ir_pin=config.get("ir_pin", 25),
+                fingerprint_port=config.get("fingerprint_port"),
+                fingerprint_wake_pin=config.get("fingerprint_wake_pin", 23),
+                fingerprint_rst_pin=config.get("fingerprint_rst_pin", 24),
+                session=self.session,
+                connectivity=self.connectivity,
+                config=self.config
+            )
+        self.config.subscribe("client", lambda values: self.configure(**values))
+
+        # Each device executes its own commands on its own scheduler so a 30s
+        # hand wait on one dispenser doesn't hold up the others
+        self.commands_etag = None
+
+    def configure(self, poll_interval=None, heartbeat_interval=None,
+                  pill_taken_timeout=None, http_timeout=None):
+        """
+        Change the bulk poll loop's settings while running (the "client"
+        config section; each device applies pill_taken_timeout itself)
+
+        Returns:
+            dict of the settings that changed
+        """
+        requested = {
+            "poll_interval": poll_interval,
+            "heartbeat_interval": heartbeat_interval,
+            "http_timeout": http_timeout,
+        }
+        changed = {}
+        for name, value in requested.items():
+            if value is not None and value != getattr(self, name):
+                setattr(self, name, value)
+                changed[name] = value
+        if "poll_interval" in changed:
+            # Don't sit out the rest of the old interval
+            self._wakeup.set()
+        return changed
+
+    def poll_all(self) -> dict:
+        """
+        Poll pending commands for every device in one request
+
+        Backend endpoint: GET /api/fleet/commands?devices=pi-001,pi-002
+        Expected response:
+            { "commands": { "pi-001": {"command": "dispense", "params": {...}}, "pi-002": null } }
+            or 304 Not Modified when the ETag still matches
+
+        Returns:
+            dict of device_id -> command for devices that have one
+        """
+        headers = {}
+        if self.commands_etag:
+            headers["If-None-Match"] = self.commands_etag
+
+        try:
+            response = self.session.get(
+                f"{self.backend_url}/api/fleet/commands",
+                params={"devices": ",".join(self.clients)},
+                headers=headers,
+                timeout=self.http_timeout
+            )
+            self.connectivity.report_success()
+
+            if response.status_code == 304:
+                return {}
+
+            etag = response.headers.get("ETag")
+            if etag:
+                self.commands_etag = etag
+
+            if response.status_code == 200:
+                commands = response.json().get("commands") or {}
+                return {
+                    device_id: command
+                    for device_id, command in commands.items()
+                    if command and command.get("command") and device_id in self.clients
+                }
+
+            return {}
+
+        except requests.exceptions.RequestException as e:
+            print(f"✗ Fleet poll error: {e}")
+            self.connectivity.report_failure()
+            return {}
+
+    def start(self):
+        """Start the bulk polling loop and each device's command scheduler"""
+        self.running = True
+        print(f"\n{'='*50}")
+        print(f"Fleet Client Started")
+        print(f"Backend: {self.backend_url}")
+        print(f"Devices: {', '.join(self.clients)}")
+        print(f"Poll Interval: {self.poll_interval}s")
+        print(f"{'='*50}\n")
+
+        for client in self.clients.values():
+            client.ir_sampler.start()
+            client.scheduler.start()
+            client.send_heartbeat()
+        self.config.watch()
+
+        next_heartbeat = time.monotonic() + self.heartbeat_interval
+
+        try:
+            while self.running:
+                if not self.connectivity.online:
+                    # No polls or heartbeats while offline; resume as soon
+                    # as the monitor sees the backend again
+                    if not self.connectivity.wait_online(self.poll_interval):
+                        continue
+                    next_heartbeat = time.monotonic()
+
+                for device_id, command in self.poll_all().items():
+                    self.clients[device_id].scheduler.submit(command)
+
+                if time.monotonic() >= next_heartbeat:
+                    for client in self.clients.values():
+                        client.send_heartbeat()
+                    next_heartbeat = time.monotonic() + self.heartbeat_interval
+
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+        except KeyboardInterrupt:
+            print("\n\nShutting down...")
+            self.stop()
+
+    def stop(self):
+        """Stop polling and cleanup every device (stops its scheduler too)"""
+        self.running = False
+        self._wakeup.set()
+        self.config.stop()
+        for client in self.clients.values():
+            client.stop()
+        self.connectivity.stop()
+        self.session.close()
+
+
+def _parse_address(value):
+    """Accept I2C addresses as ints or strings like 0x61"""
+    return int(value, 0) if isinstance(value, str) else int(value)
+
+
+def load_fleet_config(path: str) -> dict:
+    """
+    Load a fleet config file
+
+    Example:
+        {
+            "backend_url": "https://your-app.com",
+            "poll_interval": 5,
+            "devices": [
+                {"device_id": "cab1-a", "motor_address": "0x60", "ir_pin": 25,
+                 "fingerprint_port": "/dev/serial0"},
+                {"device_id": "cab1-b", "motor_address": "0x61", "ir_pin": 26,
+                 "fingerprint_port": "/dev/ttyUSB0",
+                 "fingerprint_wake_pin": 5, "fingerprint_rst_pin": 6}
+            ]
+        }
+
+    Raises:
+        ValueError: no devices, a duplicate device_id, or two devices
+                    using the same GPIO pin
+    """
+    with open(path) as f:
+        config = json.load(f)
+
+    if not config.get("devices"):
+        raise ValueError("Fleet config needs at least one device")
+
+    device_ids = [device["device_id"] for device in config["devices"]]
+    if len(set(device_ids)) != len(device_ids):
+        raise ValueError("Fleet config has duplicate device_id entries")
+
+    # Each pin can only be claimed once per process (hardware/resources.py)
+    pins = {}
+    for device in config["devices"]:
+        used = [device.get("ir_pin", 25)]
+        if device.get("fingerprint_port"):
+            used += [device.get("fingerprint_wake_pin", 23), device.get("fingerprint_rst_pin", 24)]
+        for pin in used:
+            if pin in pins:
+                raise ValueError(f"GPIO {pin} is used by both {pins[pin]} and "
+                                 f"{device['device_id']}")
+            pins[pin] = device["device_id"]
+
+    return config
+
+
+if __name__ == "__main__":
+    import argparse
+    from wire_encoding import parse_wire_format
+
+    parser = argparse.ArgumentParser(description="RITA multi-dispenser fleet client")
+    parser.add_argument("config", help="Fleet config JSON file")
+    parser.add_argument("--wire-format", default="json",
+                        help="Upload encoding, e.g. msgpack+gzip (default: json)")
+    parser.add_argument("--settings", metavar="PATH",
+                        help="JSON settings file for every device, watched and applied "
+                             "live (see config.py)")
+    args = parser.parse_args()
+
+    try:
+        config = load_fleet_config(args.config)
+        wire_format, compression = parse_wire_format(args.wire_format)
+    except ValueError as e:
+        parser.error(str(e))
+
+    poll_interval = config.get("poll_interval", 5)
+    fleet = FleetClient(config["backend_url"], config["devices"], poll_interval,
+                        wire_format=wire_format, compression=compression,
+                        config=RuntimeConfig(args.settings,
+                                             base={"client.poll_interval": poll_interval}))
+    fleet.start()
@@ -2,25 +2,47 @@ import { NextRequest, NextResponse } from "next/server";
 import {
   CommandNames,
   CommandName,
+  commandEtag,
+  getCommandSeq,
+  peekPendingCommand,
   popPendingCommand,
   setPendingCommand,
 } from "../../store";
 
 export async function GET(
-  _req: NextRequest,
+  req: NextRequest,
   { params }: { params: Promise<{ deviceId: string }> },
 ) {
   const { deviceId } = await params;
+
+  // Conditional poll: if nothing changed since the client's last poll,
+  // answer with a header-only 304 instead of a { command: null } body.
+  const seq = getCommandSeq(deviceId);
+  const since = req.nextUrl.searchParams.get("since");
+  const unchanged =
+    req.headers.get("if-none-match") === commandEtag(seq) || since === String(seq);
+  if (unchanged && !peekPendingCommand(deviceId)) {
+    return new NextResponse(null, {
+      status: 304,
+      headers: { ETag: commandEtag(seq), "X-Command-Seq": String(seq) },
+    });
+  }
+
   const command = popPendingCommand(deviceId);
+  const nextSeq = getCommandSeq(deviceId);
+  const headers = { ETag: commandEtag(nextSeq), "X-Command-Seq": String(nextSeq) };
 
   if (!command) {
-    return NextResponse.json({ command: null });
+    return NextResponse.json({ command: null }, { headers });
   }
 
-  return NextResponse.json({
-    command: command.command,
-    params: command.params ?? null,
-  });
+  return NextResponse.json(
+    {
+      command: command.command,
+      params: command.params ?? null,
+    },
+    { headers },
+  );
 }
 
 export async function POST(
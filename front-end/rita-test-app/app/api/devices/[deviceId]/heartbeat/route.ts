@@ -1,5 +1,6 @@
 import { NextRequest, NextResponse } from "next/server";
 import { setHeartbeat } from "../../store";
+import { decodeBody, expandHeartbeat, UnsupportedMediaTypeError } from "../../wire";
 
 export async function POST(
   req: NextRequest,
@@ -15,9 +16,12 @@ export async function POST(
   } = {};
 
   try {
-    body = (await req.json()) as typeof body;
-  } catch {
-    return NextResponse.json({ error: "Invalid JSON" }, { status: 400 });
+    body = expandHeartbeat(await decodeBody(req)) as typeof body;
+  } catch (error) {
+    if (error instanceof UnsupportedMediaTypeError) {
+      return NextResponse.json({ error: error.message }, { status: 415 });
+    }
+    return NextResponse.json({ error: "Invalid body" }, { status: 400 });
   }
 
   setHeartbeat(deviceId, {
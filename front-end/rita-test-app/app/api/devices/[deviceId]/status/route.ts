@@ -1,5 +1,10 @@
 import { NextRequest, NextResponse } from "next/server";
 import { setStatus } from "../../store";
+import {
+  decodeBody,
+  expandStatusBody,
+  UnsupportedMediaTypeError,
+} from "../../wire";
 
 export async function POST(
   req: NextRequest,
@@ -7,28 +12,34 @@ export async function POST(
 ) {
   const { deviceId } = await params;
 
-  let body: {
+  // A single status, or a batch (array / compact { b: [...] }) of statuses
+  let statuses: {
     status_type?: string;
     timestamp?: string;
     data?: Record<string, unknown>;
-  } = {};
+  }[] = [];
 
   try {
-    body = (await req.json()) as typeof body;
-  } catch {
-    return NextResponse.json({ error: "Invalid JSON" }, { status: 400 });
+    statuses = expandStatusBody(await decodeBody(req)) as typeof statuses;
+  } catch (error) {
+    if (error instanceof UnsupportedMediaTypeError) {
+      return NextResponse.json({ error: error.message }, { status: 415 });
+    }
+    return NextResponse.json({ error: "Invalid body" }, { status: 400 });
   }
 
-  if (!body.status_type) {
+  if (statuses.length === 0 || statuses.some((body) => !body.status_type)) {
     return NextResponse.json({ error: "status_type is required" }, { status: 400 });
   }
 
-  setStatus(deviceId, {
-    device_id: deviceId,
-    status_type: body.status_type,
-    timestamp: body.timestamp,
-    data: body.data ?? {},
-  });
+  for (const body of statuses) {
+    setStatus(deviceId, {
+      device_id: deviceId,
+      status_type: body.status_type!,
+      timestamp: body.timestamp,
+      data: body.data ?? {},
+    });
+  }
 
   return NextResponse.json({ ok: true });
 }
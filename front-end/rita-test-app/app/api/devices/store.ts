@@ -6,6 +6,13 @@ export const CommandNames = [
   "dispense",
   "register_fingerprint",
   "check_hand",
+  "unlock_and_dispense",
+  "emergency_stop",
+  "update_config",
+  "export_fingerprints",
+  "sync_fingerprints",
+  "register_fingerprint_session",
+  "upload_event_log",
 ] as const;
 
 export type CommandName = (typeof CommandNames)[number];
@@ -35,6 +42,9 @@ export type DeviceHeartbeat = {
 
 export type DeviceState = {
   pendingCommand: PendingCommand | null;
+  // Monotonic version of the command slot, bumped on every set and pop.
+  // Served as the commands ETag so idle polls can be answered with 304.
+  commandSeq: number;
   lastStatus: DeviceStatus | null;
   lastHeartbeat: DeviceHeartbeat | null;
 };
@@ -48,23 +58,98 @@ function validateCommand(
   if (!CommandNames.includes(command as CommandName)) {
     throw new Error(`Invalid command: ${command}`);
   }
+  if (params != null && (typeof params !== "object" || Array.isArray(params))) {
+    throw new Error("params must be an object");
+  }
+
+  const userId = params?.user_id;
+  if ((command === "unlock" || command === "unlock_and_dispense") && userId != null) {
+    if (typeof userId !== "number" || !Number.isInteger(userId) || userId < 1) {
+      throw new Error(`${command} user_id must be a positive integer`);
+    }
+  }
 
   if (command === "dispense") {
-    const motorId = params?.motor_id;
-    const segment = params?.segment;
-    if (typeof motorId !== "number" || !Number.isInteger(motorId) || motorId < 0) {
-      throw new Error("dispense requires numeric motor_id");
+    validateDispense(params);
+  }
+
+  if (command === "unlock_and_dispense") {
+    const dispenses = params?.dispenses;
+    if (!Array.isArray(dispenses) || dispenses.length === 0) {
+      throw new Error("unlock_and_dispense requires a non-empty dispenses list");
+    }
+    for (const item of dispenses) {
+      validateDispense(item as Record<string, unknown>);
+    }
+  }
+
+  if (command === "update_config" && !params?.reset) {
+    // Individual settings are checked by the Pi (config.py SCHEMA)
+    const settings = params?.settings;
+    if (!isObject(settings) || !Object.values(settings).every(isObject)) {
+      throw new Error("update_config requires settings: {section: {setting: value}} or reset");
+    }
+  }
+
+  if (command === "register_fingerprint_session") {
+    const count = params?.count;
+    if (typeof count !== "number" || !Number.isInteger(count) || count < 1 || count > 10) {
+      throw new Error("register_fingerprint_session requires count from 1 to 10");
+    }
+    const retries = params?.retries;
+    if (retries != null && (typeof retries !== "number" || !Number.isInteger(retries) || retries < 0 || retries > 5)) {
+      throw new Error("register_fingerprint_session retries must be 0 to 5");
+    }
+  }
+
+  if (command === "upload_event_log") {
+    for (const key of ["since", "until"]) {
+      const value = params?.[key];
+      if (value != null && typeof value !== "number") {
+        throw new Error(`upload_event_log ${key} must be epoch seconds`);
+      }
     }
-    if (typeof segment !== "number" || !Number.isInteger(segment) || segment < 0) {
-      throw new Error("dispense requires numeric segment");
+    const events = params?.events;
+    if (events != null && (!Array.isArray(events) || !events.every((e) => typeof e === "string"))) {
+      throw new Error("upload_event_log events must be a list of event types");
     }
   }
+
+  if (command === "export_fingerprints" && params?.user_ids != null) {
+    const userIds = params.user_ids;
+    if (!Array.isArray(userIds) || !userIds.every((id) => Number.isInteger(id) && id >= 1)) {
+      throw new Error("export_fingerprints user_ids must be a list of positive integers");
+    }
+  }
+
+  if (command === "sync_fingerprints") {
+    // The template store itself is checked by the Pi (hardware/templates.py)
+    if (typeof params?.templates !== "string" || !params.templates) {
+      throw new Error("sync_fingerprints requires templates (from fingerprints_exported)");
+    }
+  }
+}
+
+function isObject(value: unknown): value is Record<string, unknown> {
+  return typeof value === "object" && value !== null && !Array.isArray(value);
+}
+
+function validateDispense(params?: Record<string, unknown> | null) {
+  const motorId = params?.motor_id;
+  const segment = params?.segment;
+  if (typeof motorId !== "number" || !Number.isInteger(motorId) || motorId < 0) {
+    throw new Error("dispense requires numeric motor_id");
+  }
+  if (typeof segment !== "number" || !Number.isInteger(segment) || segment < 0) {
+    throw new Error("dispense requires numeric segment");
+  }
 }
 
 export function getDeviceState(deviceId: string): DeviceState {
   if (!devices.has(deviceId)) {
     devices.set(deviceId, {
       pendingCommand: null,
+      commandSeq: 0,
       lastStatus: null,
       lastHeartbeat: null,
     });
@@ -84,12 +169,16 @@ export function setPendingCommand(
     params: params ?? null,
     issuedAt: new Date().toISOString(),
   };
+  state.commandSeq += 1;
 }
 
 export function popPendingCommand(deviceId: string): PendingCommand | null {
   const state = getDeviceState(deviceId);
   const cmd = state.pendingCommand;
   state.pendingCommand = null; // clear on read to avoid replay
+  if (cmd) {
+    state.commandSeq += 1;
+  }
   return cmd;
 }
 
@@ -98,6 +187,14 @@ export function peekPendingCommand(deviceId: string): PendingCommand | null {
   return state.pendingCommand;
 }
 
+export function getCommandSeq(deviceId: string): number {
+  return getDeviceState(deviceId).commandSeq;
+}
+
+export function commandEtag(seq: number): string {
+  return `"${seq}"`;
+}
+
 export function setStatus(deviceId: string, status: Omit<DeviceStatus, "receivedAt">) {
   const state = getDeviceState(deviceId);
   state.lastStatus = {
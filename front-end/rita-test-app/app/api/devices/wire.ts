@@ -0,0 +1,162 @@
+import { gunzipSync } from "node:zlib";
+import { NextRequest } from "next/server";
+
+// Request body decoding for device uploads.
+//
+// Devices send either the verbose JSON schema (application/json) or the
+// compact schema as MessagePack (application/msgpack), optionally gzipped
+// (Content-Encoding: gzip). Compact bodies are expanded here so the routes
+// only ever see the verbose schema. Anything else is rejected with 415 and
+// the device falls back to JSON.
+
+export class UnsupportedMediaTypeError extends Error {}
+
+export class InvalidBodyError extends Error {}
+
+type Compact = Record<string, unknown>;
+
+export async function decodeBody(req: NextRequest): Promise<unknown> {
+  const contentType = (req.headers.get("content-type") ?? "application/json")
+    .split(";")[0]
+    .trim()
+    .toLowerCase();
+  const encoding = (req.headers.get("content-encoding") ?? "identity").trim().toLowerCase();
+
+  if (contentType !== "application/json" && contentType !== "application/msgpack") {
+    throw new UnsupportedMediaTypeError(`Unsupported content type: ${contentType}`);
+  }
+  if (encoding !== "identity" && encoding !== "gzip") {
+    throw new UnsupportedMediaTypeError(`Unsupported content encoding: ${encoding}`);
+  }
+
+  let bytes: Uint8Array = new Uint8Array(await req.arrayBuffer());
+  try {
+    if (encoding === "gzip") {
+      bytes = gunzipSync(bytes);
+    }
+    if (contentType === "application/json") {
+      return JSON.parse(new TextDecoder().decode(bytes));
+    }
+    return decodeMsgpack(bytes);
+  } catch (error) {
+    if (error instanceof UnsupportedMediaTypeError) throw error;
+    throw new InvalidBodyError((error as Error).message);
+  }
+}
+
+function isoFromMillis(ts: unknown): string | undefined {
+  return typeof ts === "number" ? new Date(ts).toISOString() : undefined;
+}
+
+// Compact -> verbose schema. Verbose bodies pass through unchanged.
+
+export function expandStatus(body: Compact): Compact {
+  if (!("t" in body)) return body;
+  return {
+    status_type: body.t,
+    timestamp: isoFromMillis(body.ts),
+    data: body.d,
+  };
+}
+
+export function expandStatusBody(body: unknown): Compact[] {
+  if (Array.isArray(body)) return body as Compact[];
+  const obj = (body ?? {}) as Compact;
+  if (Array.isArray(obj.b)) return (obj.b as Compact[]).map(expandStatus);
+  return [expandStatus(obj)];
+}
+
+export function expandHeartbeat(body: unknown): Compact {
+  const obj = (body ?? {}) as Compact;
+  if (!("ts" in obj)) return obj;
+  return {
+    timestamp: isoFromMillis(obj.ts),
+    ip_address: obj.ip,
+    locked: obj.l,
+    fingerprint_count: obj.fc,
+  };
+}
+
+// Minimal MessagePack decoder covering every type the device encodes.
+export function decodeMsgpack(bytes: Uint8Array): unknown {
+  const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+  const text = new TextDecoder();
+  let pos = 0;
+
+  const str = (len: number) => {
+    const value = text.decode(bytes.subarray(pos, pos + len));
+    pos += len;
+    return value;
+  };
+  const bin = (len: number) => {
+    const value = bytes.slice(pos, pos + len);
+    pos += len;
+    return value;
+  };
+  const array = (len: number): unknown[] => {
+    const out: unknown[] = [];
+    for (let i = 0; i < len; i++) out.push(read());
+    return out;
+  };
+  const map = (len: number): Compact => {
+    const out: Compact = {};
+    for (let i = 0; i < len; i++) {
+      const key = String(read());
+      out[key] = read();
+    }
+    return out;
+  };
+  const u8 = () => view.getUint8(pos++);
+  const u16 = () => {
+    const v = view.getUint16(pos);
+    pos += 2;
+    return v;
+  };
+  const u32 = () => {
+    const v = view.getUint32(pos);
+    pos += 4;
+    return v;
+  };
+
+  function read(): unknown {
+    if (pos >= bytes.length) throw new Error("Truncated msgpack body");
+    const b = u8();
+
+    if (b <= 0x7f) return b;
+    if (b >= 0xe0) return b - 0x100;
+    if ((b & 0xf0) === 0x80) return map(b & 0x0f);
+    if ((b & 0xf0) === 0x90) return array(b & 0x0f);
+    if ((b & 0xe0) === 0xa0) return str(b & 0x1f);
+
+    let v: number;
+    switch (b) {
+      case 0xc0: return null;
+      case 0xc2: return false;
+      case 0xc3: return true;
+      case 0xc4: return bin(u8());
+      case 0xc5: return bin(u16());
+      case 0xc6: return bin(u32());
+      case 0xca: v = view.getFloat32(pos); pos += 4; return v;
+      case 0xcb: v = view.getFloat64(pos); pos += 8; return v;
+      case 0xcc: return u8();
+      case 0xcd: return u16();
+      case 0xce: return u32();
+      case 0xcf: v = Number(view.getBigUint64(pos)); pos += 8; return v;
+      case 0xd0: v = view.getInt8(pos); pos += 1; return v;
+      case 0xd1: v = view.getInt16(pos); pos += 2; return v;
+      case 0xd2: v = view.getInt32(pos); pos += 4; return v;
+      case 0xd3: v = Number(view.getBigInt64(pos)); pos += 8; return v;
+      case 0xd9: return str(u8());
+      case 0xda: return str(u16());
+      case 0xdb: return str(u32());
+      case 0xdc: return array(u16());
+      case 0xdd: return array(u32());
+      case 0xde: return map(u16());
+      case 0xdf: return map(u32());
+      default:
+        throw new Error(`Unsupported msgpack type 0x${b.toString(16)}`);
+    }
+  }
+
+  return read();
+}
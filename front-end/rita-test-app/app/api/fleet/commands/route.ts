@@ -0,0 +1,39 @@
+import { NextRequest, NextResponse } from "next/server";
+import {
+  commandEtag,
+  getCommandSeq,
+  peekPendingCommand,
+  popPendingCommand,
+} from "../../devices/store";
+
+// Bulk poll for multi-dispenser cabinets: one request returns (and clears)
+// the pending command of every listed device.
+export async function GET(req: NextRequest) {
+  const deviceIds = (req.nextUrl.searchParams.get("devices") ?? "")
+    .split(",")
+    .map((id) => id.trim())
+    .filter(Boolean);
+
+  if (deviceIds.length === 0) {
+    return NextResponse.json({ error: "devices is required" }, { status: 400 });
+  }
+
+  // Each per-device sequence only ever grows, so their sum changes whenever
+  // any device's command slot changes.
+  const fleetEtag = () =>
+    commandEtag(deviceIds.reduce((sum, id) => sum + getCommandSeq(id), 0));
+
+  const etag = fleetEtag();
+  const anyPending = deviceIds.some((id) => peekPendingCommand(id));
+  if (req.headers.get("if-none-match") === etag && !anyPending) {
+    return new NextResponse(null, { status: 304, headers: { ETag: etag } });
+  }
+
+  const commands: Record<string, { command: string; params: unknown } | null> = {};
+  for (const id of deviceIds) {
+    const command = popPendingCommand(id);
+    commands[id] = command ? { command: command.command, params: command.params ?? null } : null;
+  }
+
+  return NextResponse.json({ commands }, { headers: { ETag: fleetEtag() } });
+}
@@ -7,7 +7,14 @@ type CommandName =
   | "lock"
   | "dispense"
   | "register_fingerprint"
-  | "check_hand";
+  | "check_hand"
+  | "unlock_and_dispense"
+  | "emergency_stop"
+  | "update_config"
+  | "export_fingerprints"
+  | "sync_fingerprints"
+  | "register_fingerprint_session"
+  | "upload_event_log";
 
 type PendingCommand = {
   command: CommandName;
@@ -117,6 +124,14 @@ export default function Home() {
     await handleSend("dispense", { motor_id: motorNum, segment: segmentNum });
   };
 
+  const handleUnlockAndDispense = async () => {
+    const motorNum = Number(motorId);
+    const segmentNum = Number(segment);
+    await handleSend("unlock_and_dispense", {
+      dispenses: [{ motor_id: motorNum, segment: segmentNum }],
+    });
+  };
+
   const formatJson = (value: unknown) => JSON.stringify(value, null, 2);
 
   const formatTime = (value?: string) => {
@@ -180,6 +195,13 @@ export default function Home() {
               >
                 Lock
               </button>
+              <button
+                onClick={() => handleSend("emergency_stop")}
+                className="rounded-md bg-red-600 px-4 py-2 text-sm font-medium text-white shadow-sm hover:bg-red-700 disabled:opacity-50"
+                disabled={isSending}
+              >
+                Emergency Stop
+              </button>
               <button
                 onClick={() => handleSend("register_fingerprint")}
                 className="rounded-md bg-amber-500 px-4 py-2 text-sm font-medium text-white shadow-sm hover:bg-amber-600 disabled:opacity-50"
@@ -226,6 +248,13 @@ export default function Home() {
                 >
                   Dispense
                 </button>
+                <button
+                  onClick={handleUnlockAndDispense}
+                  className="rounded-md bg-indigo-600 px-4 py-2 text-sm font-medium text-white shadow-sm hover:bg-indigo-700 disabled:opacity-50"
+                  disabled={isSending}
+                >
+                  Unlock &amp; Dispense
+                </button>
               </div>
             </div>
           </section>
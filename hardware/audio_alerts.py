@@ -9,6 +9,8 @@ class AudioPlayer:
         base_dir = Path(__file__).parent.parent
         self.warning_sound = os.path.join(base_dir, 'sounds', 'warning.wav')
         self.success_sound = os.path.join(base_dir, 'sounds', 'success.wav')
+        # Short double beep: place a finger on the sensor
+        self.prompt_sound = os.path.join(base_dir, 'sounds', 'prompt.wav')
     
     def play_sound(self, sound_type):
         """Play a sound alert using aplay (ALSA)"""
@@ -16,6 +18,8 @@ class AudioPlayer:
             sound_file = self.warning_sound
         elif sound_type == "success":
             sound_file = self.success_sound
+        elif sound_type == "prompt":
+            sound_file = self.prompt_sound
         else:
             return
         
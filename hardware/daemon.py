@@ -0,0 +1,255 @@
+"""
+Hardware Daemon
+Owns GPIO, serial and I2C in a process of its own and serves them to the
+network process (polling_client.py --hardware-socket) over a Unix socket
+
+Motor step timing and UART reads then never share an interpreter with
+HTTP calls, uploads or their garbage. Either process can restart: the
+hardware stays initialised while the network process reconnects, and the
+network process reconnects on its next call after a daemon restart.
+
+The socket is created with mode 0600, or 0660 with --socket-group, and
+each connecting process is checked with SO_PEERCRED: only root, the
+daemon's own user and members of the socket group can drive the motors
+or enrol fingerprints.
+
+Usage: python3 -m hardware.daemon [--socket /run/rita/hardware.sock] [--socket-group rita]
+"""
+
+import grp
+import os
+import pwd
+import signal
+import socket
+import struct
+import threading
+
+from hardware.remote import (
+    CALLBACK_ARG, CANCEL, CANCEL_ARG, DEFAULT_SOCKET, ERROR, EVENT, METHODS,
+    REQUEST, RESPONSE, read_frame, send_frame,
+)
+
+
+class HardwareDaemon:
+    """Serves hardware calls from any number of local connections"""
+
+    def __init__(self, socket_path=DEFAULT_SOCKET, motor_address=0x60, ir_pin=25,
+                 fingerprint_port="/dev/serial0", ir_sample_rate=200, socket_group=None):
+        """
+        Initialize daemon and hardware
+
+        Args:
+            socket_path: Unix socket to listen on
+            socket_group: Group (name or ID) whose members may connect too,
+                          e.g. the network process's user; default: only
+                          root and the daemon's user
+            motor_address: I2C address of the Motor HAT (default: 0x60)
+            ir_pin: BCM pin of the IR sensor (default: 25)
+            fingerprint_port: Serial port of the fingerprint reader, or None
+            ir_sample_rate: Background IR samples per second (default: 200)
+        """
+        from hardware.fingerprint_sensor import FingerprintSensor
+        from hardware.infrared_sensor import InfraredSensor
+        from hardware.ir_sampler import IRSampler
+        from hardware.stepper_motor import StepperMotorController
+
+        self.socket_path = socket_path
+        self.running = False
+        self.socket_gid = None
+        if socket_group is not None:
+            self.socket_gid = (int(socket_group) if str(socket_group).isdigit()
+                               else grp.getgrnam(socket_group).gr_gid)
+
+        print("Initializing hardware...")
+        infrared = InfraredSensor(ir_pin)
+        self.targets = {
+            "fingerprint": FingerprintSensor(fingerprint_port) if fingerprint_port else None,
+            "infrared": infrared,
+            "sampler": IRSampler(infrared, rate_hz=ir_sample_rate),
+            "motors": StepperMotorController(motor_address),
+        }
+        self.targets["sampler"].start()
+        print("✓ Hardware initialized")
+
+        self._server = None
+
+    def serve_forever(self):
+        """Accept connections until stop() is called"""
+        directory = os.path.dirname(self.socket_path)
+        if directory:
+            os.makedirs(directory, mode=0o755, exist_ok=True)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # Owner-only from the start, then opened up to the group if given
+        umask = os.umask(0o177)
+        try:
+            self._server.bind(self.socket_path)
+        finally:
+            os.umask(umask)
+        if self.socket_gid is not None:
+            os.chown(self.socket_path, -1, self.socket_gid)
+            os.chmod(self.socket_path, 0o660)
+        self._server.listen(4)
+        self.running = True
+        print(f"✓ Hardware daemon listening on {self.socket_path}")
+
+        while self.running:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                break
+            if not self._peer_allowed(conn):
+                conn.close()
+                continue
+            threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+
+    def _peer_allowed(self, conn):
+        """Only root, the daemon's user and the socket group may connect"""
+        try:
+            creds = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+            pid, uid, gid = struct.unpack("3i", creds)
+        except (AttributeError, OSError):
+            # No SO_PEERCRED outside Linux: the socket's mode is the only check
+            return True
+
+        allowed = uid in (0, os.getuid())
+        if not allowed and self.socket_gid is not None:
+            try:
+                allowed = (gid == self.socket_gid
+                           or pwd.getpwuid(uid).pw_name in grp.getgrgid(self.socket_gid).gr_mem)
+            except KeyError:
+                allowed = False
+        if not allowed:
+            print(f"⚠ Refused connection from pid {pid} (uid {uid})")
+        return allowed
+
+    def _serve_connection(self, conn):
+        print("✓ Network process connected")
+        send_lock = threading.Lock()
+        # request id -> cancel event of calls still running
+        cancels = {}
+        rfile = conn.makefile("rb")
+
+        try:
+            while True:
+                frame = read_frame(rfile)
+                if frame is None:
+                    break
+                request_id, kind, body = frame
+
+                if kind == CANCEL:
+                    cancel = cancels.get(request_id)
+                    if cancel:
+                        cancel.set()
+                elif kind == REQUEST:
+                    cancel = cancels[request_id] = threading.Event()
+                    threading.Thread(
+                        target=self._run_call,
+                        args=(conn, send_lock, request_id, body, cancel, cancels),
+                        daemon=True,
+                    ).start()
+        except (OSError, ValueError) as e:
+            print(f"✗ Connection error: {e}")
+        finally:
+            # The network process is gone: abort its waits, keep the hardware
+            for cancel in list(cancels.values()):
+                cancel.set()
+            conn.close()
+            print("⚠ Network process disconnected")
+
+    def _run_call(self, conn, send_lock, request_id, body, cancel, cancels):
+        def on_progress(event, data):
+            try:
+                send_frame(conn, send_lock, request_id, EVENT, {"e": event, "d": data})
+            except OSError:
+                pass
+
+        def decode(value):
+            if value == CANCEL_ARG:
+                return cancel
+            if value == CALLBACK_ARG:
+                return on_progress
+            return value
+
+        try:
+            target, method = body.get("t"), body.get("m")
+            obj = self.targets.get(target)
+            if obj is None or method not in METHODS.get(target, ()):
+                raise ValueError(f"Unsupported call: {target}.{method}")
+
+            args = [decode(a) for a in body.get("a", [])]
+            kwargs = {key: decode(value) for key, value in body.get("k", {}).items()}
+            kind, result = RESPONSE, getattr(obj, method)(*args, **kwargs)
+        except Exception as e:
+            kind, result = ERROR, {"error": f"{type(e).__name__}: {e}"}
+        finally:
+            cancels.pop(request_id, None)
+
+        try:
+            send_frame(conn, send_lock, request_id, kind, result)
+        except OSError:
+            pass
+
+    def stop(self):
+        """Stop serving and release the hardware"""
+        self.running = False
+        if self._server:
+            self._server.close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+        self.targets["sampler"].stop()
+        self.targets["motors"].cleanup()
+        if self.targets["fingerprint"]:
+            self.targets["fingerprint"].cleanup()
+        self.targets["infrared"].cleanup()
+        print("✓ Cleanup complete")
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="RITA hardware daemon")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET,
+                        help=f"Unix socket path (default: {DEFAULT_SOCKET})")
+    parser.add_argument("--socket-group",
+                        help="Group allowed to use the socket besides root and this user "
+                             "(socket mode 0660 instead of 0600)")
+    parser.add_argument("--motor-address", type=lambda v: int(v, 0), default=0x60,
+                        help="Motor HAT I2C address (default: 0x60)")
+    parser.add_argument("--ir-pin", type=int, default=25, help="IR sensor BCM pin (default: 25)")
+    parser.add_argument("--fingerprint-port", default="/dev/serial0",
+                        help="Fingerprint serial port, or 'none' (default: /dev/serial0)")
+    parser.add_argument("--ir-sample-rate", type=int, default=200,
+                        help="IR samples per second (default: 200)")
+    parser.add_argument("--record-trace", metavar="PATH",
+                        help="Record hardware I/O to a trace file for replay "
+                             "(python3 -m hardware.trace replay PATH)")
+    args = parser.parse_args()
+
+    recorder = None
+    if args.record_trace:
+        from hardware import trace
+        recorder = trace.record(args.record_trace)
+
+    fingerprint_port = None if args.fingerprint_port.lower() == "none" else args.fingerprint_port
+    daemon = HardwareDaemon(args.socket, args.motor_address, args.ir_pin,
+                            fingerprint_port, args.ir_sample_rate, args.socket_group)
+
+    # systemd stops services with SIGTERM
+    signal.signal(signal.SIGTERM, lambda *_: daemon.stop())
+
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        print("\n\nShutting down...")
+    finally:
+        if daemon.running:
+            daemon.stop()
+        if recorder:
+            recorder.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,9 +3,12 @@ Fingerprint Sensor Module
 Simplified interface for UART Capacitive Fingerprint Reader
 """
 
+import functools
+import os
 import serial
 import time
 import RPi.GPIO as GPIO
+from hardware import resources, templates
 from hardware.audio_alerts import AudioPlayer
 
 # Response codes
@@ -13,78 +16,176 @@ ACK_SUCCESS = 0x00
 ACK_FAIL = 0x01
 ACK_FULL = 0x04
 ACK_NO_USER = 0x05
+ACK_USER_EXIST = 0x06
 ACK_TIMEOUT = 0x08
 ACK_GO_OUT = 0x0F
+# Not sent by the module: returned when the host cancels a command
+ACK_CANCELLED = 0xFE
 
 # Command codes
 CMD_HEAD = 0xF5
 CMD_TAIL = 0xF5
 CMD_ADD_1 = 0x01
 CMD_ADD_3 = 0x03
-CMD_MATCH = 0x0C
+CMD_COMPARE = 0x0B  # 1:1 - scan against one user's template
+CMD_MATCH = 0x0C    # 1:N - search the whole library
+CMD_DEL = 0x04
 CMD_DEL_ALL = 0x05
 CMD_USER_CNT = 0x09
 CMD_COM_LEV = 0x28
+CMD_ALL_USERS = 0x2B          # IDs and permissions of every stored user
+CMD_UPLOAD_TEMPLATE = 0x31    # module -> host: one user's eigenvalues
+CMD_DOWNLOAD_TEMPLATE = 0x41  # host -> module: store eigenvalues as a user
 
 USER_MAX_CNT = 1000
 
+# Most fingers one add_users() session enrols
+SESSION_MAX_FINGERS = 10
+# Most extra attempts per finger in an add_users() session
+SESSION_MAX_RETRIES = 5
+
+# Data packet payload of a template upload/download (user ID, permission,
+# eigenvalues); on the wire it is framed by head, checksum and tail
+TEMPLATE_PACKET_SIZE = 3 + templates.TEMPLATE_SIZE
+
+# Longest reply read into the preallocated receive buffer: a reply frame
+# followed by a template data packet
+RX_BUFFER_SIZE = 8 + TEMPLATE_PACKET_SIZE + 3
+
 # GPIO Pins
 FINGER_WAKE_PIN = 23
 FINGER_RST_PIN = 24
 
 
+def _xor(data):
+    checksum = 0
+    for byte in data:
+        checksum ^= byte
+    return checksum
+
+
+def _holds_port(method):
+    """Run the method with the serial port held, so g_rx_buf stays the caller's"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.port_lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
 class FingerprintSensor:
     """Interface for fingerprint sensor operations"""
     
-    def __init__(self, serial_port="/dev/serial0", baudrate=19200):
+    # Seconds get_user_count waits for a scan in progress before answering
+    # from the last known count (the heartbeat must not block on a scan)
+    BUSY_WAIT = 0.2
+    
+    def __init__(self, serial_port="/dev/serial0", baudrate=19200,
+                 wake_pin=FINGER_WAKE_PIN, rst_pin=FINGER_RST_PIN, compare_level=5):
         """Initialize fingerprint sensor"""
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setwarnings(False)
-        GPIO.setup(FINGER_WAKE_PIN, GPIO.OUT, initial=GPIO.HIGH)  # Keep wake pin HIGH
-        GPIO.setup(FINGER_RST_PIN, GPIO.OUT, initial=GPIO.HIGH)
+        self.wake_pin = wake_pin
+        self.rst_pin = rst_pin
+        # Seconds to wait for a finger when verifying, and per enrolment scan
+        self.scan_timeout = 5
+        self.enroll_timeout = 6
         
-        self.ser = serial.Serial(serial_port, baudrate)
-        self.g_rx_buf = []
+        manager = resources.get_manager()
+        manager.claim(f"serial:{serial_port}", self)
+        manager.claim_pin(GPIO, self.wake_pin, GPIO.OUT, self, initial=GPIO.HIGH)  # Keep wake pin HIGH
+        manager.claim_pin(GPIO, self.rst_pin, GPIO.OUT, self, initial=GPIO.HIGH)
+        # Held for a whole command/response exchange (scans included)
+        self.port_lock = manager.lock(f"serial:{serial_port}")
+        
+        try:
+            self.ser = serial.Serial(serial_port, baudrate)
+        except Exception:
+            manager.release(self)
+            raise
+        # A real port is read straight into the receive buffer (os.readv):
+        # pyserial's readinto() is read() plus a copy, and blocks until the
+        # whole buffer is filled. Trace-recording and simulated ports have no
+        # fileno(), so their reads go through readinto().
+        try:
+            self._fd = self.ser.fileno()
+        except (AttributeError, OSError, ValueError, serial.SerialException):
+            self._fd = None
+        # Reused by every command: no per-command list or bytearray churn.
+        # g_rx_buf is a view of the bytes received for the last command.
+        self._tx_buf = bytearray(8)
+        self._rx_buf = bytearray(RX_BUFFER_SIZE)
+        self._rx_view = memoryview(self._rx_buf)
+        self.g_rx_buf = self._rx_view[:0]
+        self.last_user_count = -1
         
         # Reset module
         self._reset_module()
         
-        # Set compare level to 5 (moderate - may need tuning)
-        self._set_compare_level(5)
+        # Compare level 5 is moderate; tune it with configure() at runtime
+        self.compare_level = compare_level
+        self._set_compare_level(compare_level)
         
         self.audio_player = AudioPlayer()
     
     def _reset_module(self):
         """Reset the fingerprint module"""
-        GPIO.output(FINGER_RST_PIN, GPIO.LOW)
+        GPIO.output(self.rst_pin, GPIO.LOW)
         time.sleep(0.25)
-        GPIO.output(FINGER_RST_PIN, GPIO.HIGH)
+        GPIO.output(self.rst_pin, GPIO.HIGH)
         time.sleep(0.25)
     
-    def _tx_and_rx_cmd(self, command_buf, rx_bytes_need, timeout):
-        """Send command and receive response"""
+    def _read_available(self, view):
+        """
+        Read the bytes already received, at most len(view), into view
+        
+        Never blocks: the caller's timeout and cancel checks keep working
+        when the module sends a short or garbled reply.
+        """
+        count = min(self.ser.in_waiting, len(view))
+        if not count:
+            return 0
+        if self._fd is not None:
+            return os.readv(self._fd, [view[:count]])
+        return self.ser.readinto(view[:count])
+    
+    @_holds_port
+    def _tx_and_rx_cmd(self, command_buf, rx_bytes_need, timeout, cancel=None, packet=None):
+        """
+        Send command and receive response
+        
+        If the optional cancel event is set while waiting, returns
+        ACK_CANCELLED straight away. A late reply from the module is
+        discarded by the next command's reset_input_buffer().
+        
+        packet is the payload of a data packet sent right after the
+        command (template download); the reply comes after both.
+        """
         checksum = 0
-        tx_buf = bytearray()
+        tx_buf = self._tx_buf
         
-        tx_buf.append(CMD_HEAD)
-        for byte in command_buf:
-            tx_buf.append(byte)
+        tx_buf[0] = CMD_HEAD
+        for i, byte in enumerate(command_buf, 1):
+            tx_buf[i] = byte
             checksum ^= byte
         
-        tx_buf.append(checksum)
-        tx_buf.append(CMD_TAIL)
+        tx_buf[6] = checksum
+        tx_buf[7] = CMD_TAIL
         
         self.ser.reset_input_buffer()
         self.ser.write(tx_buf)
+        if packet is not None:
+            self.ser.write(bytes((CMD_HEAD,)) + packet + bytes((_xor(packet), CMD_TAIL)))
         
-        self.g_rx_buf = []
+        received = 0
+        self.g_rx_buf = self._rx_view[:0]
         start = time.time()
         
-        while time.time() - start < timeout and len(self.g_rx_buf) < rx_bytes_need:
-            if self.ser.in_waiting:
-                self.g_rx_buf.extend(self.ser.read(self.ser.in_waiting))
+        while time.time() - start < timeout and received < rx_bytes_need:
+            if cancel is not None and cancel.is_set():
+                return ACK_CANCELLED
+            received += self._read_available(self._rx_view[received:rx_bytes_need])
         
-        if len(self.g_rx_buf) != rx_bytes_need:
+        self.g_rx_buf = self._rx_view[:received]
+        if received != rx_bytes_need:
             return ACK_TIMEOUT
         if self.g_rx_buf[0] != CMD_HEAD or self.g_rx_buf[-1] != CMD_TAIL:
             return ACK_FAIL
@@ -100,6 +201,60 @@ class FingerprintSensor:
         
         return ACK_SUCCESS
     
+    @_holds_port
+    def _rx_data_packet(self, length, timeout, cancel=None):
+        """
+        Read the data packet that follows a command's reply frame
+        
+        Returns a view of its payload (length bytes), valid until the next
+        command, or None if it didn't arrive complete and intact in time.
+        """
+        size = length + 3
+        if 8 + size <= RX_BUFFER_SIZE:
+            view = self._rx_view[8:8 + size]
+        else:
+            # Only the user list is longer than a template packet
+            view = memoryview(bytearray(size))
+        
+        received = 0
+        start = time.time()
+        while time.time() - start < timeout and received < size:
+            if cancel is not None and cancel.is_set():
+                return None
+            received += self._read_available(view[received:])
+        
+        if received != size or view[0] != CMD_HEAD or view[-1] != CMD_TAIL:
+            return None
+        payload = view[1:-2]
+        if _xor(payload) != view[-2]:
+            return None
+        return payload
+    
+    def configure(self, compare_level=None, scan_timeout=None, enroll_timeout=None):
+        """
+        Change settings on the running sensor (no reset)
+        
+        Args:
+            compare_level: Match strictness 0-9 (higher is stricter),
+                           written to the module right away
+            scan_timeout: Seconds verify_user waits for a finger
+            enroll_timeout: Seconds add_user waits for each scan
+        
+        Returns: dict of the settings that changed
+        """
+        changed = {}
+        if compare_level is not None and compare_level != self.compare_level:
+            # The module answers with the level now in effect
+            if self._set_compare_level(compare_level) != compare_level:
+                raise IOError(f"Module did not accept compare level {compare_level}")
+            self.compare_level = changed["compare_level"] = compare_level
+        if scan_timeout is not None and scan_timeout != self.scan_timeout:
+            self.scan_timeout = changed["scan_timeout"] = scan_timeout
+        if enroll_timeout is not None and enroll_timeout != self.enroll_timeout:
+            self.enroll_timeout = changed["enroll_timeout"] = enroll_timeout
+        return changed
+    
+    @_holds_port
     def _set_compare_level(self, level):
         """Set compare level (0-9, higher is stricter)"""
         command_buf = [CMD_COM_LEV, 0, level, 0, 0]
@@ -113,20 +268,38 @@ class FingerprintSensor:
             return 0xFF
     
     def get_user_count(self):
-        """Get number of registered fingerprints"""
-        command_buf = [CMD_USER_CNT, 0, 0, 0, 0]
-        r = self._tx_and_rx_cmd(command_buf, 8, 0.1)
+        """
+        Get number of registered fingerprints
         
-        if r == ACK_TIMEOUT:
-            return -1
-        if r == ACK_SUCCESS and self.g_rx_buf[4] == ACK_SUCCESS:
-            return self.g_rx_buf[3]
-        else:
-            return -1
+        While another thread holds the port for a scan, returns the last
+        count read instead of waiting for the scan to finish.
+        """
+        if not self.port_lock.acquire(timeout=self.BUSY_WAIT):
+            return self.last_user_count
+        try:
+            command_buf = [CMD_USER_CNT, 0, 0, 0, 0]
+            r = self._tx_and_rx_cmd(command_buf, 8, 0.1)
+            
+            if r == ACK_TIMEOUT:
+                return -1
+            if r == ACK_SUCCESS and self.g_rx_buf[4] == ACK_SUCCESS:
+                self.last_user_count = (self.g_rx_buf[2] << 8) | self.g_rx_buf[3]
+                return self.last_user_count
+            else:
+                return -1
+        finally:
+            self.port_lock.release()
     
-    def add_user(self):
+    @_holds_port
+    def add_user(self, cancel=None, on_progress=None):
         """
         Register a new fingerprint
+        
+        Args:
+            cancel: Optional threading.Event that aborts the scan waits
+            on_progress: Optional callback(event, data) called with
+                         "scan_1_ok" and "scan_2_ok" as each scan succeeds
+        
         Returns: dict with 'success' (bool) and 'message' (str)
         """
         user_count = self.get_user_count()
@@ -135,28 +308,157 @@ class FingerprintSensor:
             self.audio_player.play_sound("warning")
             return {"success": False, "message": "Fingerprint library is full"}
         
-        command_buf = [CMD_ADD_1, 0, user_count + 1, 3, 0]
-        r = self._tx_and_rx_cmd(command_buf, 8, 6)
+        return self._enroll(self._free_user_id(user_count), cancel, on_progress)
+    
+    @_holds_port
+    def add_users(self, count, cancel=None, on_progress=None, retries=1):
+        """
+        Register several fingerprints in one session
+        
+        The user list is read once and the port is held for the whole
+        session, so the fingers are scanned back to back. The prompt sound
+        asks for each scan and the success sound confirms each finger. A
+        finger that fails is retried up to `retries` times before the
+        session moves on to the next one.
+        
+        Each finger is first searched for in the library (1:N), so a finger
+        that is already enrolled, earlier in the session or before it, fails
+        that attempt instead of getting a second user ID.
+        
+        Args:
+            count: Fingers to register (1 to SESSION_MAX_FINGERS)
+            cancel: Optional threading.Event that ends the session
+            on_progress: Optional callback(event, data) called with
+                         "finger_prompt" (index, count, user_id, attempt)
+                         before each finger, and add_user's scan events
+            retries: Extra attempts per finger (0 to SESSION_MAX_RETRIES,
+                     default: 1)
         
+        Returns: dict with 'success' (every finger registered), 'message',
+                 'user_ids' (new IDs in order) and 'failed' (list of
+                 {'index', 'message'})
+        """
+        if not 1 <= count <= SESSION_MAX_FINGERS:
+            return {"success": False, "message": f"count must be 1 to {SESSION_MAX_FINGERS}"}
+        if not 0 <= retries <= SESSION_MAX_RETRIES:
+            return {"success": False, "message": f"retries must be 0 to {SESSION_MAX_RETRIES}"}
+        
+        users = self.list_users()
+        if users is None:
+            self.audio_player.play_sound("warning")
+            return {"success": False, "message": "Could not read the user list"}
+        if len(users) + count > USER_MAX_CNT:
+            self.audio_player.play_sound("warning")
+            return {"success": False,
+                    "message": f"Fingerprint library only has room for {USER_MAX_CNT - len(users)} more"}
+        
+        used = set(users)
+        user_ids = []
+        failed = []
+        cancelled = False
+        new_id = 1
+        for index in range(1, count + 1):
+            while new_id in used:
+                new_id += 1
+            for attempt in range(1, retries + 2):
+                if on_progress:
+                    on_progress("finger_prompt", {
+                        "index": index, "count": count, "user_id": new_id, "attempt": attempt
+                    })
+                result = self._check_not_enrolled(cancel) if used else None
+                if result is None:
+                    result = self._enroll(new_id, cancel, on_progress, prompt=True)
+                if result["success"] or result.get("cancelled"):
+                    break
+            
+            if result.get("cancelled"):
+                cancelled = True
+                break
+            if result["success"]:
+                user_ids.append(new_id)
+                used.add(new_id)
+            else:
+                failed.append({"index": index, "message": result["message"]})
+        
+        self.last_user_count = len(used)
+        result = {
+            "success": len(user_ids) == count,
+            "message": f"Registered {len(user_ids)} of {count} fingerprints",
+            "user_ids": user_ids,
+            "failed": failed
+        }
+        if cancelled:
+            result["cancelled"] = True
+        return result
+    
+    def _check_not_enrolled(self, cancel=None):
+        """
+        1:N search for the finger about to be enrolled
+        
+        Returns: None if the library doesn't hold it, otherwise a failure
+                 dict ('user_id' is the existing ID when it matched)
+        """
+        self.audio_player.play_sound("prompt")
+        r = self._tx_and_rx_cmd([CMD_MATCH, 0, 0, 0, 0], 8, self.enroll_timeout, cancel)
+        
+        if r == ACK_CANCELLED:
+            return self._cancelled()
+        if r == ACK_TIMEOUT:
+            self.audio_player.play_sound("warning")
+            return {"success": False, "message": "Timeout waiting for finger"}
+        
+        status = self.g_rx_buf[4]
+        if r == ACK_SUCCESS and status == ACK_NO_USER:
+            return None
+        
+        self.audio_player.play_sound("warning")
+        matched_id = (self.g_rx_buf[2] << 8) | self.g_rx_buf[3]
+        if r == ACK_SUCCESS and 0x01 <= status <= 0x03 and 1 <= matched_id <= USER_MAX_CNT:
+            return {"success": False,
+                    "message": f"Finger already enrolled (ID: {matched_id})",
+                    "user_id": matched_id}
+        return {"success": False, "message": "Finger not read - ensure finger is centered on sensor"}
+    
+    def _enroll(self, new_id, cancel=None, on_progress=None, prompt=False):
+        """
+        Two-scan enrolment of one finger as new_id
+        
+        With prompt, the prompt sound asks for the finger before each scan.
+        """
+        command_buf = [CMD_ADD_1, new_id >> 8, new_id & 0xFF, 3, 0]
+        if prompt:
+            self.audio_player.play_sound("prompt")
+        r = self._tx_and_rx_cmd(command_buf, 8, self.enroll_timeout, cancel)
+        
+        if r == ACK_CANCELLED:
+            return self._cancelled()
         if r == ACK_TIMEOUT:
             self.audio_player.play_sound("warning")
             return {"success": False, "message": "Timeout waiting for first scan"}
         
         if r == ACK_SUCCESS and self.g_rx_buf[4] == ACK_SUCCESS:
             # First scan successful, do second scan
+            if on_progress:
+                on_progress("scan_1_ok", {"user_id": new_id})
             command_buf[0] = CMD_ADD_3
-            r = self._tx_and_rx_cmd(command_buf, 8, 6)
+            if prompt:
+                self.audio_player.play_sound("prompt")
+            r = self._tx_and_rx_cmd(command_buf, 8, self.enroll_timeout, cancel)
             
+            if r == ACK_CANCELLED:
+                return self._cancelled()
             if r == ACK_TIMEOUT:
                 self.audio_player.play_sound("warning")
                 return {"success": False, "message": "Timeout waiting for second scan"}
             
             if r == ACK_SUCCESS and self.g_rx_buf[4] == ACK_SUCCESS:
+                if on_progress:
+                    on_progress("scan_2_ok", {"user_id": new_id})
                 self.audio_player.play_sound("success")
                 return {
                     "success": True, 
-                    "message": f"Fingerprint registered successfully (ID: {user_count + 1})",
-                    "user_id": user_count + 1
+                    "message": f"Fingerprint registered successfully (ID: {new_id})",
+                    "user_id": new_id
                 }
             else:
                 self.audio_player.play_sound("warning")
@@ -165,19 +467,34 @@ class FingerprintSensor:
             self.audio_player.play_sound("warning")
             return {"success": False, "message": "First scan failed - ensure finger is centered on sensor"}
     
-    def verify_user(self):
+    @_holds_port
+    def verify_user(self, user_id=None, cancel=None):
         """
         Verify fingerprint against database
+        
+        Args:
+            user_id: Expected user ID (optional). When given, the scan is
+                     compared 1:1 against that user's template only instead
+                     of searching the whole library.
+            cancel: Optional threading.Event that aborts the scan wait
+        
         Returns: dict with 'success' (bool), 'message' (str), and 'user_id' (int) if successful
         """
+        if user_id is not None:
+            return self._verify_expected_user(user_id, cancel)
+        
         command_buf = [CMD_MATCH, 0, 0, 0, 0]
-        r = self._tx_and_rx_cmd(command_buf, 8, 5)
+        r = self._tx_and_rx_cmd(command_buf, 8, self.scan_timeout, cancel)
         
+        if r == ACK_CANCELLED:
+            return self._cancelled()
         if r == ACK_TIMEOUT:
             self.audio_player.play_sound("warning")
             return {"success": False, "message": "Timeout - no finger detected"}
         
         status = self.g_rx_buf[4] if len(self.g_rx_buf) > 4 else 0xFF
+        # Q1/Q2 carry the matched user ID, Q3 the user's permission level
+        matched_id = (self.g_rx_buf[2] << 8) | self.g_rx_buf[3] if len(self.g_rx_buf) > 4 else 0
         
         # Check for error codes FIRST
         if status == ACK_NO_USER:
@@ -190,18 +507,85 @@ class FingerprintSensor:
             self.audio_player.play_sound("warning")
             return {"success": False, "message": "No fingerprint detected"}
         
-        # Only accept valid user IDs (0x01-0xFE)
-        if 0x01 <= status <= 0xFE:
+        # Only accept valid user IDs
+        if 0x01 <= status <= 0xFE and 1 <= matched_id <= USER_MAX_CNT:
             self.audio_player.play_sound("success")
             return {
                 "success": True,
                 "message": "Fingerprint verified",
-                "user_id": status
+                "user_id": matched_id
             }
         
         self.audio_player.play_sound("warning")
         return {"success": False, "message": "Verification failed"}
     
+    def _verify_expected_user(self, user_id, cancel=None):
+        """
+        1:1 verification against a single known user
+        
+        Cost is constant regardless of how many templates are stored, and a
+        finger can only ever be accepted as the expected user. The backend
+        may send the ID as a string ("3"), so it is converted first.
+        """
+        try:
+            valid = 1 <= int(user_id) <= USER_MAX_CNT
+        except (TypeError, ValueError):
+            valid = False
+        if not valid:
+            self.audio_player.play_sound("warning")
+            return {"success": False, "message": f"Invalid user ID: {user_id}"}
+        user_id = int(user_id)
+        
+        command_buf = [CMD_COMPARE, user_id >> 8, user_id & 0xFF, 0, 0]
+        r = self._tx_and_rx_cmd(command_buf, 8, self.scan_timeout, cancel)
+        
+        if r == ACK_CANCELLED:
+            return self._cancelled()
+        if r == ACK_TIMEOUT:
+            self.audio_player.play_sound("warning")
+            return {"success": False, "message": "Timeout - no finger detected"}
+        
+        status = self.g_rx_buf[4] if r == ACK_SUCCESS else 0xFF
+        
+        if status == ACK_SUCCESS:
+            self.audio_player.play_sound("success")
+            return {
+                "success": True,
+                "message": "Fingerprint verified",
+                "user_id": user_id
+            }
+        elif status == ACK_GO_OUT:
+            self.audio_player.play_sound("warning")
+            return {"success": False, "message": "Finger not centered properly - please try again"}
+        elif status == ACK_TIMEOUT:
+            self.audio_player.play_sound("warning")
+            return {"success": False, "message": "Timeout - no finger detected"}
+        
+        self.audio_player.play_sound("warning")
+        return {"success": False, "message": f"Fingerprint does not match user {user_id}"}
+    
+    def _free_user_id(self, user_count):
+        """
+        Lowest unused user ID
+        
+        Imported templates keep their IDs, so the library can have gaps and
+        user_count + 1 may already be taken.
+        """
+        if user_count <= 0:
+            return user_count + 1
+        users = self.list_users()
+        if users is None:
+            return user_count + 1
+        new_id = 1
+        while new_id in users:
+            new_id += 1
+        return new_id
+    
+    def _cancelled(self):
+        """Result for a scan aborted by the host (no sound - not the user's fault)"""
+        return {"success": False, "message": "Cancelled", "cancelled": True}
+    
+    @_holds_port
     def clear_all_users(self):
         """Clear all registered fingerprints"""
         command_buf = [CMD_DEL_ALL, 0, 0, 0, 0]
@@ -217,8 +601,227 @@ class FingerprintSensor:
             self.audio_player.play_sound("warning")
             return {"success": False, "message": "Failed to clear fingerprints"}
     
+    @_holds_port
+    def list_users(self):
+        """
+        IDs and permissions of every stored fingerprint
+        
+        Returns: dict of user_id -> permission, or None if the module didn't answer
+        """
+        command_buf = [CMD_ALL_USERS, 0, 0, 0, 0]
+        r = self._tx_and_rx_cmd(command_buf, 8, 1)
+        
+        if r != ACK_SUCCESS:
+            return None
+        if self.g_rx_buf[4] == ACK_NO_USER:
+            return {}
+        if self.g_rx_buf[4] != ACK_SUCCESS:
+            return None
+        
+        # 3 bytes per user: a full library takes about 1.6s at 19200 baud
+        length = (self.g_rx_buf[2] << 8) | self.g_rx_buf[3]
+        payload = self._rx_data_packet(length, 1 + length * 0.001)
+        if payload is None or length < 2:
+            return None
+        
+        count = (payload[0] << 8) | payload[1]
+        users = {}
+        for offset in range(2, min(2 + 3 * count, length) - 2, 3):
+            users[(payload[offset] << 8) | payload[offset + 1]] = payload[offset + 2]
+        return users
+    
+    def _upload_template(self, user_id, cancel=None):
+        """
+        Read one user's template off the module
+        
+        Returns: (Template, None), or (None, reason) if it couldn't be read
+        """
+        command_buf = [CMD_UPLOAD_TEMPLATE, user_id >> 8, user_id & 0xFF, 0, 0]
+        r = self._tx_and_rx_cmd(command_buf, 8, 1, cancel)
+        
+        if r == ACK_CANCELLED:
+            return None, "cancelled"
+        if r == ACK_TIMEOUT:
+            return None, "timeout"
+        if r != ACK_SUCCESS:
+            return None, "invalid reply"
+        if self.g_rx_buf[4] == ACK_NO_USER:
+            return None, "no such user"
+        if self.g_rx_buf[4] != ACK_SUCCESS:
+            return None, f"module error {self.g_rx_buf[4]:#04x}"
+        
+        length = (self.g_rx_buf[2] << 8) | self.g_rx_buf[3]
+        if length != TEMPLATE_PACKET_SIZE:
+            return None, f"unexpected template size {length - 3}"
+        payload = self._rx_data_packet(length, 1, cancel)
+        if payload is None:
+            return None, "template packet lost or corrupt"
+        
+        template = templates.Template.from_packet(payload)
+        if template.user_id != user_id:
+            return None, f"module sent the template of user {template.user_id}"
+        return template, None
+    
+    def _download_template(self, template, cancel=None):
+        """
+        Store a template in the module under its user ID
+        
+        Returns: None on success, otherwise the reason it failed
+        """
+        command_buf = [CMD_DOWNLOAD_TEMPLATE, TEMPLATE_PACKET_SIZE >> 8, TEMPLATE_PACKET_SIZE & 0xFF, 0, 0]
+        r = self._tx_and_rx_cmd(command_buf, 8, 2, cancel, packet=template.to_packet())
+        
+        if r == ACK_CANCELLED:
+            return "cancelled"
+        if r == ACK_TIMEOUT:
+            return "timeout"
+        if r != ACK_SUCCESS:
+            return "invalid reply"
+        
+        status = self.g_rx_buf[4]
+        if status == ACK_SUCCESS:
+            return None
+        if status == ACK_FULL:
+            return "library full"
+        if status == ACK_USER_EXIST:
+            return "user already exists"
+        return f"module error {status:#04x}"
+    
+    def _delete_user(self, user_id):
+        """Delete one user's template"""
+        command_buf = [CMD_DEL, user_id >> 8, user_id & 0xFF, 0, 0]
+        r = self._tx_and_rx_cmd(command_buf, 8, 1)
+        return r == ACK_SUCCESS and self.g_rx_buf[4] == ACK_SUCCESS
+    
+    @_holds_port
+    def export_templates(self, user_ids=None, cancel=None):
+        """
+        Read templates off the module into a template store (hardware/templates.py)
+        
+        Args:
+            user_ids: Users to export (default: every stored user)
+            cancel: Optional threading.Event that aborts the export
+        
+        Returns: dict with 'success', 'message', 'templates' (base64 store),
+                 'user_ids' (exported) and 'failed' (user_id -> reason)
+        """
+        if user_ids is None:
+            users = self.list_users()
+            if users is None:
+                return {"success": False, "message": "Could not read the user list"}
+            user_ids = sorted(users)
+        
+        exported = []
+        failed = {}
+        for user_id in user_ids:
+            if cancel is not None and cancel.is_set():
+                return self._cancelled()
+            template, reason = self._upload_template(user_id, cancel)
+            if template is None:
+                failed[user_id] = reason
+            else:
+                exported.append(template)
+        
+        message = f"Exported {len(exported)} fingerprints"
+        if failed:
+            message += f", {len(failed)} failed"
+        return {
+            "success": bool(exported) or not failed,
+            "message": message,
+            "templates": templates.encode(exported),
+            "user_ids": [template.user_id for template in exported],
+            "failed": failed
+        }
+    
+    @_holds_port
+    def import_templates(self, data, overwrite=False, cancel=None):
+        """
+        Store the templates of a template store in the module
+        
+        Users keep their IDs, so a patient enrolled on one dispenser has the
+        same ID on every dispenser the store is imported into. An ID that
+        already holds the same template is skipped; one that holds a
+        different fingerprint is a conflict and fails, unless overwrite.
+        
+        Args:
+            data: base64 template store, as returned by export_templates
+            overwrite: Replace users that already exist (default: keep them)
+            cancel: Optional threading.Event that stops the import between templates
+        
+        Returns: dict with 'success', 'message', 'imported', 'skipped' and
+                 'conflicts' (user IDs) and 'failed' (user_id -> reason,
+                 conflicts included)
+        """
+        try:
+            incoming = templates.decode(data)
+        except templates.TemplateError as e:
+            return {"success": False, "message": str(e)}
+        
+        existing = self.list_users()
+        if existing is None:
+            return {"success": False, "message": "Could not read the user list"}
+        
+        imported = []
+        skipped = []
+        conflicts = []
+        failed = {}
+        cancelled = False
+        for template in incoming:
+            if cancel is not None and cancel.is_set():
+                cancelled = True
+                break
+            
+            user_id = template.user_id
+            if not 1 <= user_id <= USER_MAX_CNT:
+                failed[user_id] = "invalid user ID"
+                continue
+            if user_id in existing:
+                if not overwrite:
+                    stored, reason = self._upload_template(user_id, cancel)
+                    if stored == template:
+                        skipped.append(user_id)
+                    elif stored is not None:
+                        conflicts.append(user_id)
+                        failed[user_id] = "a different fingerprint is stored under this ID"
+                    elif reason == "cancelled":
+                        cancelled = True
+                        break
+                    else:
+                        failed[user_id] = f"could not read the stored template: {reason}"
+                    continue
+                if not self._delete_user(user_id):
+                    failed[user_id] = "could not delete the existing template"
+                    continue
+                del existing[user_id]
+            
+            reason = self._download_template(template, cancel)
+            if reason is None:
+                imported.append(user_id)
+                existing[user_id] = template.permission
+            else:
+                failed[user_id] = reason
+        
+        message = f"Imported {len(imported)} fingerprints"
+        if skipped:
+            message += f", {len(skipped)} already stored"
+        if conflicts:
+            message += f", {len(conflicts)} IDs taken by other fingerprints"
+        if len(failed) > len(conflicts):
+            message += f", {len(failed) - len(conflicts)} failed"
+        result = {
+            "success": not failed and not cancelled,
+            "message": message,
+            "imported": imported,
+            "skipped": skipped,
+            "conflicts": conflicts,
+            "failed": failed
+        }
+        if cancelled:
+            result["cancelled"] = True
+        return result
+    
     def cleanup(self):
         """Cleanup resources"""
         if self.ser and self.ser.is_open:
             self.ser.close()
-        GPIO.cleanup()
+        resources.get_manager().release(self)
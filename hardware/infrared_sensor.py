@@ -5,6 +5,7 @@ Simple interface for IR obstacle detection sensor
 
 import RPi.GPIO as GPIO
 import time
+from hardware import resources
 
 
 class InfraredSensor:
@@ -19,9 +20,8 @@ class InfraredSensor:
         """
         self.gpio_pin = gpio_pin
         
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setwarnings(False)
-        GPIO.setup(self.gpio_pin, GPIO.IN)
+        # Reads need no lock: the sampler and the wait loops only ever read
+        resources.get_manager().claim_pin(GPIO, self.gpio_pin, GPIO.IN, self)
     
     def is_hand_detected(self):
         """
@@ -33,12 +33,13 @@ class InfraredSensor:
         # Sensor is active LOW (outputs 0 when object detected)
         return GPIO.input(self.gpio_pin) == 0
     
-    def wait_for_hand(self, timeout=10):
+    def wait_for_hand(self, timeout=10, cancel=None):
         """
         Wait for hand to be detected
         
         Args:
             timeout: Maximum time to wait in seconds
+            cancel: Optional threading.Event that ends the wait early
             
         Returns:
             bool: True if hand detected within timeout, False otherwise
@@ -48,16 +49,18 @@ class InfraredSensor:
         while time.time() - start_time < timeout:
             if self.is_hand_detected():
                 return True
-            time.sleep(0.1)
+            if self._pause(cancel):
+                break
         
         return False
     
-    def wait_for_hand_removal(self, timeout=10):
+    def wait_for_hand_removal(self, timeout=10, cancel=None):
         """
         Wait for hand to be removed
         
         Args:
             timeout: Maximum time to wait in seconds
+            cancel: Optional threading.Event that ends the wait early
             
         Returns:
             bool: True if hand removed within timeout, False otherwise
@@ -67,10 +70,18 @@ class InfraredSensor:
         while time.time() - start_time < timeout:
             if not self.is_hand_detected():
                 return True
-            time.sleep(0.1)
+            if self._pause(cancel):
+                break
         
         return False
     
+    def _pause(self, cancel):
+        """Sleep one poll period; returns True if the wait was cancelled"""
+        if cancel is None:
+            time.sleep(0.1)
+            return False
+        return cancel.wait(0.1)
+    
     def cleanup(self):
-        """Cleanup GPIO resources"""
-        GPIO.cleanup()
+        """Release this sensor's pin (other sensors' pins are left as they are)"""
+        resources.get_manager().release(self)
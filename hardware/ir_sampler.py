@@ -0,0 +1,206 @@
+"""
+IR Sampler Module
+Samples the IR sensor in a background thread into a ring buffer so hand
+detection can be queried instantly, including for hands that arrived while
+the motor was still turning
+"""
+
+import threading
+import time
+from array import array
+
+
+class IRSampler:
+    """Background high-rate sampler for an InfraredSensor"""
+
+    def __init__(self, sensor, rate_hz=200, history_seconds=10, window=5):
+        """
+        Initialize sampler
+
+        Args:
+            sensor: InfraredSensor to read
+            rate_hz: Samples per second (default: 200)
+            history_seconds: How much history the ring buffer keeps (default: 10)
+            window: Raw samples in the majority filter (default: 5). The
+                    filtered state turns on when more than half of the window
+                    sees a hand and only turns off again when at most
+                    window // 2 - 1 do, so a flickering edge doesn't toggle it.
+        """
+        self.sensor = sensor
+        self.rate_hz = rate_hz
+        self.period = 1.0 / rate_hz
+        self._set_window(window)
+
+        # Ring buffer of (monotonic timestamp, filtered state), preallocated
+        # so the sampling loop never allocates
+        self.capacity = max(int(rate_hz * history_seconds), window)
+        self._times = array("d", bytes(8 * self.capacity))
+        self._states = bytearray(self.capacity)
+        self._head = 0
+        self._count = 0
+
+        self.present = False
+        self.last_detection = None
+        self.running = False
+        self._thread = None
+        self._cond = threading.Condition()
+
+    def _set_window(self, window, present=False):
+        """Size the majority filter; its history starts out agreeing with `present`"""
+        self.window = window
+        self.on_count = window // 2 + 1
+        self.off_count = max(window // 2 - 1, 0)
+        # Last `window` raw readings
+        self._raw = bytearray([1 if present else 0] * window)
+        self._raw_pos = 0
+        self._raw_sum = window if present else 0
+
+    def configure(self, filter_window=None):
+        """
+        Change the majority filter window while sampling
+
+        Returns:
+            dict of the settings that changed
+        """
+        if filter_window is None or filter_window == self.window:
+            return {}
+        with self._cond:
+            self._set_window(filter_window, self.present)
+        return {"filter_window": filter_window}
+
+    def start(self):
+        """Start sampling in a daemon thread"""
+        if self.running:
+            return
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name="ir-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling"""
+        self.running = False
+        if self._thread:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def _run(self):
+        next_sample = time.monotonic()
+        while self.running:
+            self._sample(time.monotonic(), self.sensor.is_hand_detected())
+
+            next_sample += self.period
+            delay = next_sample - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Fell behind (e.g. CPU busy): resync instead of bursting
+                next_sample = time.monotonic()
+
+    def _sample(self, now, raw):
+        """Record one raw reading and update the filtered state"""
+        raw = 1 if raw else 0
+
+        with self._cond:
+            self._raw_sum += raw - self._raw[self._raw_pos]
+            self._raw[self._raw_pos] = raw
+            self._raw_pos = (self._raw_pos + 1) % self.window
+
+            present = self.present
+            if not present and self._raw_sum >= self.on_count:
+                present = True
+                self.last_detection = now
+            elif present and self._raw_sum <= self.off_count:
+                present = False
+
+            self._times[self._head] = now
+            self._states[self._head] = present
+            self._head = (self._head + 1) % self.capacity
+            if self._count < self.capacity:
+                self._count += 1
+
+            # Waiters need every sample that saw a hand, not just the
+            # edge: wait_for_detection() may be looking for a newer one
+            if present or present != self.present:
+                self.present = present
+                self._cond.notify_all()
+
+    def _newest_first(self):
+        """Yield (timestamp, state) from newest to oldest (caller holds the lock)"""
+        index = self._head
+        for _ in range(self._count):
+            index = (index - 1) % self.capacity
+            yield self._times[index], self._states[index]
+
+    def hand_present(self, within_ms=None):
+        """
+        Check for a hand from memory
+
+        Args:
+            within_ms: If given, True when a hand was present at any point
+                       in the last within_ms milliseconds
+
+        Returns:
+            bool: Filtered hand state
+        """
+        with self._cond:
+            if within_ms is None:
+                return self.present
+            if self.present:
+                return True
+            cutoff = time.monotonic() - within_ms / 1000
+            if self.last_detection is not None and self.last_detection >= cutoff:
+                return True
+            for timestamp, state in self._newest_first():
+                if timestamp < cutoff:
+                    break
+                if state:
+                    return True
+        return False
+
+    def first_detection_after(self, since):
+        """
+        First sample at or after a time that saw a hand
+
+        Args:
+            since: time.monotonic() value, e.g. taken before the motor started
+
+        Returns:
+            Monotonic timestamp of the detection, or None
+        """
+        first = None
+        with self._cond:
+            for timestamp, state in self._newest_first():
+                if timestamp < since:
+                    break
+                if state:
+                    first = timestamp
+        return first
+
+    def wait_for_detection(self, since, timeout=10, cancel=None):
+        """
+        Wait until a hand has been seen at or after `since`
+
+        Returns immediately if a hand already showed up (e.g. while the
+        motor was still dispensing).
+
+        Args:
+            since: time.monotonic() value to look back to
+            timeout: Maximum time to wait in seconds, counted from now
+            cancel: Optional threading.Event that ends the wait early
+
+        Returns:
+            Monotonic timestamp of the detection, or None
+        """
+        deadline = time.monotonic() + timeout
+        # The lock is held between the check and the wait, so no sample is
+        # missed; the 0.1 s cap keeps the cancel check responsive
+        with self._cond:
+            while True:
+                detected = self.first_detection_after(since)
+                if detected is not None:
+                    return detected
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or (cancel is not None and cancel.is_set()):
+                    return None
+                self._cond.wait(min(remaining, 0.1))
@@ -0,0 +1,353 @@
+"""
+Remote Hardware Module
+Client side of the hardware daemon (hardware/daemon.py): proxies with the
+same methods as the local sensor and motor classes, forwarded over a Unix
+socket so the network process never touches GPIO, serial or I2C
+
+Framing: every message is a 9-byte header (body length, request id, kind)
+followed by a compact JSON body.
+
+    request   {"t": target, "m": method, "a": args, "k": kwargs}
+    response  return value
+    error     {"error": message}
+    event     {"e": event, "d": data}   (progress callback from the daemon)
+    cancel    {}                        (abort the request's hardware waits)
+
+threading.Event arguments are sent as CANCEL_ARG and callables as
+CALLBACK_ARG. The daemon swaps in its own event, set when a cancel frame
+arrives, and a callback that sends event frames back.
+"""
+
+import itertools
+import json
+import socket
+import struct
+import threading
+import time
+
+# In a runtime directory rather than /tmp; the daemon creates the socket
+# readable by its own user (and --socket-group) only
+DEFAULT_SOCKET = "/run/rita/hardware.sock"
+
+HEADER = struct.Struct("!IIB")
+MAX_BODY = 1 << 20
+
+REQUEST = 0
+RESPONSE = 1
+ERROR = 2
+EVENT = 3
+CANCEL = 4
+
+CANCEL_ARG = {"$": "cancel"}
+CALLBACK_ARG = {"$": "callback"}
+
+# Methods the daemon will run, per target
+METHODS = {
+    "fingerprint": ("get_user_count", "add_user", "verify_user", "clear_all_users", "configure",
+                    "list_users", "export_templates", "import_templates", "add_users"),
+    "infrared": ("is_hand_detected", "wait_for_hand", "wait_for_hand_removal"),
+    "sampler": ("hand_present", "first_detection_after", "wait_for_detection", "configure"),
+    "motors": ("dispense_pill", "pre_position", "rotate_segments", "release_all", "get_status",
+               "configure"),
+}
+
+
+class HardwareUnavailable(RuntimeError):
+    """
+    The hardware daemon can't be reached
+
+    Not an OSError: the client treats OSError as the backend being
+    unreachable, and a local daemon outage must not look like one.
+    """
+
+
+class RemoteError(RuntimeError):
+    """The daemon ran the call and it raised"""
+
+
+def send_frame(sock, lock, request_id, kind, body):
+    """Write one frame (thread-safe through `lock`)"""
+    data = json.dumps(body, separators=(",", ":")).encode()
+    with lock:
+        sock.sendall(HEADER.pack(len(data), request_id, kind) + data)
+
+
+def read_frame(rfile):
+    """
+    Read one frame from a socket file
+
+    Returns:
+        (request_id, kind, body), or None when the peer closed the socket
+    """
+    header = rfile.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return None
+    length, request_id, kind = HEADER.unpack(header)
+    if length > MAX_BODY:
+        raise ValueError(f"Frame too large: {length} bytes")
+    data = rfile.read(length)
+    if len(data) < length:
+        return None
+    return request_id, kind, json.loads(data)
+
+
+class _PendingCall:
+    __slots__ = ("done", "result", "error", "callback")
+
+    def __init__(self, callback):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.callback = callback
+
+
+class RemoteHardware:
+    """
+    Connection to the hardware daemon
+
+    Connects lazily and reconnects on the next call after the daemon
+    restarts. Calls from several threads share the one socket.
+    """
+
+    def __init__(self, socket_path=DEFAULT_SOCKET, connect_timeout=5):
+        """
+        Initialize connection
+
+        Args:
+            socket_path: Daemon's Unix socket
+            connect_timeout: Seconds to keep retrying while the daemon is down
+        """
+        self.socket_path = socket_path
+        self.connect_timeout = connect_timeout
+
+        self.fingerprint = RemoteFingerprint(self)
+        self.infrared = RemoteInfrared(self)
+        self.ir_sampler = RemoteSampler(self)
+        self.motors = RemoteMotors(self)
+
+        self._sock = None
+        self._send_lock = threading.Lock()
+        self._connect_lock = threading.Lock()
+        self._pending = {}
+        self._ids = itertools.count(1)
+        # target -> settings given to configure(), sent again on every connect
+        self._settings = {}
+        self._resend = False
+
+    def _connect(self, timeout=None):
+        """
+        Return the connected socket, connecting (with retries) if needed
+
+        Args:
+            timeout: Seconds to keep retrying (default: connect_timeout)
+        """
+        with self._connect_lock:
+            if self._sock is not None:
+                return self._sock
+
+            timeout = self.connect_timeout if timeout is None else timeout
+            deadline = time.monotonic() + timeout
+            while True:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                try:
+                    sock.connect(self.socket_path)
+                    break
+                except OSError as e:
+                    sock.close()
+                    if time.monotonic() >= deadline:
+                        raise HardwareUnavailable(
+                            f"Hardware daemon not reachable at {self.socket_path}: {e}"
+                        )
+                    time.sleep(0.2)
+
+            self._sock = sock
+            # A new or restarted daemon starts from its defaults
+            self._resend = bool(self._settings)
+            threading.Thread(target=self._read_loop, args=(sock,), daemon=True).start()
+            print(f"✓ Connected to hardware daemon ({self.socket_path})")
+            return sock
+
+    def _read_loop(self, sock):
+        rfile = sock.makefile("rb")
+        try:
+            while True:
+                frame = read_frame(rfile)
+                if frame is None:
+                    break
+                request_id, kind, body = frame
+                call = self._pending.get(request_id)
+                if call is None:
+                    continue
+                if kind == EVENT:
+                    if call.callback:
+                        call.callback(body["e"], body["d"])
+                    continue
+                if kind == ERROR:
+                    call.error = RemoteError(body.get("error"))
+                else:
+                    call.result = body
+                call.done.set()
+        except (OSError, ValueError):
+            pass
+        finally:
+            self._disconnected(sock)
+
+    def _disconnected(self, sock):
+        with self._connect_lock:
+            if self._sock is sock:
+                self._sock = None
+        sock.close()
+        # Fail calls that were waiting on this connection
+        for call in list(self._pending.values()):
+            if not call.done.is_set():
+                call.error = HardwareUnavailable("Hardware daemon disconnected")
+                call.done.set()
+
+    def call(self, target, method, *args, **kwargs):
+        """
+        Run a method on the daemon's hardware object and return its result
+
+        Raises:
+            HardwareUnavailable: daemon down or connection lost mid-call
+            RemoteError: the method raised on the daemon side
+        """
+        cancel = None
+        callback = None
+
+        def encode(value):
+            nonlocal cancel, callback
+            if isinstance(value, threading.Event):
+                cancel = value
+                return CANCEL_ARG
+            if callable(value):
+                callback = value
+                return CALLBACK_ARG
+            return value
+
+        body = {
+            "t": target,
+            "m": method,
+            "a": [encode(a) for a in args],
+            "k": {key: encode(value) for key, value in kwargs.items() if value is not None},
+        }
+
+        sock = self._connect()
+        if self._resend:
+            self._resend_settings()
+
+        request_id = next(self._ids)
+        pending = self._pending[request_id] = _PendingCall(callback)
+        try:
+            try:
+                send_frame(sock, self._send_lock, request_id, REQUEST, body)
+            except OSError as e:
+                self._disconnected(sock)
+                raise HardwareUnavailable(f"Hardware daemon disconnected: {e}")
+
+            cancel_sent = False
+            while not pending.done.wait(0.05):
+                if cancel is not None and not cancel_sent and cancel.is_set():
+                    cancel_sent = True
+                    try:
+                        send_frame(sock, self._send_lock, request_id, CANCEL, {})
+                    except OSError:
+                        pass
+        finally:
+            del self._pending[request_id]
+
+        if pending.error:
+            raise pending.error
+        return pending.result
+
+    def configure(self, target, **settings):
+        """
+        Run configure() on a daemon object now, or as soon as it connects
+
+        The settings are kept and sent again after every reconnect, so the
+        client can start before the daemon, and a restarted daemon gets
+        the live settings back.
+
+        Returns:
+            dict of the settings that changed ({} while the daemon is down)
+        """
+        settings = {key: value for key, value in settings.items() if value is not None}
+        self._settings.setdefault(target, {}).update(settings)
+        try:
+            self._connect(timeout=0)
+        except HardwareUnavailable:
+            print(f"⚠ Hardware daemon not reachable: {target} settings are sent when it is")
+            return {}
+        return self.call(target, "configure", **settings)
+
+    def _resend_settings(self):
+        with self._connect_lock:
+            if not self._resend:
+                return
+            self._resend = False
+            settings = {target: dict(values) for target, values in self._settings.items()}
+        for target, values in settings.items():
+            try:
+                self.call(target, "configure", **values)
+            except RemoteError as e:
+                print(f"✗ Daemon rejected {target} settings {values}: {e}")
+
+    def close(self):
+        with self._connect_lock:
+            sock, self._sock = self._sock, None
+        if sock:
+            sock.close()
+
+
+class _RemoteObject:
+    """Forwards the whitelisted methods of one daemon target"""
+
+    target = None
+
+    def __init__(self, hardware):
+        self._hardware = hardware
+
+    def __getattr__(self, name):
+        if name not in METHODS[self.target]:
+            raise AttributeError(name)
+
+        def method(*args, **kwargs):
+            return self._hardware.call(self.target, name, *args, **kwargs)
+
+        method.__name__ = name
+        return method
+
+    def configure(self, **settings):
+        """Settings are kept and re-sent whenever the daemon (re)connects"""
+        return self._hardware.configure(self.target, **settings)
+
+    def cleanup(self):
+        """The daemon owns the hardware; nothing to release on this side"""
+
+
+class RemoteFingerprint(_RemoteObject):
+    target = "fingerprint"
+
+
+class RemoteInfrared(_RemoteObject):
+    target = "infrared"
+
+
+class RemoteMotors(_RemoteObject):
+    target = "motors"
+
+
+class RemoteSampler(_RemoteObject):
+    """
+    The daemon samples continuously, so the sampler is always running.
+    Timestamps are time.monotonic() values, which on Linux use the same
+    clock in every process.
+    """
+
+    target = "sampler"
+    running = True
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
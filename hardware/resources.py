@@ -0,0 +1,136 @@
+"""
+Hardware Resource Manager
+One process-wide owner for GPIO pins, serial ports and I2C buses
+
+Every hardware class claims the pins and ports it uses here instead of
+calling GPIO.setmode/GPIO.cleanup itself, so:
+
+    - GPIO mode is set once, however many sensors are created
+    - two objects can't drive the same pin or port (ResourceConflict)
+    - cleanup() only resets the caller's own pins, and each only once;
+      one sensor shutting down no longer resets the others' pins
+
+Bus access from concurrent workers (poller, scheduler, IR sampler, daemon
+connections) goes through lock(name): one RLock per bus or device,
+created on first use. Locks are per resource, so the fingerprint UART,
+each I2C bus and each motor never wait on each other.
+
+    serial:/dev/serial0   one fingerprint transaction
+    i2c:1                 one motor step on I2C bus 1
+    motor:0x60:1          one rotation of motor 1 on the 0x60 HAT
+"""
+
+import threading
+
+
+class ResourceConflict(RuntimeError):
+    """A pin or port is already claimed by another object"""
+
+
+def _describe(owner):
+    return f"{type(owner).__name__}@{id(owner):#x}"
+
+
+class ResourceManager:
+    """Tracks who owns which pin and port, and hands out bus locks"""
+
+    def __init__(self):
+        # Guards the tables below only; never held during hardware I/O
+        self._registry_lock = threading.Lock()
+        self._locks = {}
+        # pin -> (gpio module, owner id)
+        self._pins = {}
+        # resource name -> owner id
+        self._claims = {}
+        self._owners = {}
+        # GPIO modules already switched to BCM numbering
+        self._gpio_ready = set()
+
+    def lock(self, name: str) -> threading.RLock:
+        """Return the lock for one bus or device, creating it on first use"""
+        lock = self._locks.get(name)
+        if lock is None:
+            with self._registry_lock:
+                lock = self._locks.setdefault(name, threading.RLock())
+        return lock
+
+    def claim(self, name: str, owner):
+        """
+        Claim a named resource (e.g. "serial:/dev/serial0") for an owner
+
+        Raises:
+            ResourceConflict: another owner holds it
+        """
+        with self._registry_lock:
+            current = self._claims.get(name)
+            if current is not None and current != id(owner):
+                raise ResourceConflict(f"{name} already claimed by {self._owners.get(current, '?')}")
+            self._claims[name] = id(owner)
+            self._owners[id(owner)] = _describe(owner)
+
+    def claim_pin(self, gpio, pin: int, direction, owner, **setup_kwargs):
+        """
+        Claim a BCM pin and set it up
+
+        Args:
+            gpio: GPIO module the caller uses (RPi.GPIO or a stand-in)
+            pin: BCM pin number
+            direction: gpio.IN or gpio.OUT
+            owner: Object the pin belongs to (released by release(owner))
+            setup_kwargs: Passed to gpio.setup (initial=, pull_up_down=)
+
+        Raises:
+            ResourceConflict: another owner holds the pin
+        """
+        with self._registry_lock:
+            current = self._pins.get(pin)
+            if current is not None and current[1] != id(owner):
+                raise ResourceConflict(
+                    f"GPIO {pin} already claimed by {self._owners.get(current[1], '?')}"
+                )
+            self._pins[pin] = (gpio, id(owner))
+            self._owners[id(owner)] = _describe(owner)
+
+            if id(gpio) not in self._gpio_ready:
+                gpio.setmode(gpio.BCM)
+                gpio.setwarnings(False)
+                self._gpio_ready.add(id(gpio))
+
+        gpio.setup(pin, direction, **setup_kwargs)
+
+    def release(self, owner):
+        """
+        Release everything an owner claimed and reset its pins
+
+        Safe to call more than once; later calls do nothing.
+        """
+        owner_id = id(owner)
+        by_gpio = {}
+        with self._registry_lock:
+            for pin, (gpio, pin_owner) in list(self._pins.items()):
+                if pin_owner == owner_id:
+                    del self._pins[pin]
+                    by_gpio.setdefault(id(gpio), (gpio, []))[1].append(pin)
+            for name, claim_owner in list(self._claims.items()):
+                if claim_owner == owner_id:
+                    del self._claims[name]
+            self._owners.pop(owner_id, None)
+
+        for gpio, pins in by_gpio.values():
+            gpio.cleanup(pins)
+
+    def status(self) -> dict:
+        """Current claims, for diagnostics"""
+        with self._registry_lock:
+            return {
+                "pins": {pin: self._owners.get(owner, "?") for pin, (_, owner) in self._pins.items()},
+                "claims": {name: self._owners.get(owner, "?") for name, owner in self._claims.items()},
+            }
+
+
+_manager = ResourceManager()
+
+
+def get_manager() -> ResourceManager:
+    """The process-wide resource manager"""
+    return _manager
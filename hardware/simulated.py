@@ -0,0 +1,392 @@
+"""
+Simulated Hardware Module
+Stand-ins for RPi.GPIO, pyserial and the Adafruit MotorKit so the hardware
+classes can run on a development machine, in benchmarks and in load tests
+"""
+
+import sys
+import time
+import types
+
+
+# Fingerprint protocol constants (mirrors hardware/fingerprint_sensor.py)
+CMD_HEAD = 0xF5
+CMD_TAIL = 0xF5
+CMD_ADD_1 = 0x01
+CMD_ADD_2 = 0x02
+CMD_ADD_3 = 0x03
+CMD_DEL = 0x04
+CMD_DEL_ALL = 0x05
+CMD_USER_CNT = 0x09
+CMD_COMPARE = 0x0B
+CMD_MATCH = 0x0C
+CMD_COM_LEV = 0x28
+CMD_ALL_USERS = 0x2B
+CMD_UPLOAD_TEMPLATE = 0x31
+CMD_DOWNLOAD_TEMPLATE = 0x41
+
+ACK_SUCCESS = 0x00
+ACK_FAIL = 0x01
+ACK_FULL = 0x04
+ACK_NO_USER = 0x05
+ACK_USER_EXIST = 0x06
+ACK_TIMEOUT = 0x08
+
+USER_MAX_CNT = 1000
+TEMPLATE_SIZE = 193
+
+
+class SimulatedGPIO:
+    """Minimal RPi.GPIO replacement that keeps pin levels in memory"""
+
+    BCM = 11
+    BOARD = 10
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+    PUD_OFF = 20
+    PUD_DOWN = 21
+    PUD_UP = 22
+
+    def __init__(self):
+        self.mode = None
+        self.pins = {}
+        self.levels = {}
+
+    def setmode(self, mode):
+        self.mode = mode
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pin, direction, initial=None, pull_up_down=None):
+        self.pins[pin] = direction
+        if initial is not None:
+            self.levels[pin] = initial
+        else:
+            # Inputs idle HIGH (the IR sensor is active LOW)
+            self.levels.setdefault(pin, self.HIGH)
+
+    def output(self, pin, level):
+        self.levels[pin] = int(bool(level))
+
+    def input(self, pin):
+        return self.levels.get(pin, self.HIGH)
+
+    def set_input(self, pin, level):
+        """Drive an input pin from the simulation side"""
+        self.levels[pin] = int(bool(level))
+
+    def cleanup(self, pins=None):
+        if pins is None:
+            self.pins.clear()
+            self.levels.clear()
+            return
+        if isinstance(pins, int):
+            pins = [pins]
+        for pin in pins:
+            self.pins.pop(pin, None)
+            self.levels.pop(pin, None)
+
+
+class SimulatedFingerprintModule:
+    """
+    Serial-port stand-in that speaks the UART fingerprint reader protocol
+
+    Replies only become readable once the simulated module would have
+    finished: UART transfer time, plus finger capture time for scanning
+    commands, plus template comparison time. A 1:N match compares against
+    every stored template in turn while a 1:1 compare checks one, so the two
+    verification modes can be benchmarked against each other.
+    """
+
+    # Seconds for the module to capture and extract a finger image
+    CAPTURE_TIME = 0.2
+    # Seconds per stored template searched during a 1:N match
+    MATCH_TIME_PER_TEMPLATE = 0.0008
+    # Seconds for a single 1:1 template comparison
+    COMPARE_TIME = 0.01
+
+    def __init__(self, port="/dev/serial0", baudrate=19200, timeout=None):
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.is_open = True
+
+        # user_id -> finger identity the template was enrolled from
+        self.templates = {}
+        self.permissions = {}
+        # Finger identity currently on the sensor (None = no finger)
+        self.finger = None
+        self.compare_level = 5
+
+        self._rx = bytearray()
+        self._ready_at = 0.0
+        # Payload length of the data packet the last command announced
+        self._download_length = None
+
+    # -- simulation controls -------------------------------------------------
+
+    def present_finger(self, finger):
+        """Place a finger (any hashable identity) on the sensor"""
+        self.finger = finger
+
+    def remove_finger(self):
+        """Lift the finger off the sensor"""
+        self.finger = None
+
+    def enroll(self, user_id, finger, permission=3):
+        """Store a template directly, bypassing the two-scan flow"""
+        self.templates[user_id] = finger
+        self.permissions[user_id] = permission
+
+    def fill_library(self, count, start_id=1):
+        """Enrol `count` distinct fingers with consecutive IDs"""
+        for user_id in range(start_id, start_id + count):
+            self.enroll(user_id, f"finger-{user_id}")
+
+    # -- pyserial interface --------------------------------------------------
+
+    @property
+    def in_waiting(self):
+        if self._rx and time.time() >= self._ready_at:
+            return len(self._rx)
+        return 0
+
+    def read(self, size=1):
+        if time.time() < self._ready_at:
+            return b""
+        data = bytes(self._rx[:size])
+        del self._rx[:size]
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def reset_input_buffer(self):
+        self._rx.clear()
+
+    def write(self, data):
+        frame = bytes(data)
+        now = time.time()
+        if self._download_length is not None:
+            reply, busy_time = self._handle_download(frame)
+        else:
+            reply, busy_time = self._handle_frame(frame)
+        self._rx = bytearray(reply)
+        self._ready_at = now + self._uart_time(len(frame) + len(reply)) + busy_time
+        return len(frame)
+
+    def close(self):
+        self.is_open = False
+
+    # -- protocol ------------------------------------------------------------
+
+    def _uart_time(self, num_bytes):
+        # 8N1 framing: 10 bits on the wire per byte
+        return num_bytes * 10 / self.baudrate
+
+    def _reply(self, cmd, q1, q2, q3):
+        checksum = cmd ^ q1 ^ q2 ^ q3
+        return bytes([CMD_HEAD, cmd, q1, q2, q3, 0, checksum, CMD_TAIL])
+
+    def _packet(self, payload):
+        checksum = 0
+        for byte in payload:
+            checksum ^= byte
+        return bytes([CMD_HEAD]) + bytes(payload) + bytes([checksum, CMD_TAIL])
+
+    def _eigenvalues(self, finger):
+        """Stand-in template data: the finger identity, zero-padded"""
+        return str(finger).encode()[:TEMPLATE_SIZE].ljust(TEMPLATE_SIZE, b"\0")
+
+    def _handle_download(self, packet):
+        """Data packet following a CMD_DOWNLOAD_TEMPLATE frame"""
+        length, self._download_length = self._download_length, None
+        payload = packet[1:-2]
+        checksum = 0
+        for byte in payload:
+            checksum ^= byte
+        if (len(payload) != length or length != 3 + TEMPLATE_SIZE or packet[0] != CMD_HEAD
+                or packet[-1] != CMD_TAIL or packet[-2] != checksum):
+            return self._reply(CMD_DOWNLOAD_TEMPLATE, 0, 0, ACK_FAIL), 0.0
+        user_id = (payload[0] << 8) | payload[1]
+        if user_id not in self.templates and len(self.templates) >= USER_MAX_CNT:
+            return self._reply(CMD_DOWNLOAD_TEMPLATE, payload[0], payload[1], ACK_FULL), 0.0
+        finger = bytes(payload[3:]).rstrip(b"\0").decode(errors="replace")
+        self.enroll(user_id, finger, payload[2])
+        return self._reply(CMD_DOWNLOAD_TEMPLATE, payload[0], payload[1], ACK_SUCCESS), 0.0
+
+    def _handle_frame(self, frame):
+        if len(frame) != 8 or frame[0] != CMD_HEAD or frame[-1] != CMD_TAIL:
+            return b"", 0.0
+
+        cmd, p1, p2, p3 = frame[1], frame[2], frame[3], frame[4]
+
+        if cmd == CMD_USER_CNT:
+            count = len(self.templates)
+            return self._reply(cmd, count >> 8, count & 0xFF, ACK_SUCCESS), 0.0
+
+        if cmd == CMD_COM_LEV:
+            if p3 == 0:
+                self.compare_level = p2
+            return self._reply(cmd, 0, self.compare_level, ACK_SUCCESS), 0.0
+
+        if cmd == CMD_DEL_ALL:
+            self.templates.clear()
+            self.permissions.clear()
+            return self._reply(cmd, 0, 0, ACK_SUCCESS), 0.0
+
+        if cmd == CMD_DEL:
+            user_id = (p1 << 8) | p2
+            if user_id not in self.templates:
+                return self._reply(cmd, 0, 0, ACK_NO_USER), 0.0
+            del self.templates[user_id]
+            del self.permissions[user_id]
+            return self._reply(cmd, 0, 0, ACK_SUCCESS), 0.0
+
+        if cmd == CMD_ALL_USERS:
+            if not self.templates:
+                return self._reply(cmd, 0, 0, ACK_NO_USER), 0.0
+            payload = bytearray(len(self.templates).to_bytes(2, "big"))
+            for user_id in sorted(self.templates):
+                payload += bytes([user_id >> 8, user_id & 0xFF, self.permissions[user_id]])
+            reply = self._reply(cmd, len(payload) >> 8, len(payload) & 0xFF, ACK_SUCCESS)
+            return reply + self._packet(payload), 0.0
+
+        if cmd == CMD_UPLOAD_TEMPLATE:
+            user_id = (p1 << 8) | p2
+            if user_id not in self.templates:
+                return self._reply(cmd, 0, 0, ACK_NO_USER), 0.0
+            payload = (bytes([p1, p2, self.permissions[user_id]])
+                       + self._eigenvalues(self.templates[user_id]))
+            reply = self._reply(cmd, len(payload) >> 8, len(payload) & 0xFF, ACK_SUCCESS)
+            return reply + self._packet(payload), 0.0
+
+        if cmd == CMD_DOWNLOAD_TEMPLATE:
+            # The module answers once the announced data packet has arrived
+            self._download_length = (p1 << 8) | p2
+            return b"", 0.0
+
+        if cmd in (CMD_ADD_1, CMD_ADD_2, CMD_ADD_3):
+            if self.finger is None:
+                # No finger: the module never answers within the host timeout
+                return b"", 0.0
+            user_id = (p1 << 8) | p2
+            if cmd == CMD_ADD_1 and len(self.templates) >= USER_MAX_CNT:
+                return self._reply(cmd, 0, 0, ACK_FULL), self.CAPTURE_TIME
+            if cmd == CMD_ADD_1 and user_id in self.templates:
+                return self._reply(cmd, 0, 0, ACK_USER_EXIST), self.CAPTURE_TIME
+            if cmd == CMD_ADD_3:
+                self.enroll(user_id, self.finger, p3)
+            return self._reply(cmd, 0, 0, ACK_SUCCESS), self.CAPTURE_TIME
+
+        if cmd == CMD_MATCH:
+            if self.finger is None:
+                return b"", 0.0
+            searched = 0
+            for user_id, finger in self.templates.items():
+                searched += 1
+                if finger == self.finger:
+                    busy = self.CAPTURE_TIME + searched * self.MATCH_TIME_PER_TEMPLATE
+                    return self._reply(
+                        cmd, user_id >> 8, user_id & 0xFF, self.permissions[user_id]
+                    ), busy
+            busy = self.CAPTURE_TIME + searched * self.MATCH_TIME_PER_TEMPLATE
+            return self._reply(cmd, 0, 0, ACK_NO_USER), busy
+
+        if cmd == CMD_COMPARE:
+            if self.finger is None:
+                return b"", 0.0
+            user_id = (p1 << 8) | p2
+            matched = self.templates.get(user_id) == self.finger
+            busy = self.CAPTURE_TIME + self.COMPARE_TIME
+            return self._reply(cmd, 0, 0, ACK_SUCCESS if matched else ACK_FAIL), busy
+
+        return self._reply(cmd, 0, 0, ACK_FAIL), 0.0
+
+
+class SimulatedStepper:
+    """Stepper stand-in that counts steps and models I2C write time"""
+
+    # Seconds per onestep() call (two PWM register writes over I2C)
+    STEP_TIME = 0.0005
+
+    def __init__(self):
+        self.position = 0
+        self.steps_taken = 0
+        self.released = True
+
+    def onestep(self, direction=1, style=1):
+        time.sleep(self.STEP_TIME)
+        self.position += 1 if direction == 1 else -1
+        self.steps_taken += 1
+        self.released = False
+        return self.position
+
+    def release(self):
+        self.released = True
+
+
+class SimulatedMotorKit:
+    """MotorKit stand-in exposing the two stepper ports"""
+
+    def __init__(self, i2c=None, address=0x60, steppers_microsteps=16, pwm_frequency=1600.0):
+        self.address = address
+        self.stepper1 = SimulatedStepper()
+        self.stepper2 = SimulatedStepper()
+
+
+class SimulatedAudioPlayer:
+    """AudioPlayer stand-in that records sounds instead of calling aplay"""
+
+    def __init__(self):
+        self.played = []
+
+    def play_sound(self, sound_type):
+        self.played.append(sound_type)
+
+
+def install(gpio=None):
+    """
+    Register the simulated modules in place of the hardware libraries
+
+    Must be called before importing anything from hardware/. Returns the
+    SimulatedGPIO instance so callers can drive input pins.
+    """
+    gpio = gpio or SimulatedGPIO()
+
+    rpi = types.ModuleType("RPi")
+    rpi.GPIO = gpio
+    sys.modules["RPi"] = rpi
+    sys.modules["RPi.GPIO"] = gpio
+
+    serial_mod = types.ModuleType("serial")
+    serial_mod.Serial = SimulatedFingerprintModule
+    serial_mod.SerialException = IOError
+    sys.modules["serial"] = serial_mod
+
+    board_mod = types.ModuleType("board")
+    board_mod.I2C = lambda: None
+    sys.modules["board"] = board_mod
+
+    motorkit_mod = types.ModuleType("adafruit_motorkit")
+    motorkit_mod.MotorKit = SimulatedMotorKit
+    sys.modules["adafruit_motorkit"] = motorkit_mod
+
+    stepper_mod = types.ModuleType("adafruit_motor.stepper")
+    stepper_mod.FORWARD = 1
+    stepper_mod.BACKWARD = 2
+    stepper_mod.SINGLE = 1
+    stepper_mod.DOUBLE = 2
+    stepper_mod.INTERLEAVE = 3
+    stepper_mod.MICROSTEP = 4
+    motor_mod = types.ModuleType("adafruit_motor")
+    motor_mod.stepper = stepper_mod
+    sys.modules["adafruit_motor"] = motor_mod
+    sys.modules["adafruit_motor.stepper"] = stepper_mod
+
+    return gpio
@@ -7,6 +7,7 @@ import time
 import board
 from adafruit_motorkit import MotorKit
 from adafruit_motor import stepper
+from hardware import resources
 
 
 class StepperMotorController:
@@ -19,9 +20,27 @@ class StepperMotorController:
     # Using DOUBLE stepping for better torque
     STEPS_PER_ROTATION = 200
     
-    def __init__(self):
-        """Initialize motor controller"""
-        self.kit = MotorKit(i2c=board.I2C())
+    # I2C bus the Motor HATs sit on (board.I2C() on a Raspberry Pi)
+    I2C_BUS = 1
+    
+    def __init__(self, address=0x60, step_delay=0.01):
+        """
+        Initialize motor controller
+        
+        Args:
+            address: I2C address of the Motor HAT (default: 0x60). Stacked
+                     HATs use 0x61, 0x62, ... depending on their jumpers.
+            step_delay: Seconds between steps (default: 0.01)
+        """
+        self.address = address
+        self.step_delay = step_delay
+        manager = resources.get_manager()
+        manager.claim(f"i2c:{self.I2C_BUS}:{address:#x}", self)
+        self.kit = MotorKit(i2c=board.I2C(), address=address)
+        
+        # Taken per step, so HATs sharing the bus interleave their steps
+        # instead of waiting for each other's whole rotation
+        self.bus_lock = manager.lock(f"i2c:{self.I2C_BUS}")
         
         # Map motor IDs to MotorKit stepper objects
         self.motors = {
@@ -34,6 +53,13 @@ class StepperMotorController:
             1: 0,
             2: 0
         }
+        
+        # Held for a whole rotation: one move per motor at a time keeps
+        # current_segment right when callers overlap (e.g. pre_position)
+        self.motor_locks = {
+            motor_id: manager.lock(f"motor:{address:#x}:{motor_id}")
+            for motor_id in self.motors
+        }
     
     def _calculate_steps_for_segments(self, num_segments):
         """Calculate number of steps needed to rotate by given segments"""
@@ -61,6 +87,10 @@ class StepperMotorController:
                 "message": f"Invalid segment: {segment_number}. Must be 0-{self.SEGMENTS_PER_ROTATION-1}"
             }
         
+        with self.motor_locks[motor_id]:
+            return self._dispense(motor_id, segment_number)
+    
+    def _dispense(self, motor_id, segment_number):
         motor = self.motors[motor_id]
         current = self.current_segment[motor_id]
         
@@ -78,12 +108,11 @@ class StepperMotorController:
         
         # Rotate motor
         try:
-            for _ in range(steps):
-                motor.onestep(direction=stepper.FORWARD, style=stepper.DOUBLE)
-                time.sleep(0.01)
+            self._step(motor, steps, stepper.FORWARD)
             
             # Release motor to save power and reduce heat
-            motor.release()
+            with self.bus_lock:
+                motor.release()
             
             # Update current position
             self.current_segment[motor_id] = segment_number
@@ -98,6 +127,39 @@ class StepperMotorController:
         except Exception as e:
             return {"success": False, "message": f"Motor error: {str(e)}"}
     
+    def pre_position(self, motor_id, segment_number):
+        """
+        Rotate motor to the segment just before the one to dispense
+        
+        Lets most of the rotation happen ahead of time (e.g. while waiting
+        for a fingerprint) so the later dispense_pill() only has to move
+        one segment.
+        
+        Args:
+            motor_id: Motor number (1, 2, or 3)
+            segment_number: Segment that will be dispensed (0-14)
+            
+        Returns:
+            dict with 'success' (bool) and 'message' (str)
+        """
+        if motor_id not in self.motors:
+            return {"success": False, "message": f"Invalid motor ID: {motor_id}"}
+        
+        if segment_number < 0 or segment_number >= self.SEGMENTS_PER_ROTATION:
+            return {
+                "success": False,
+                "message": f"Invalid segment: {segment_number}. Must be 0-{self.SEGMENTS_PER_ROTATION-1}"
+            }
+        
+        with self.motor_locks[motor_id]:
+            current = self.current_segment[motor_id]
+            segments_to_rotate = (segment_number - current) % self.SEGMENTS_PER_ROTATION
+            
+            if segments_to_rotate <= 1:
+                return {"success": True, "message": f"Motor {motor_id}: Already in position"}
+            
+            return self.rotate_segments(motor_id, segments_to_rotate - 1)
+    
     def rotate_segments(self, motor_id, num_segments, direction="forward"):
         """
         Rotate motor by specified number of segments
@@ -113,17 +175,20 @@ class StepperMotorController:
         if motor_id not in self.motors:
             return {"success": False, "message": f"Invalid motor ID: {motor_id}"}
         
+        with self.motor_locks[motor_id]:
+            return self._rotate(motor_id, num_segments, direction)
+    
+    def _rotate(self, motor_id, num_segments, direction):
         motor = self.motors[motor_id]
         steps = self._calculate_steps_for_segments(num_segments)
         
         step_direction = stepper.FORWARD if direction == "forward" else stepper.BACKWARD
         
         try:
-            for _ in range(steps):
-                motor.onestep(direction=step_direction, style=stepper.DOUBLE)
-                time.sleep(0.01)
+            self._step(motor, steps, step_direction)
             
-            motor.release()
+            with self.bus_lock:
+                motor.release()
             
             # Update position
             if direction == "forward":
@@ -143,10 +208,72 @@ class StepperMotorController:
         except Exception as e:
             return {"success": False, "message": f"Motor error: {str(e)}"}
     
+    def _step(self, motor, steps, direction):
+        """Step one motor, holding the I2C bus only while each step is written"""
+        for _ in range(steps):
+            with self.bus_lock:
+                motor.onestep(direction=direction, style=stepper.DOUBLE)
+            time.sleep(self.step_delay)
+    
+    def configure(self, step_delay=None, segments_per_rotation=None, steps_per_rotation=None):
+        """
+        Change motion settings on the running controller
+        
+        Waits for rotations in progress, so a move never changes speed or
+        geometry halfway through. A new segments_per_rotation keeps each
+        carousel where it is: current_segment is remapped to the segment at
+        the same angle (the nearest one if the angle falls between two).
+        
+        Args:
+            step_delay: Seconds between steps
+            segments_per_rotation: Segments on each dispenser carousel
+            steps_per_rotation: Motor steps per full turn
+            
+        Returns:
+            dict of the settings that changed
+        """
+        requested = {
+            "step_delay": step_delay,
+            "SEGMENTS_PER_ROTATION": segments_per_rotation,
+            "STEPS_PER_ROTATION": steps_per_rotation,
+        }
+        changed = {}
+        locks = list(self.motor_locks.values())
+        for lock in locks:
+            lock.acquire()
+        try:
+            old_segments = self.SEGMENTS_PER_ROTATION
+            for attribute, value in requested.items():
+                if value is not None and value != getattr(self, attribute):
+                    setattr(self, attribute, value)
+                    changed[attribute.lower()] = value
+            if "segments_per_rotation" in changed:
+                self._remap_segments(old_segments, self.SEGMENTS_PER_ROTATION)
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+        return changed
+    
+    def _remap_segments(self, old_segments, new_segments):
+        """Convert current_segment to a new carousel geometry (motor locks held)"""
+        for motor_id, segment in self.current_segment.items():
+            position = segment * new_segments / old_segments
+            remapped = round(position) % new_segments
+            if position != int(position):
+                print(f"⚠ Motor {motor_id} is between segments of the new carousel; "
+                      f"treating it as segment {remapped}")
+            self.current_segment[motor_id] = remapped
+    
     def release_all(self):
         """Release all motors to save power"""
-        for motor in self.motors.values():
-            motor.release()
+        with self.bus_lock:
+            for motor in self.motors.values():
+                motor.release()
+    
+    def cleanup(self):
+        """Release the motors and this controller's claim on the HAT"""
+        self.release_all()
+        resources.get_manager().release(self)
     
     def get_status(self):
         """Get current status of all motors"""
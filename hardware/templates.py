@@ -0,0 +1,135 @@
+"""
+Fingerprint Template Store
+Compact binary format for fingerprint templates exported from one reader
+and imported into others, so a patient enrolled once can be pushed to
+every dispenser on a ward
+
+    header   "RFPT", version (1 byte), template size (2), count (2)
+    record   user ID (2), permission (1), eigenvalues (template size)
+    trailer  CRC-32 of everything before it (4)
+
+All integers are big-endian, as on the UART. A record is exactly the
+payload of the reader's upload/download data packet, so templates go from
+the wire to the store and back without conversion. Ten templates take
+under 2 KB; over JSON (backend commands, the hardware daemon) the store
+travels as one base64 string.
+"""
+
+import base64
+import binascii
+import struct
+import zlib
+
+# Eigenvalue bytes per template on the UART capacitive fingerprint reader
+TEMPLATE_SIZE = 193
+
+MAGIC = b"RFPT"
+VERSION = 1
+HEADER = struct.Struct("!4sBHH")
+RECORD = struct.Struct("!HB")
+TRAILER = struct.Struct("!I")
+
+
+class TemplateError(ValueError):
+    """Data is not a valid template store"""
+
+
+class Template:
+    """One user's fingerprint template"""
+
+    __slots__ = ("user_id", "permission", "eigenvalues")
+
+    def __init__(self, user_id: int, permission: int, eigenvalues: bytes):
+        self.user_id = user_id
+        self.permission = permission
+        self.eigenvalues = bytes(eigenvalues)
+
+    @classmethod
+    def from_packet(cls, payload):
+        """Template from an upload data packet's payload (ID, permission, eigenvalues)"""
+        user_id, permission = RECORD.unpack_from(payload)
+        return cls(user_id, permission, payload[RECORD.size:])
+
+    def to_packet(self) -> bytes:
+        """Payload of the download data packet that stores this template"""
+        return RECORD.pack(self.user_id, self.permission) + self.eigenvalues
+
+    def __eq__(self, other):
+        return (isinstance(other, Template) and self.user_id == other.user_id
+                and self.permission == other.permission and self.eigenvalues == other.eigenvalues)
+
+    def __repr__(self):
+        return f"Template(user_id={self.user_id}, permission={self.permission})"
+
+
+def pack(templates) -> bytes:
+    """
+    Serialize templates into a store
+
+    Raises:
+        TemplateError: a template has the wrong size or the ID is out of range
+    """
+    templates = list(templates)
+    out = bytearray(HEADER.pack(MAGIC, VERSION, TEMPLATE_SIZE, len(templates)))
+    for template in templates:
+        if len(template.eigenvalues) != TEMPLATE_SIZE:
+            raise TemplateError(f"Template for user {template.user_id} is "
+                                f"{len(template.eigenvalues)} bytes, expected {TEMPLATE_SIZE}")
+        try:
+            out += template.to_packet()
+        except struct.error as e:
+            raise TemplateError(f"Invalid template for user {template.user_id}: {e}")
+    out += TRAILER.pack(zlib.crc32(out))
+    return bytes(out)
+
+
+def unpack(data: bytes) -> list:
+    """
+    Templates from a store
+
+    Raises:
+        TemplateError: wrong magic, version or template size, truncated, or corrupt
+    """
+    data = memoryview(data)
+    if len(data) < HEADER.size + TRAILER.size:
+        raise TemplateError("Template store is truncated")
+    magic, version, size, count = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise TemplateError("Not a fingerprint template store")
+    if version != VERSION:
+        raise TemplateError(f"Unsupported template store version {version}")
+    if size != TEMPLATE_SIZE:
+        # Templates only work on the reader model that produced them
+        raise TemplateError(f"Templates are {size} bytes, this reader uses {TEMPLATE_SIZE}")
+
+    record_size = RECORD.size + size
+    expected = HEADER.size + count * record_size + TRAILER.size
+    if len(data) != expected:
+        raise TemplateError(f"Template store is {len(data)} bytes, expected {expected}")
+    (crc,) = TRAILER.unpack_from(data, expected - TRAILER.size)
+    if zlib.crc32(data[:expected - TRAILER.size]) != crc:
+        raise TemplateError("Template store checksum mismatch")
+
+    return [
+        Template.from_packet(data[offset:offset + record_size])
+        for offset in range(HEADER.size, expected - TRAILER.size, record_size)
+    ]
+
+
+def encode(templates) -> str:
+    """Store as a base64 string, for JSON messages"""
+    return base64.b64encode(pack(templates)).decode("ascii")
+
+
+def decode(text: str) -> list:
+    """
+    Templates from a base64 store string
+
+    Raises:
+        TemplateError: not base64, or not a valid store
+    """
+    try:
+        data = base64.b64decode(text, validate=True)
+    except (binascii.Error, TypeError, ValueError) as e:
+        raise TemplateError(f"Template store is not valid base64: {e}")
+    return unpack(data)
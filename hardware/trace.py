@@ -0,0 +1,794 @@
+"""
+Hardware Trace Module
+Records the serial, GPIO and MotorKit I/O of the hardware classes to a
+compact binary trace, and replays a trace through FingerprintSensor,
+InfraredSensor and StepperMotorController on a virtual clock
+
+Record (on the Pi):
+    python3 polling_client.py ... --record-trace dispenser.trace
+    python3 -m hardware.daemon --record-trace dispenser.trace
+
+Replay (anywhere, no hardware needed):
+    python3 -m hardware.trace replay dispenser.trace [--json]
+    python3 -m hardware.trace info dispenser.trace
+
+Trace format: the magic b"RTRC" and a version byte, then one 8-byte record
+header per event (microseconds since the previous record, kind, channel,
+value) followed by `value` payload bytes for the kinds that carry data.
+
+Replay is deterministic. Recorded calls run one at a time at their
+recorded start times. IR levels come from the recorded edges. Serial
+replies arrive at the same offset after their command as they did on the
+device. Every sleep advances a virtual clock instead of waiting, so a
+trace replays far faster than real time. Return values and outputs
+(serial writes, GPIO writes, motor steps) are compared with the
+recording. Any difference is reported as a divergence, which lets a
+production trace serve as a regression test and, through the per-method
+timings, as a benchmark.
+"""
+
+import bisect
+import functools
+import itertools
+import json
+import struct
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+
+from hardware.remote import METHODS
+
+MAGIC = b"RTRC"
+VERSION = 1
+RECORD = struct.Struct("<IBBH")
+
+# Record kinds
+GPIO_IN = 1        # channel=pin, value=level (only recorded when it changes)
+GPIO_OUT = 2       # channel=pin, value=level
+SERIAL_WRITE = 3   # channel=port, payload=bytes written
+SERIAL_READ = 4    # channel=port, payload=bytes read
+MOTOR_STEP = 5     # channel=stepper, value=direction << 8 | style
+MOTOR_RELEASE = 6  # channel=stepper
+INIT = 7           # payload=JSON {"o": object id, "c": class, "a": args, "k": kwargs}
+CALL = 8           # channel=call id, payload=JSON {"o", "m", "a", "k"}
+RETURN = 9         # channel=call id, payload=JSON return value
+
+KIND_NAMES = {
+    GPIO_IN: "gpio_in", GPIO_OUT: "gpio_out", SERIAL_WRITE: "serial_write",
+    SERIAL_READ: "serial_read", MOTOR_STEP: "motor_step", MOTOR_RELEASE: "motor_release",
+    INIT: "init", CALL: "call", RETURN: "return",
+}
+
+# Traced classes: name -> (module, public methods recorded as calls).
+# is_hand_detected is left out: the IR sampler calls it hundreds of times a
+# second. Its GPIO edges are still recorded. cleanup is replayed so objects
+# re-created later in a trace can claim the same pins again.
+TRACED_CLASSES = {
+    "FingerprintSensor": ("hardware.fingerprint_sensor", METHODS["fingerprint"] + ("cleanup",)),
+    "InfraredSensor": ("hardware.infrared_sensor",
+                       ("wait_for_hand", "wait_for_hand_removal", "cleanup")),
+    "StepperMotorController": ("hardware.stepper_motor", METHODS["motors"] + ("cleanup",)),
+}
+
+
+def _dump(value):
+    """JSON payload; events, callbacks and other live objects become null"""
+    return json.dumps(value, separators=(",", ":"), default=lambda _: None).encode()
+
+
+def _normalize(value):
+    """Value as it would look after a JSON round trip (int keys -> str etc.)"""
+    return json.loads(_dump(value))
+
+
+def _stepper_channel(address, port):
+    """Trace channel for stepper `port` (1-4) on the HAT at `address`"""
+    return ((address - 0x60) * 4 + port) & 0xFF
+
+
+# -- recording ---------------------------------------------------------------
+
+class TraceWriter:
+    """Appends records to a trace file (thread-safe)"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "wb")
+        self.file.write(MAGIC + bytes([VERSION]))
+        self.lock = threading.Lock()
+        self.start = time.monotonic()
+        self.last_us = 0
+        self.records = 0
+        self.counts = defaultdict(int)
+
+    def write(self, kind, channel=0, value=0, payload=b""):
+        with self.lock:
+            if self.file.closed:
+                return
+            now_us = int((time.monotonic() - self.start) * 1_000_000)
+            delta = min(now_us - self.last_us, 0xFFFFFFFF)
+            self.last_us = now_us
+            if payload:
+                payload = payload[:0xFFFF]
+                value = len(payload)
+            self.file.write(RECORD.pack(delta, kind, channel & 0xFF, value & 0xFFFF) + payload)
+            self.records += 1
+            self.counts[kind] += 1
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self.file.close()
+
+
+class _RecordingGPIO:
+    """RPi.GPIO wrapper recording input edges and outputs"""
+
+    def __init__(self, gpio, writer):
+        self._gpio = gpio
+        self._writer = writer
+        self._last = {}
+
+    def __getattr__(self, name):
+        return getattr(self._gpio, name)
+
+    def input(self, pin):
+        level = self._gpio.input(pin)
+        if self._last.get(pin) != level:
+            self._last[pin] = level
+            self._writer.write(GPIO_IN, pin, int(level))
+        return level
+
+    def output(self, pin, level):
+        self._gpio.output(pin, level)
+        self._writer.write(GPIO_OUT, pin, int(bool(level)))
+
+
+class _RecordingSerial:
+    """pyserial port wrapper recording every byte written and read"""
+
+    def __init__(self, port, writer, channel):
+        self._port = port
+        self._writer = writer
+        self._channel = channel
+
+    def __getattr__(self, name):
+        # Without a fileno() the sensor reads through read()/readinto(),
+        # which are recorded; reading the fd directly would bypass them
+        if name == "fileno":
+            raise AttributeError("recorded ports have no fileno()")
+        return getattr(self._port, name)
+
+    @property
+    def in_waiting(self):
+        return self._port.in_waiting
+
+    def read(self, size=1):
+        data = self._port.read(size)
+        if data:
+            self._writer.write(SERIAL_READ, self._channel, payload=bytes(data))
+        return data
+
+    def readinto(self, buffer):
+        count = self._port.readinto(buffer)
+        if count:
+            self._writer.write(SERIAL_READ, self._channel, payload=bytes(buffer[:count]))
+        return count
+
+    def write(self, data):
+        self._writer.write(SERIAL_WRITE, self._channel, payload=bytes(data))
+        return self._port.write(data)
+
+
+class _RecordingSerialModule:
+    """Stands in for the `serial` module, handing out recording ports"""
+
+    def __init__(self, serial_module, writer):
+        self._serial = serial_module
+        self._writer = writer
+        self._ports = itertools.count()
+
+    def __getattr__(self, name):
+        return getattr(self._serial, name)
+
+    def Serial(self, *args, **kwargs):
+        return _RecordingSerial(self._serial.Serial(*args, **kwargs), self._writer,
+                                next(self._ports))
+
+
+class _RecordingStepper:
+    def __init__(self, stepper, writer, channel):
+        self._stepper = stepper
+        self._writer = writer
+        self._channel = channel
+
+    def __getattr__(self, name):
+        return getattr(self._stepper, name)
+
+    def onestep(self, direction=1, style=1):
+        self._writer.write(MOTOR_STEP, self._channel, (int(direction) << 8) | int(style))
+        return self._stepper.onestep(direction=direction, style=style)
+
+    def release(self):
+        self._writer.write(MOTOR_RELEASE, self._channel)
+        return self._stepper.release()
+
+
+class _RecordingMotorKit:
+    def __init__(self, kit, writer, address):
+        self._kit = kit
+        for port in (1, 2, 3, 4):
+            name = f"stepper{port}"
+            stepper = getattr(kit, name, None)
+            if stepper is not None:
+                setattr(self, name, _RecordingStepper(
+                    stepper, writer, _stepper_channel(address, port)
+                ))
+
+    def __getattr__(self, name):
+        return getattr(self._kit, name)
+
+
+class TraceRecorder:
+    """Patches the hardware modules so their I/O is written to a trace"""
+
+    def __init__(self, path):
+        self.writer = TraceWriter(path)
+        self._local = threading.local()
+        self._call_ids = itertools.count()
+        self._object_ids = itertools.count()
+
+    def install(self):
+        import hardware.fingerprint_sensor as fingerprint_sensor
+        import hardware.infrared_sensor as infrared_sensor
+        import hardware.stepper_motor as stepper_motor
+
+        writer = self.writer
+        # One wrapper shared by both modules (they import the same RPi.GPIO)
+        gpio = _RecordingGPIO(fingerprint_sensor.GPIO, writer)
+        fingerprint_sensor.GPIO = gpio
+        infrared_sensor.GPIO = gpio
+        fingerprint_sensor.serial = _RecordingSerialModule(fingerprint_sensor.serial, writer)
+
+        motor_kit = stepper_motor.MotorKit
+
+        def recording_motor_kit(*args, **kwargs):
+            address = kwargs.get("address", 0x60)
+            return _RecordingMotorKit(motor_kit(*args, **kwargs), writer, address)
+
+        stepper_motor.MotorKit = recording_motor_kit
+
+        modules = {
+            "FingerprintSensor": fingerprint_sensor,
+            "InfraredSensor": infrared_sensor,
+            "StepperMotorController": stepper_motor,
+        }
+        for class_name, (_, methods) in TRACED_CLASSES.items():
+            cls = getattr(modules[class_name], class_name)
+            cls.__init__ = self._wrap_init(class_name, cls.__init__)
+            for method in methods:
+                setattr(cls, method, self._wrap_method(getattr(cls, method)))
+        return self
+
+    def _wrap_init(self, class_name, init):
+        recorder = self
+
+        @functools.wraps(init)
+        def wrapper(obj, *args, **kwargs):
+            obj._trace_id = next(recorder._object_ids)
+            recorder.writer.write(INIT, payload=_dump({
+                "o": obj._trace_id, "c": class_name, "a": args, "k": kwargs
+            }))
+            recorder._local.depth = getattr(recorder._local, "depth", 0) + 1
+            try:
+                init(obj, *args, **kwargs)
+            finally:
+                recorder._local.depth -= 1
+
+        return wrapper
+
+    def _wrap_method(self, method):
+        recorder = self
+
+        @functools.wraps(method)
+        def wrapper(obj, *args, **kwargs):
+            # Only outermost calls are replayed (pre_position calls rotate_segments)
+            if getattr(recorder._local, "depth", 0):
+                return method(obj, *args, **kwargs)
+
+            call_id = next(recorder._call_ids) & 0xFF
+            recorder.writer.write(CALL, call_id, payload=_dump({
+                "o": getattr(obj, "_trace_id", 0), "m": method.__name__, "a": args, "k": kwargs
+            }))
+            recorder._local.depth = 1
+            try:
+                result = method(obj, *args, **kwargs)
+            except Exception as e:
+                recorder.writer.write(RETURN, call_id, payload=_dump({"$error": str(e)}))
+                raise
+            finally:
+                recorder._local.depth = 0
+            recorder.writer.write(RETURN, call_id, payload=_dump(result))
+            return result
+
+        return wrapper
+
+    def close(self):
+        self.writer.close()
+        print(f"✓ Trace saved: {self.writer.path} ({self.writer.records} records)")
+        if self.writer.counts[SERIAL_WRITE] and not self.writer.counts[SERIAL_READ]:
+            print("⚠ Trace has serial writes but no serial reads: it can't be replayed")
+
+
+def record(path):
+    """
+    Start recording hardware I/O to `path`
+
+    Call before the hardware classes are instantiated. Works on the real
+    libraries and on hardware/simulated.py alike.
+
+    Returns:
+        TraceRecorder (call close() to flush the file)
+    """
+    return TraceRecorder(path).install()
+
+
+# -- reading -----------------------------------------------------------------
+
+def read_trace(path):
+    """
+    Yield (seconds since start, kind, channel, value, payload) per record
+
+    Raises:
+        ValueError: not a trace file (or an unsupported version)
+    """
+    with open(path, "rb") as f:
+        header = f.read(len(MAGIC) + 1)
+        if header[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a hardware trace")
+        if header[-1] != VERSION:
+            raise ValueError(f"Unsupported trace version {header[-1]}")
+
+        elapsed_us = 0
+        while True:
+            raw = f.read(RECORD.size)
+            if len(raw) < RECORD.size:
+                return
+            delta, kind, channel, value = RECORD.unpack(raw)
+            elapsed_us += delta
+            payload = b""
+            if kind in (SERIAL_WRITE, SERIAL_READ, INIT, CALL, RETURN):
+                payload = f.read(value)
+                if len(payload) < value:
+                    return  # truncated final record (recorder killed mid-write)
+            yield elapsed_us / 1_000_000, kind, channel, value, payload
+
+
+def trace_info(path):
+    """Record counts and duration of a trace"""
+    counts = defaultdict(int)
+    size = 0
+    duration = 0.0
+    for t, kind, _, _, payload in read_trace(path):
+        counts[KIND_NAMES.get(kind, str(kind))] += 1
+        size += RECORD.size + len(payload)
+        duration = t
+    return {"path": path, "duration_s": round(duration, 3), "bytes": size + len(MAGIC) + 1,
+            "records": dict(counts)}
+
+
+# -- replay ------------------------------------------------------------------
+
+class VirtualClock:
+    """Replaces the `time` module of the hardware modules during replay"""
+
+    EPOCH = 1_700_000_000.0
+
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self):
+        return self.EPOCH + self.now
+
+    def monotonic(self):
+        return self.now
+
+    perf_counter = monotonic
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            self.now += seconds
+
+    def advance_to(self, t):
+        if t > self.now:
+            self.now = t
+
+
+class _ReplayGPIO:
+    """RPi.GPIO stand-in: inputs follow the recorded edges, outputs are checked"""
+
+    BCM = 11
+    BOARD = 10
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+    PUD_OFF = 20
+    PUD_DOWN = 21
+    PUD_UP = 22
+
+    def __init__(self, replay):
+        self._replay = replay
+
+    def setmode(self, mode):
+        pass
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pin, direction, initial=None, pull_up_down=None):
+        pass
+
+    def cleanup(self, pins=None):
+        pass
+
+    def input(self, pin):
+        times, levels = self._replay.gpio_inputs.get(pin, ((), ()))
+        if not times:
+            return self.HIGH
+        index = bisect.bisect_right(times, self._replay.clock.now) - 1
+        return levels[max(index, 0)]
+
+    def output(self, pin, level):
+        self._replay.check_output(("gpio", pin), int(bool(level)))
+
+
+class _ReplaySerial:
+    """
+    pyserial stand-in for one recorded port
+
+    Each write is matched with the next recorded write. The bytes read
+    after that write in the recording become readable at the same offset
+    after the replayed write. Polling with nothing due jumps the clock to
+    the next reply, or forward 1 ms when none is left (the device timed out
+    in the recording too).
+    """
+
+    IDLE_STEP = 0.001
+
+    def __init__(self, replay, channel):
+        self._replay = replay
+        self._events = replay.serial_events.get(channel, [])
+        self._channel = channel
+        self._next = 0
+        self._rx = bytearray()
+        self._due = deque()
+        self.is_open = True
+
+    def _pull_due(self):
+        now = self._replay.clock.now
+        while self._due and self._due[0][0] <= now:
+            self._rx.extend(self._due.popleft()[1])
+
+    @property
+    def in_waiting(self):
+        self._pull_due()
+        if not self._rx:
+            if self._due:
+                self._replay.clock.advance_to(self._due[0][0])
+                self._pull_due()
+            else:
+                self._replay.clock.sleep(self.IDLE_STEP)
+        return len(self._rx)
+
+    def read(self, size=1):
+        self._pull_due()
+        data = bytes(self._rx[:size])
+        del self._rx[:size]
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def write(self, data):
+        data = bytes(data)
+        self._due.clear()
+
+        # Next recorded write on this port
+        while self._next < len(self._events) and self._events[self._next][0] != "w":
+            self._next += 1
+        if self._next >= len(self._events):
+            self._replay.divergence(f"serial {self._channel}: unexpected write {data.hex()}")
+            return len(data)
+
+        _, written_at, expected = self._events[self._next]
+        if data != expected:
+            self._replay.divergence(
+                f"serial {self._channel}: wrote {data.hex()}, recorded {expected.hex()}"
+            )
+        self._next += 1
+
+        now = self._replay.clock.now
+        while self._next < len(self._events) and self._events[self._next][0] == "r":
+            _, read_at, reply = self._events[self._next]
+            self._due.append((now + read_at - written_at, reply))
+            self._next += 1
+        return len(data)
+
+    def reset_input_buffer(self):
+        self._rx.clear()
+
+    def close(self):
+        self.is_open = False
+
+
+class _ReplaySerialModule:
+    SerialException = IOError
+
+    def __init__(self, replay):
+        self._replay = replay
+        self._ports = itertools.count()
+
+    def Serial(self, *args, **kwargs):
+        return _ReplaySerial(self._replay, next(self._ports))
+
+
+class _ReplayStepper:
+    def __init__(self, replay, channel):
+        self._replay = replay
+        self._channel = channel
+
+    def onestep(self, direction=1, style=1):
+        self._replay.check_output(("motor", self._channel),
+                                  ("step", (int(direction) << 8) | int(style)))
+
+    def release(self):
+        self._replay.check_output(("motor", self._channel), ("release", 0))
+
+
+class _ReplayMotorKit:
+    def __init__(self, replay, address=0x60):
+        for port in (1, 2, 3, 4):
+            setattr(self, f"stepper{port}",
+                    _ReplayStepper(replay, _stepper_channel(address, port)))
+
+
+class _SilentAudioPlayer:
+    def play_sound(self, sound_type):
+        pass
+
+
+class TraceReplay:
+    """Replays a recorded trace through the hardware classes"""
+
+    # Divergence messages kept in the report (all are counted)
+    MAX_MESSAGES = 20
+
+    def __init__(self, path):
+        self.path = path
+        self.clock = VirtualClock()
+
+        # Recorded calls in start order: (t, kind, object id, payload, return t, result)
+        self.calls = []
+        self.gpio_inputs = {}
+        self.serial_events = defaultdict(list)
+        self.expected_outputs = defaultdict(deque)
+
+        self.divergences = 0
+        self.messages = []
+
+        self._load()
+
+    def _load(self):
+        open_calls = {}
+        inputs = defaultdict(lambda: ([], []))
+
+        for t, kind, channel, value, payload in read_trace(self.path):
+            if kind == GPIO_IN:
+                times, levels = inputs[channel]
+                times.append(t)
+                levels.append(value)
+            elif kind == GPIO_OUT:
+                self.expected_outputs[("gpio", channel)].append(value)
+            elif kind == SERIAL_WRITE:
+                self.serial_events[channel].append(("w", t, payload))
+            elif kind == SERIAL_READ:
+                self.serial_events[channel].append(("r", t, payload))
+            elif kind == MOTOR_STEP:
+                self.expected_outputs[("motor", channel)].append(("step", value))
+            elif kind == MOTOR_RELEASE:
+                self.expected_outputs[("motor", channel)].append(("release", 0))
+            elif kind == INIT:
+                self.calls.append([t, INIT, json.loads(payload), None, None])
+            elif kind == CALL:
+                entry = [t, CALL, json.loads(payload), None, None]
+                open_calls[channel] = entry
+                self.calls.append(entry)
+            elif kind == RETURN:
+                entry = open_calls.pop(channel, None)
+                if entry is not None:
+                    entry[3] = t
+                    entry[4] = json.loads(payload)
+
+        self.gpio_inputs = dict(inputs)
+
+    def divergence(self, message):
+        self.divergences += 1
+        if len(self.messages) < self.MAX_MESSAGES:
+            self.messages.append(f"[{self.clock.now:.3f}s] {message}")
+
+    def check_output(self, stream, value):
+        expected = self.expected_outputs[stream]
+        if not expected:
+            self.divergence(f"{stream[0]} {stream[1]}: unexpected {value}")
+            return
+        recorded = expected.popleft()
+        if recorded != value:
+            self.divergence(f"{stream[0]} {stream[1]}: got {value}, recorded {recorded}")
+
+    def _patch_modules(self):
+        """Point the hardware modules at the replay stand-ins; returns an undo list"""
+        import importlib.util
+
+        # The hardware modules import these at load time; off the Pi, let them
+        # import the simulated ones (replay replaces what they touch anyway)
+        libraries = ("RPi", "serial", "board", "adafruit_motorkit", "adafruit_motor")
+        if any(name not in sys.modules and importlib.util.find_spec(name) is None
+               for name in libraries):
+            from hardware import simulated
+            simulated.install()
+
+        import hardware.fingerprint_sensor as fingerprint_sensor
+        import hardware.infrared_sensor as infrared_sensor
+        import hardware.stepper_motor as stepper_motor
+        from hardware import resources
+
+        gpio = _ReplayGPIO(self)
+        replay = self
+        patches = [
+            # Claims made during the replay don't touch the real process's
+            (resources, "_manager", resources.ResourceManager()),
+            (fingerprint_sensor, "GPIO", gpio),
+            (fingerprint_sensor, "serial", _ReplaySerialModule(self)),
+            (fingerprint_sensor, "time", self.clock),
+            (fingerprint_sensor, "AudioPlayer", _SilentAudioPlayer),
+            (infrared_sensor, "GPIO", gpio),
+            (infrared_sensor, "time", self.clock),
+            (stepper_motor, "MotorKit",
+             lambda i2c=None, address=0x60, **_: _ReplayMotorKit(replay, address)),
+            (stepper_motor, "board", type("board", (), {"I2C": staticmethod(lambda: None)})),
+            (stepper_motor, "time", self.clock),
+        ]
+        undo = []
+        for module, name, value in patches:
+            undo.append((module, name, getattr(module, name)))
+            setattr(module, name, value)
+
+        classes = {
+            "FingerprintSensor": fingerprint_sensor.FingerprintSensor,
+            "InfraredSensor": infrared_sensor.InfraredSensor,
+            "StepperMotorController": stepper_motor.StepperMotorController,
+        }
+        return classes, undo
+
+    def run(self):
+        """
+        Replay every recorded call
+
+        Returns:
+            Report dict: calls, result mismatches, output divergences,
+            recorded vs replayed time per method, virtual time and speedup
+        """
+        classes, undo = self._patch_modules()
+        objects = {}
+        mismatches = 0
+        timings = defaultdict(lambda: {"calls": 0, "recorded_ms": 0.0, "replayed_ms": 0.0})
+        wall_start = time.perf_counter()
+
+        try:
+            for started, kind, payload, returned, result in self.calls:
+                self.clock.advance_to(started)
+
+                if kind == INIT:
+                    # A constructor that raised while recording (e.g. a pin
+                    # conflict) raises again here; calls on it can't follow
+                    try:
+                        objects[payload["o"]] = classes[payload["c"]](*payload["a"], **payload["k"])
+                    except Exception:
+                        pass
+                    continue
+
+                obj = objects.get(payload["o"])
+                if obj is None:
+                    self.divergence(f"call on unknown object {payload['o']}")
+                    continue
+
+                replay_start = self.clock.now
+                try:
+                    value = _normalize(getattr(obj, payload["m"])(*payload["a"], **payload["k"]))
+                except Exception as e:
+                    value = {"$error": str(e)}
+                replay_ms = (self.clock.now - replay_start) * 1000
+
+                timing = timings[payload["m"]]
+                timing["calls"] += 1
+                timing["replayed_ms"] += replay_ms
+                if returned is not None:
+                    timing["recorded_ms"] += (returned - started) * 1000
+                    if value != result:
+                        mismatches += 1
+                        self.divergence(f"{payload['m']} returned {value}, recorded {result}")
+        finally:
+            for module, name, value in undo:
+                setattr(module, name, value)
+
+        wall = time.perf_counter() - wall_start
+        leftover = sum(len(q) for q in self.expected_outputs.values())
+        return {
+            "trace": self.path,
+            "calls": sum(t["calls"] for t in timings.values()),
+            "result_mismatches": mismatches,
+            "divergences": self.divergences,
+            "unreplayed_outputs": leftover,
+            "messages": self.messages,
+            "methods": {
+                name: {key: round(v, 1) if isinstance(v, float) else v for key, v in t.items()}
+                for name, t in timings.items()
+            },
+            "virtual_s": round(self.clock.now, 3),
+            "wall_s": round(wall, 3),
+            "speedup": round(self.clock.now / wall, 1) if wall > 0 else None,
+        }
+
+
+def replay(path):
+    """Replay a trace file and return the report (see TraceReplay.run)"""
+    return TraceReplay(path).run()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect or replay a hardware trace")
+    parser.add_argument("action", choices=("info", "replay"))
+    parser.add_argument("trace", help="Trace file")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    try:
+        report = trace_info(args.trace) if args.action == "info" else replay(args.trace)
+    except (OSError, ValueError) as e:
+        print(f"✗ {e}")
+        sys.exit(2)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    elif args.action == "info":
+        print(f"{report['path']}: {report['duration_s']}s, {report['bytes']} bytes")
+        for kind, count in sorted(report["records"].items()):
+            print(f"  {kind:<14} {count}")
+        if report["records"].get("serial_write") and not report["records"].get("serial_read"):
+            print("⚠ Serial writes but no serial reads: this trace can't be replayed")
+    else:
+        print(f"Replayed {report['calls']} calls: {report['virtual_s']}s of device time "
+              f"in {report['wall_s']}s ({report['speedup']}x)")
+        print(f"{'method':<22} {'calls':>6} {'recorded ms':>12} {'replayed ms':>12}")
+        for name, t in report["methods"].items():
+            print(f"{name:<22} {t['calls']:>6} {t['recorded_ms']:>12.1f} {t['replayed_ms']:>12.1f}")
+        for message in report["messages"]:
+            print(f"  ⚠ {message}")
+        if report["divergences"] or report["unreplayed_outputs"]:
+            print(f"✗ {report['divergences']} divergences, "
+                  f"{report['unreplayed_outputs']} recorded outputs not reproduced")
+        else:
+            print("✓ Replay matches the recording")
+
+    if args.action == "replay" and (report["divergences"] or report["unreplayed_outputs"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Lean HTTP client for memory-constrained devices
+The subset of requests.Session the polling client uses (get/post,
+status_code, headers, json()) on top of http.client with keep-alive
+
+Importing requests (urllib3, idna, charset detection, certifi) costs
+several MB of RSS on a Pi Zero; http.client is in the standard library and
+mostly loaded already. Used by polling_client.py --lean.
+"""
+
+import http.client
+import json
+import threading
+from urllib.parse import urlsplit
+
+
+class RequestException(OSError):
+    """Connection or protocol error (the lean counterpart of requests.RequestException)"""
+
+
+class Response:
+    """Just enough of requests.Response"""
+
+    __slots__ = ("status_code", "headers", "content")
+
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        # http.client.HTTPMessage: .get() is case-insensitive like requests'
+        self.headers = headers
+        self.content = content
+
+    def json(self):
+        try:
+            return json.loads(self.content)
+        except ValueError as e:
+            raise RequestException(f"Invalid JSON in response: {e}") from e
+
+
+class Session:
+    """Keep-alive connections per host, safe to share between threads"""
+
+    # Idle connections kept per host (poll loop, uploader, command worker)
+    MAX_IDLE = 4
+
+    def __init__(self):
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def get(self, url, headers=None, timeout=None):
+        return self.request("GET", url, headers=headers, timeout=timeout)
+
+    def post(self, url, data=None, headers=None, timeout=None):
+        return self.request("POST", url, data=data, headers=headers, timeout=timeout)
+
+    def request(self, method, url, data=None, headers=None, timeout=None):
+        """
+        Send one request and read the whole response
+
+        Raises:
+            RequestException: connection failed, timed out or broke mid-response
+        """
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+
+        while True:
+            conn, reused = self._checkout(key, timeout)
+            try:
+                conn.request(method, path, body=data, headers=headers or {})
+                response = conn.getresponse()
+                content = response.read()
+            except (http.client.HTTPException, OSError) as e:
+                conn.close()
+                # The server closed an idle keep-alive connection before
+                # reading the request: retry once on a fresh connection
+                if reused and isinstance(e, (http.client.RemoteDisconnected,
+                                             BrokenPipeError, ConnectionResetError)):
+                    continue
+                raise RequestException(f"{method} {url}: {e}") from e
+
+            if response.will_close:
+                conn.close()
+            else:
+                self._checkin(key, conn)
+            return Response(response.status, response.headers, content)
+
+    def _checkout(self, key, timeout):
+        with self._lock:
+            idle = self._idle.get(key)
+            conn = idle.pop() if idle else None
+        reused = conn is not None
+
+        if conn is None:
+            scheme, netloc = key
+            if scheme == "https":
+                conn = http.client.HTTPSConnection(netloc, timeout=timeout)
+            elif scheme == "http":
+                conn = http.client.HTTPConnection(netloc, timeout=timeout)
+            else:
+                raise RequestException(f"Unsupported URL scheme: {scheme}")
+        else:
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+        return conn, reused
+
+    def _checkin(self, key, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.MAX_IDLE:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
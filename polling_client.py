@@ -3,21 +3,43 @@ HTTP Polling Client for IoT Pill Dispenser
 Connects to your hosted backend to receive commands and send status updates
 """
 
+import os
 import time
-import requests
 import socket
-from datetime import datetime
+import threading
 from typing import Optional
 
-from hardware.fingerprint_sensor import FingerprintSensor
-from hardware.infrared_sensor import InfraredSensor
-from hardware.stepper_motor import StepperMotorController
+from wire_encoding import WireEncoder, JSON
+from command_scheduler import CommandScheduler, ScheduledCommand
+from config import RuntimeConfig
+from connectivity import ConnectivityMonitor
+from event_log import EventLog, CONTENT_TYPE as EVENT_LOG_CONTENT_TYPE
+from profiling import Profiler
+from status_uploader import StatusUploader
+
+
+# Commands that can't run on a dispenser without a fingerprint sensor
+FINGERPRINT_COMMANDS = ("unlock", "unlock_and_dispense", "register_fingerprint",
+                        "register_fingerprint_session", "export_fingerprints",
+                        "sync_fingerprints")
 
 
 class PollingClient:
     """Polls backend for commands and executes them"""
     
-    def __init__(self, backend_url: str, device_id: str, poll_interval: int = 5):
+    def __init__(self, backend_url: str, device_id: str, poll_interval: int = 5,
+                 wire_format: str = JSON, compression: Optional[str] = None,
+                 motor_address: int = 0x60, ir_pin: int = 25,
+                 fingerprint_port: Optional[str] = "/dev/serial0",
+                 fingerprint_wake_pin: int = 23, fingerprint_rst_pin: int = 24,
+                 session=None,
+                 ir_sample_rate: int = 200,
+                 hardware_socket: Optional[str] = None,
+                 profiler: Optional[Profiler] = None,
+                 lean: bool = False,
+                 config: Optional[RuntimeConfig] = None,
+                 events: Optional[EventLog] = None,
+                 connectivity: Optional[ConnectivityMonitor] = None):
         """
         Initialize polling client
         
@@ -25,21 +47,157 @@ class PollingClient:
             backend_url: Your hosted backend URL (e.g., "https://your-app.com")
             device_id: Unique identifier for this device (e.g., "pi-001")
             poll_interval: How often to poll in seconds (default: 5)
+            wire_format: Upload encoding: "json", "msgpack" or "cbor" (default: json)
+            compression: Optional upload compression: "gzip" or "zstd"
+            motor_address: I2C address of this dispenser's Motor HAT (default: 0x60)
+            ir_pin: BCM pin of this dispenser's IR sensor (default: 25)
+            fingerprint_port: Serial port of the fingerprint reader, or None
+                              if this dispenser has no reader
+            fingerprint_wake_pin: BCM wake pin of the reader (default: 23)
+            fingerprint_rst_pin: BCM reset pin of the reader (default: 24);
+                                 every reader in a process needs its own pins
+            session: Shared requests.Session (e.g. one pool for a whole fleet)
+                     or lean_http.Session
+            ir_sample_rate: Background IR samples per second (default: 200)
+            hardware_socket: Unix socket of a hardware daemon
+                             (python3 -m hardware.daemon). When given, this
+                             process never touches GPIO, serial or I2C and the
+                             hardware arguments above are the daemon's business.
+                             fingerprint_port=None still means "no reader".
+            profiler: Stack sampler for command execution and the poll loop
+                      (idle until started, e.g. with --profile or SIGUSR1)
+            lean: Use the standard-library HTTP client (lean_http) instead
+                  of importing requests, for 512 MB Pi Zero class devices
+            config: Runtime settings (config.py), applied live whenever the
+                    file or a backend override changes them. Its
+                    client.poll_interval takes the place of poll_interval.
+            events: Local event log (default: events/<device_id>); every
+                    command, progress event and status is recorded in it
+            connectivity: Backend connection monitor (default: one for
+                          backend_url); a fleet shares one, and stops it
+                          itself (stop() only stops the default). While it is
+                          offline no polls or heartbeats are sent and
+                          statuses wait in the uploader's queue.
+        
+        Network errors of both session types are OSError subclasses
+        (requests.RequestException, lean_http.RequestException).
         """
         self.backend_url = backend_url.rstrip('/')
         self.device_id = device_id
-        self.poll_interval = poll_interval
         self.running = False
         
+        self.config = config or RuntimeConfig(base={"client.poll_interval": poll_interval})
+        self.poll_interval = self.config.get("client.poll_interval")
+        self.heartbeat_interval = self.config.get("client.heartbeat_interval")
+        self.pill_taken_timeout = self.config.get("client.pill_taken_timeout")
+        self.http_timeout = self.config.get("client.http_timeout")
+        # Set to cut the wait between polls short (new poll interval, stop)
+        self._wakeup = threading.Event()
+        self.encoder = WireEncoder(wire_format, compression)
+        if session is None:
+            if lean:
+                import lean_http
+                session = lean_http.Session()
+            else:
+                import requests
+                session = requests.Session()
+        self.http = session
+        self.profiler = profiler or Profiler()
+        self.events = events or EventLog(os.path.join("events", device_id))
+        self._owns_connectivity = connectivity is None
+        self.connectivity = connectivity or ConnectivityMonitor(self.backend_url)
+        self.connectivity.subscribe(self._on_connectivity_change)
+        
         # Initialize hardware
         print(f"Initializing device {device_id}...")
-        self.fingerprint = FingerprintSensor()
-        self.infrared = InfraredSensor()
-        self.motors = StepperMotorController()
-        print("✓ Hardware initialized")
+        if hardware_socket:
+            from hardware.remote import RemoteHardware
+            
+            remote = RemoteHardware(hardware_socket)
+            self.fingerprint = remote.fingerprint if fingerprint_port else None
+            self.infrared = remote.infrared
+            self.ir_sampler = remote.ir_sampler
+            self.motors = remote.motors
+            print(f"✓ Using hardware daemon at {hardware_socket}")
+        else:
+            from hardware.fingerprint_sensor import FingerprintSensor
+            from hardware.infrared_sensor import InfraredSensor
+            from hardware.ir_sampler import IRSampler
+            from hardware.stepper_motor import StepperMotorController
+            
+            self.fingerprint = FingerprintSensor(
+                fingerprint_port, wake_pin=fingerprint_wake_pin, rst_pin=fingerprint_rst_pin,
+                compare_level=self.config.get("fingerprint.compare_level")
+            ) if fingerprint_port else None
+            self.infrared = InfraredSensor(ir_pin)
+            self.ir_sampler = IRSampler(self.infrared, rate_hz=ir_sample_rate,
+                                        window=self.config.get("infrared.filter_window"))
+            self.motors = StepperMotorController(
+                motor_address, step_delay=self.config.get("motors.step_delay")
+            )
+            print("✓ Hardware initialized")
         
         # Device state
         self.device_locked = True
+        
+        # ETag of the last commands response, sent back as If-None-Match so
+        # idle polls come back as an empty 304
+        self.commands_etag = None
+        # Reused by every poll
+        self._commands_url = f"{self.backend_url}/api/devices/{device_id}/commands"
+        self._poll_headers = {}
+        
+        # Commands run on the scheduler's worker so polling continues while
+        # a dispense waits for a hand, and a lock can preempt that wait
+        self.scheduler = CommandScheduler(self._run_scheduled, name=f"commands-{device_id}")
+        # Progress events are uploaded in the background so emitting them
+        # never delays the hardware
+        self.uploader = StatusUploader(self.send_status_batch, name=f"uploads-{device_id}",
+                                       connectivity=self.connectivity)
+        
+        # Heartbeats: when the next is due, failures in a row, and those
+        # skipped while offline (reported when the connection is back)
+        self._next_heartbeat = 0
+        self.heartbeat_failures = 0
+        self.missed_heartbeats = 0
+        
+        # Cancel event, queueing delay and correlation ID of the command
+        # being executed
+        self._cancel = None
+        self._queue_delay_ms = None
+        self._command_id = None
+        
+        # Each component applies its own section of the settings
+        self.config.subscribe("client", lambda values: self.configure(**values))
+        self.config.subscribe("motors", lambda values: self.motors.configure(**values))
+        self.config.subscribe("infrared", lambda values: self.ir_sampler.configure(**values))
+        if self.fingerprint:
+            self.config.subscribe("fingerprint", lambda values: self.fingerprint.configure(**values))
+        self.config.apply_all()
+    
+    def configure(self, poll_interval=None, heartbeat_interval=None,
+                  pill_taken_timeout=None, http_timeout=None):
+        """
+        Change client settings while running (the "client" config section)
+        
+        Returns:
+            dict of the settings that changed
+        """
+        requested = {
+            "poll_interval": poll_interval,
+            "heartbeat_interval": heartbeat_interval,
+            "pill_taken_timeout": pill_taken_timeout,
+            "http_timeout": http_timeout,
+        }
+        changed = {}
+        for name, value in requested.items():
+            if value is not None and value != getattr(self, name):
+                setattr(self, name, value)
+                changed[name] = value
+        if "poll_interval" in changed:
+            # Don't sit out the rest of the old interval
+            self._wakeup.set()
+        return changed
     
     def get_local_ip(self):
         """Get device's local IP address"""
@@ -59,12 +217,22 @@ class PollingClient:
         Expected backend endpoint: GET /api/devices/{device_id}/commands
         Expected response: 
             { "command": "dispense", "params": {...} } or { "command": null }
+            or 304 Not Modified (no body) when the ETag still matches
         """
+        headers = self._poll_headers
+        if self.commands_etag:
+            headers["If-None-Match"] = self.commands_etag
+        
         try:
-            response = requests.get(
-                f"{self.backend_url}/api/devices/{self.device_id}/commands",
-                timeout=10
-            )
+            response = self.http.get(self._commands_url, headers=headers, timeout=self.http_timeout)
+            self.connectivity.report_success()
+            
+            if response.status_code == 304:
+                return None
+            
+            etag = response.headers.get("ETag")
+            if etag:
+                self.commands_etag = etag
             
             if response.status_code == 200:
                 data = response.json()
@@ -72,68 +240,223 @@ class PollingClient:
             
             return None
         
-        except requests.exceptions.RequestException as e:
+        except OSError as e:
             print(f"✗ Poll error: {e}")
+            self.connectivity.report_failure()
             return None
     
+    def _post_encoded(self, path: str, build_payload, timeout: int):
+        """
+        POST a payload using the configured wire encoding
+        
+        build_payload is called to create the payload so it can be rebuilt
+        in the verbose JSON schema if the backend answers 415 Unsupported
+        Media Type to a compact or compressed body.
+        """
+        url = f"{self.backend_url}{path}"
+        body, headers = self.encoder.encode(build_payload())
+        response = self.http.post(url, data=body, headers=headers, timeout=timeout)
+        
+        if response.status_code == 415 and not self.encoder.is_plain:
+            self.encoder.use_json()
+            body, headers = self.encoder.encode(build_payload())
+            response = self.http.post(url, data=body, headers=headers, timeout=timeout)
+        
+        return response
+    
     def send_status(self, status_type: str, data: dict):
         """
         Send status update to backend
         
         Backend endpoint: POST /api/devices/{device_id}/status
         """
+        # Let the command's progress events reach the backend first
+        if self._command_id is not None and self.connectivity.online:
+            self.uploader.flush()
+        
+        timestamp = time.time()
+        data = self._with_command_context(data)
+        self.events.log(status_type, data, timestamp)
+        if not self.connectivity.online:
+            # Sent with the rest of the backlog when the connection is back
+            print(f"· Status queued (offline): {status_type}")
+            self.uploader.submit(status_type, data, timestamp)
+            return
+        
         try:
-            payload = {
-                "device_id": self.device_id,
-                "status_type": status_type,
-                "timestamp": datetime.now().isoformat(),
-                "data": data
-            }
-            
-            response = requests.post(
-                f"{self.backend_url}/api/devices/{self.device_id}/status",
-                json=payload,
-                timeout=10
+            response = self._post_encoded(
+                f"/api/devices/{self.device_id}/status",
+                lambda: self.encoder.status_payload(self.device_id, status_type, data, timestamp),
+                timeout=self.http_timeout
             )
+            self.connectivity.report_success()
             
             if response.status_code == 200:
                 print(f"✓ Status sent: {status_type}")
             else:
                 print(f"✗ Status failed: {response.status_code}")
         
-        except requests.exceptions.RequestException as e:
-            print(f"✗ Send status error: {e}")
+        except OSError as e:
+            print(f"✗ Send status error: {e} (queued for retry)")
+            self.connectivity.report_failure()
+            self.uploader.submit(status_type, data, timestamp)
+    
+    def emit_progress(self, status_type: str, data: dict):
+        """
+        Report an intermediate step of the running command without blocking
+        
+        The event is timestamped now and uploaded by the background
+        uploader, batched with any other events queued meanwhile.
+        """
+        print(f"· {status_type}")
+        data = self._with_command_context(data)
+        self.events.log(status_type, data)
+        self.uploader.submit(status_type, data)
+    
+    def _with_command_context(self, data: dict) -> dict:
+        """Add the running command's correlation ID and queueing delay"""
+        if self._command_id is None:
+            return data
+        data = {**data, "command_id": self._command_id}
+        if self._queue_delay_ms is not None:
+            data["queue_delay_ms"] = self._queue_delay_ms
+        return data
+    
+    def send_status_batch(self, statuses: list):
+        """
+        Send several status updates in one request
+        
+        Args:
+            statuses: List of (status_type, data, timestamp) tuples
+        
+        Backend endpoint: POST /api/devices/{device_id}/status (array body)
+        
+        Returns:
+            bool: True if the backend accepted the batch
+        """
+        def build_payload():
+            return self.encoder.batch_payload([
+                self.encoder.status_payload(self.device_id, status_type, data, timestamp)
+                for status_type, data, timestamp in statuses
+            ])
+        
+        try:
+            response = self._post_encoded(
+                f"/api/devices/{self.device_id}/status", build_payload, timeout=self.http_timeout
+            )
+            self.connectivity.report_success()
+            if response.status_code == 200:
+                print(f"✓ Status batch sent: {len(statuses)} events")
+                return True
+            print(f"✗ Status batch failed: {response.status_code}")
+        
+        except OSError as e:
+            print(f"✗ Send status batch error: {e}")
+            self.connectivity.report_failure()
+        
+        return False
+    
+    def _run_scheduled(self, item: ScheduledCommand):
+        """Scheduler callback: execute a command with its cancel event"""
+        self.execute_command(item.command, item.cancel, item.queue_delay_ms)
     
-    def execute_command(self, command: dict):
-        """Execute a command received from backend"""
+    def execute_command(self, command: dict, cancel: Optional[threading.Event] = None,
+                        queue_delay_ms: Optional[float] = None):
+        """
+        Execute a command received from backend
+        
+        Args:
+            command: Command dict from the backend
+            cancel: Event set when a higher-priority command preempts this one
+            queue_delay_ms: Time the command spent queued, reported with
+                            every status it sends
+        
+        Every status sent for the command carries a command_id: the
+        backend's command_id if it sent one, otherwise a generated one.
+        """
         cmd = command.get("command")
         params = command.get("params", {})
         
-        print(f"\n→ Executing: {cmd}")
+        if queue_delay_ms is None:
+            print(f"\n→ Executing: {cmd}")
+        else:
+            print(f"\n→ Executing: {cmd} (queued {queue_delay_ms}ms)")
+        
+        self._cancel = cancel
+        self._queue_delay_ms = queue_delay_ms
+        self._command_id = str(command.get("command_id") or os.urandom(6).hex())
+        started = time.monotonic()
+        self.events.log("command_received", self._with_command_context({"command": cmd}))
+        try:
+            with self.profiler.section(f"command:{cmd}"):
+                self._dispatch(cmd, params)
+        finally:
+            self.events.log("command_done", self._with_command_context({
+                "command": cmd,
+                "duration_ms": (time.monotonic() - started) * 1000
+            }))
+            self._cancel = None
+            self._queue_delay_ms = None
+            self._command_id = None
+    
+    def _dispatch(self, cmd: str, params: dict):
+        """Run the handler for one command"""
+        
+        if cmd in FINGERPRINT_COMMANDS and self.fingerprint is None:
+            print("✗ No fingerprint sensor on this dispenser")
+            self.send_status("error", {"message": f"{cmd} requires a fingerprint sensor"})
+            return
         
         if cmd == "unlock":
-            self._handle_unlock()
+            self._handle_unlock(params)
         
         elif cmd == "lock":
             self._handle_lock()
         
+        elif cmd == "emergency_stop":
+            self._handle_emergency_stop()
+        
         elif cmd == "dispense":
             self._handle_dispense(params)
         
+        elif cmd == "unlock_and_dispense":
+            self._handle_unlock_and_dispense(params)
+        
         elif cmd == "register_fingerprint":
-            self._handle_register_fingerprint()
+            self._handle_register_fingerprint(params)
+        
+        elif cmd == "register_fingerprint_session":
+            self._handle_register_fingerprint_session(params)
+        
+        elif cmd == "export_fingerprints":
+            self._handle_export_fingerprints(params)
+        
+        elif cmd == "sync_fingerprints":
+            self._handle_sync_fingerprints(params)
         
         elif cmd == "check_hand":
             self._handle_check_hand()
         
+        elif cmd == "update_config":
+            self._handle_update_config(params)
+        
+        elif cmd == "upload_event_log":
+            self._handle_upload_event_log(params)
+        
         else:
             print(f"✗ Unknown command: {cmd}")
             self.send_status("error", {"message": f"Unknown command: {cmd}"})
     
-    def _handle_unlock(self):
-        """Handle unlock command - wait for fingerprint"""
+    def _handle_unlock(self, params: dict):
+        """
+        Handle unlock command - wait for fingerprint
+        
+        If params include the expected user_id the scan is verified 1:1
+        against that user, otherwise the whole library is searched (1:N).
+        """
+        user_id = params.get("user_id") if params else None
         print("Waiting for fingerprint...")
-        result = self.fingerprint.verify_user()
+        result = self.fingerprint.verify_user(user_id, cancel=self._cancel)
         
         if result["success"]:
             self.device_locked = False
@@ -144,7 +467,10 @@ class PollingClient:
             })
         else:
             print(f"✗ {result['message']}")
-            self.send_status("unlock_failed", {"message": result["message"]})
+            self.send_status("unlock_failed", {
+                "message": result["message"],
+                "preempted": bool(result.get("cancelled"))
+            })
     
     def _handle_lock(self):
         """Handle lock command"""
@@ -152,6 +478,21 @@ class PollingClient:
         print("✓ Locked")
         self.send_status("locked", {"message": "Device locked"})
     
+    def _handle_emergency_stop(self):
+        """
+        Handle emergency stop: lock, de-energize the motors and drop every
+        queued command. The command it preempted has already been cancelled
+        by the scheduler.
+        """
+        self.device_locked = True
+        self.motors.release_all()
+        dropped = self.scheduler.drop_pending()
+        print(f"✓ Emergency stop ({len(dropped)} queued commands dropped)")
+        self.send_status("emergency_stopped", {
+            "locked": True,
+            "dropped": [item.name for item in dropped]
+        })
+    
     def _handle_dispense(self, params: dict):
         """Handle dispense command"""
         if self.device_locked:
@@ -163,14 +504,23 @@ class PollingClient:
         segment = params.get("segment")
         
         # Dispense pill
+        started = time.monotonic()
+        self.emit_progress("dispense_started", {"motor_id": motor_id, "segment": segment})
         result = self.motors.dispense_pill(motor_id, segment)
+        self.emit_progress("motor_done", {
+            "motor_id": motor_id,
+            "segment": segment,
+            "success": result["success"]
+        })
         
         if result["success"]:
             print(f"✓ Dispensed: Motor {motor_id}, Segment {segment}")
             
             # Wait for hand detection
             print("Waiting for hand...")
-            hand_detected = self.infrared.wait_for_hand(timeout=30)
+            hand_detected = self._wait_for_pill_taken(
+                started, {"motor_id": motor_id, "segment": segment}
+            )
             
             if hand_detected:
                 print("✓ Pill taken")
@@ -180,56 +530,436 @@ class PollingClient:
                     "taken": True
                 })
             else:
-                print("⚠ No hand detected")
+                preempted = self._preempted()
+                print("⚠ Hand wait preempted" if preempted else "⚠ No hand detected")
                 self.send_status("pill_taken", {
                     "motor_id": motor_id,
                     "segment": segment,
-                    "taken": False
+                    "taken": False,
+                    "preempted": preempted
                 })
         else:
             print(f"✗ Dispense failed: {result['message']}")
             self.send_status("error", {"message": result["message"]})
     
-    def _handle_register_fingerprint(self):
-        """Handle fingerprint registration"""
+    def _handle_unlock_and_dispense(self, params: dict):
+        """
+        Handle a full dose in one command: verify fingerprint, dispense
+        every requested pill, then relock
+        
+        Motors are pre-rotated to just before their first segment while the
+        fingerprint wait is in progress. A single consolidated status is sent
+        at the end.
+        
+        Params:
+            user_id: Expected user ID (optional, enables 1:1 verification)
+            dispenses: List of {"motor_id": int, "segment": int}
+        """
+        user_id = params.get("user_id")
+        dispenses = params.get("dispenses") or []
+        
+        if not dispenses:
+            print("✗ No dispenses requested")
+            self.send_status("error", {"message": "unlock_and_dispense requires dispenses"})
+            return
+        if not isinstance(dispenses, list) or not all(
+                isinstance(item, dict)
+                and all(isinstance(item.get(key), int) and not isinstance(item.get(key), bool)
+                        for key in ("motor_id", "segment"))
+                for item in dispenses):
+            print(f"✗ Invalid dispenses: {dispenses!r}")
+            self.send_status("error", {
+                "message": "dispenses must be a list of {motor_id, segment} integers"
+            })
+            return
+        
+        # Only the first dispense per motor can be pre-positioned
+        first_segments = {}
+        for item in dispenses:
+            first_segments.setdefault(item["motor_id"], item["segment"])
+        
+        def pre_position():
+            # Best effort: dispense_pill() reports any real failure later
+            for motor_id, segment in first_segments.items():
+                try:
+                    self.motors.pre_position(motor_id, segment)
+                except Exception as e:
+                    print(f"⚠ Pre-positioning motor {motor_id} failed: {e}")
+        
+        motor_thread = threading.Thread(target=pre_position, daemon=True)
+        motor_thread.start()
+        
+        print("Waiting for fingerprint...")
+        verify = self.fingerprint.verify_user(user_id, cancel=self._cancel)
+        motor_thread.join()
+        
+        if not verify["success"]:
+            print(f"✗ {verify['message']}")
+            self.send_status("dose_failed", {
+                "stage": "unlock",
+                "message": verify["message"],
+                "locked": True,
+                "preempted": bool(verify.get("cancelled"))
+            })
+            return
+        
+        self.device_locked = False
+        print(f"✓ Unlocked (User {verify['user_id']})")
+        self.emit_progress("fingerprint_ok", {"user_id": verify["user_id"]})
+        
+        results = []
+        try:
+            for index, item in enumerate(dispenses):
+                motor_id = item.get("motor_id")
+                segment = item.get("segment")
+                
+                # Once preempted, leave the remaining pills in the carousel
+                if self._preempted():
+                    results.append({
+                        "motor_id": motor_id,
+                        "segment": segment,
+                        "dispensed": False,
+                        "taken": False,
+                        "message": "Preempted"
+                    })
+                    continue
+                
+                step = {"index": index, "motor_id": motor_id, "segment": segment}
+                started = time.monotonic()
+                self.emit_progress("dispense_started", step)
+                result = self.motors.dispense_pill(motor_id, segment)
+                self.emit_progress("motor_done", {**step, "success": result["success"]})
+                
+                if not result["success"]:
+                    print(f"✗ Dispense failed: {result['message']}")
+                    results.append({
+                        "motor_id": motor_id,
+                        "segment": segment,
+                        "dispensed": False,
+                        "taken": False,
+                        "message": result["message"]
+                    })
+                    continue
+                
+                print(f"✓ Dispensed: Motor {motor_id}, Segment {segment}")
+                print("Waiting for hand...")
+                taken = self._wait_for_pill_taken(started, step)
+                print("✓ Pill taken" if taken else "⚠ No hand detected")
+                results.append({
+                    "motor_id": motor_id,
+                    "segment": segment,
+                    "dispensed": True,
+                    "taken": taken
+                })
+        finally:
+            self.device_locked = True
+            print("✓ Locked")
+        
+        self.send_status("dose_complete", {
+            "user_id": verify["user_id"],
+            "results": results,
+            "locked": True,
+            "preempted": self._preempted()
+        })
+    
+    def _handle_register_fingerprint(self, params: dict):
+        """
+        Handle fingerprint registration
+        
+        With {"export": true} the new template is sent along (templates)
+        so the backend can sync it to other dispensers straight away.
+        """
         print("Registering fingerprint...")
-        result = self.fingerprint.add_user()
+        result = self.fingerprint.add_user(cancel=self._cancel, on_progress=self.emit_progress)
         
         if result["success"]:
             print(f"✓ {result['message']}")
-            self.send_status("fingerprint_registered", {
-                "user_id": result["user_id"],
+            data = {"user_id": result["user_id"], "message": result["message"]}
+            if params.get("export"):
+                export = self.fingerprint.export_templates([result["user_id"]])
+                if export["success"]:
+                    data["templates"] = export["templates"]
+                else:
+                    print(f"✗ Template export failed: {export['failed']}")
+            self.send_status("fingerprint_registered", data)
+        else:
+            print(f"✗ {result['message']}")
+            self.send_status("registration_failed", {
+                "message": result["message"],
+                "preempted": bool(result.get("cancelled"))
+            })
+    
+    def _handle_register_fingerprint_session(self, params: dict):
+        """
+        Register several fingerprints in one command (a household, or
+        several fingers per patient) instead of one command per finger
+        
+        params: count, optional retries per finger (default 1) and export
+        (send the new templates along, as for register_fingerprint)
+        """
+        try:
+            count = int(params.get("count", 1))
+            retries = int(params.get("retries", 1))
+        except (TypeError, ValueError):
+            print(f"✗ Invalid count/retries: {params!r}")
+            self.send_status("registration_failed", {
+                "message": "count and retries must be integers",
+                "failed": [],
+                "preempted": False
+            })
+            return
+        print(f"Registering {count} fingerprints...")
+        result = self.fingerprint.add_users(count, cancel=self._cancel,
+                                            on_progress=self.emit_progress,
+                                            retries=retries)
+        print(f"{'✓' if result['success'] else '✗'} {result['message']}")
+        
+        if not result.get("user_ids"):
+            self.send_status("registration_failed", {
+                "message": result["message"],
+                "failed": result.get("failed", []),
+                "preempted": bool(result.get("cancelled"))
+            })
+            return
+        
+        data = {
+            "user_ids": result["user_ids"],
+            "failed": result["failed"],
+            "message": result["message"],
+            "preempted": bool(result.get("cancelled"))
+        }
+        if params.get("export"):
+            export = self.fingerprint.export_templates(result["user_ids"])
+            if export["success"]:
+                data["templates"] = export["templates"]
+            else:
+                print(f"✗ Template export failed: {export['failed']}")
+        self.send_status("fingerprints_registered", data)
+    
+    def _handle_export_fingerprints(self, params: dict):
+        """
+        Read templates off the sensor for syncing to other dispensers
+        
+        params: optional user_ids (default: every enrolled user). The
+        fingerprints_exported status carries them as a base64 template
+        store (hardware/templates.py) in templates.
+        """
+        user_ids = params.get("user_ids")
+        if user_ids is not None and (
+                not isinstance(user_ids, list)
+                or not all(isinstance(i, int) and not isinstance(i, bool) and i >= 1
+                           for i in user_ids)):
+            print(f"✗ Invalid user_ids: {user_ids!r}")
+            self.send_status("fingerprint_sync_failed", {
+                "message": "user_ids must be a list of positive integers"
+            })
+            return
+        print(f"Exporting {len(user_ids) if user_ids else 'all'} fingerprints...")
+        result = self.fingerprint.export_templates(user_ids, cancel=self._cancel)
+        
+        if result["success"]:
+            print(f"✓ {result['message']}")
+            self.send_status("fingerprints_exported", {
+                "user_ids": result["user_ids"],
+                "templates": result["templates"],
+                "failed": result["failed"],
                 "message": result["message"]
             })
         else:
             print(f"✗ {result['message']}")
-            self.send_status("registration_failed", {"message": result["message"]})
+            self.send_status("fingerprint_sync_failed", {
+                "message": result["message"],
+                "failed": result.get("failed", {}),
+                "preempted": bool(result.get("cancelled"))
+            })
+    
+    def _handle_sync_fingerprints(self, params: dict):
+        """
+        Import templates exported by another dispenser
+        
+        params: templates (base64 template store), optional overwrite to
+        replace users this sensor already has. An ID that holds a different
+        fingerprint here is a conflict: it is not imported and the status
+        has success false.
+        """
+        print("Importing fingerprints...")
+        result = self.fingerprint.import_templates(
+            params.get("templates"), overwrite=bool(params.get("overwrite")), cancel=self._cancel
+        )
+        
+        print(f"{'✓' if result['success'] else '✗'} {result['message']}")
+        if "imported" not in result:
+            self.send_status("fingerprint_sync_failed", {"message": result["message"]})
+            return
+        self.send_status("fingerprints_synced", {
+            "success": result["success"],
+            "imported": result["imported"],
+            "skipped": result["skipped"],
+            "conflicts": result["conflicts"],
+            "failed": result["failed"],
+            "message": result["message"],
+            "preempted": bool(result.get("cancelled"))
+        })
+    
+    def _wait_for_pill_taken(self, since: float, event_data: dict,
+                             timeout: Optional[float] = None) -> bool:
+        """
+        Wait for a hand at the dispenser and emit hand_detected
+        
+        Uses the background IR sampler when it is running, so a hand that
+        reached in while the motor was still turning (at or after `since`,
+        a time.monotonic() value) counts straight away.
+        
+        Args:
+            since: time.monotonic() taken before the motor started
+            event_data: Fields identifying the dispense in the progress event
+            timeout: Seconds to wait (default: client.pill_taken_timeout)
+        """
+        if timeout is None:
+            timeout = self.pill_taken_timeout
+        if self.ir_sampler.running:
+            detected_at = self.ir_sampler.wait_for_detection(since, timeout, self._cancel)
+        elif self.infrared.wait_for_hand(timeout=timeout, cancel=self._cancel):
+            detected_at = time.monotonic()
+        else:
+            detected_at = None
+        
+        if detected_at is None:
+            return False
+        
+        self.emit_progress("hand_detected", {
+            **event_data,
+            "after_ms": round((detected_at - since) * 1000)
+        })
+        return True
+    
+    def _preempted(self) -> bool:
+        """True if the running command was cancelled by a higher-priority one"""
+        return self._cancel is not None and self._cancel.is_set()
     
     def _handle_check_hand(self):
         """Check if hand is detected"""
-        detected = self.infrared.is_hand_detected()
+        detected = (self.ir_sampler.hand_present() if self.ir_sampler.running
+                    else self.infrared.is_hand_detected())
         print(f"Hand detected: {detected}")
         self.send_status("hand_check", {"detected": detected})
     
-    def send_heartbeat(self):
-        """Send periodic heartbeat with device info"""
+    def _handle_update_config(self, params: dict):
+        """
+        Apply backend-pushed settings, e.g.
+        {"settings": {"motors": {"step_delay": 0.005}}}, {"settings": ..., "replace": true}
+        or {"reset": true} to drop every override and go back to the config file
+        """
+        if params.get("reset"):
+            result = self.config.apply_overrides(None)
+        else:
+            result = self.config.apply_overrides(params.get("settings") or {},
+                                                 replace=bool(params.get("replace")))
+        print(f"✓ Config updated ({len(result['applied'])} changed, "
+              f"{len(result['rejected'])} rejected)")
+        self.send_status("config_updated", result)
+    
+    def _handle_upload_event_log(self, params: dict):
+        """
+        Upload the local event log in gzip chunks for incident analysis
+        
+        params: optional since and until (epoch seconds) and events (types).
+        Chunks go to POST /api/devices/{device_id}/events; the
+        event_log_uploaded status reports how much was sent.
+        """
+        url = f"{self.backend_url}/api/devices/{self.device_id}/events"
+        headers = {"Content-Type": EVENT_LOG_CONTENT_TYPE}
+        sent = {"chunks": 0, "records": 0, "bytes": 0}
+        
         try:
-            payload = {
-                "device_id": self.device_id,
-                "timestamp": datetime.now().isoformat(),
-                "ip_address": self.get_local_ip(),
-                "locked": self.device_locked,
-                "fingerprint_count": self.fingerprint.get_user_count()
-            }
+            for chunk, records in self.events.export_chunks(
+                    params.get("since"), params.get("until"), params.get("events")):
+                if self._preempted():
+                    break
+                response = self.http.post(url, data=chunk, headers=headers, timeout=self.http_timeout)
+                if response.status_code != 200:
+                    raise OSError(f"backend answered {response.status_code}")
+                sent["chunks"] += 1
+                sent["records"] += records
+                sent["bytes"] += len(chunk)
+        except OSError as e:
+            print(f"✗ Event log upload failed: {e}")
+            self.send_status("event_log_upload_failed", {"message": str(e), **sent})
+            return
+        
+        print(f"✓ Event log uploaded: {sent['records']} events in {sent['chunks']} chunks "
+              f"({sent['bytes'] / 1024:.1f} KiB)")
+        self.send_status("event_log_uploaded", {**sent, "preempted": self._preempted()})
+    
+    def send_heartbeat(self) -> bool:
+        """
+        Send periodic heartbeat with device info
+        
+        Returns:
+            bool: True if the backend accepted it
+        """
+        fingerprint_count = None
+        if self.fingerprint:
+            # A sensor or hardware daemon fault isn't a backend outage: the
+            # heartbeat still goes out, without the count
+            try:
+                fingerprint_count = self.fingerprint.get_user_count()
+            except Exception as e:
+                print(f"⚠ Fingerprint count unavailable: {e}")
+        
+        try:
+            timestamp = time.time()
+            ip_address = self.get_local_ip()
             
-            requests.post(
-                f"{self.backend_url}/api/devices/{self.device_id}/heartbeat",
-                json=payload,
+            response = self._post_encoded(
+                f"/api/devices/{self.device_id}/heartbeat",
+                lambda: self.encoder.heartbeat_payload(
+                    self.device_id, ip_address, self.device_locked,
+                    fingerprint_count, timestamp
+                ),
                 timeout=5
             )
+            self.connectivity.report_success()
+            error = None if response.status_code == 200 else f"backend answered {response.status_code}"
         
-        except:
-            pass  # Heartbeat failures are non-critical
+        except OSError as e:
+            error = str(e)
+            self.connectivity.report_failure()
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        
+        if error:
+            self.heartbeat_failures += 1
+            print(f"✗ Heartbeat failed ({self.heartbeat_failures} in a row): {error}")
+            return False
+        self.heartbeat_failures = 0
+        return True
+    
+    def _on_connectivity_change(self, online: bool, offline_s: Optional[float]):
+        """
+        Connectivity monitor callback: an outage started or ended
+        
+        On recovery the poll loop wakes at once, the heartbeat goes out
+        and the uploader sends everything queued during the outage,
+        followed by a connectivity_restored status with the outage length.
+        """
+        if not online:
+            self.events.log("connectivity_lost")
+            return
+        
+        data = {
+            "offline_s": round(offline_s, 1),
+            "since": self.connectivity.offline_since,
+            "link_down": self.connectivity.link_down,
+            "missed_heartbeats": self.missed_heartbeats,
+            "queued": self.uploader.pending,
+        }
+        self.missed_heartbeats = 0
+        self.events.log("connectivity_restored", data)
+        self.uploader.submit("connectivity_restored", data)
+        self.uploader.wake()
+        self._next_heartbeat = 0
+        self._wakeup.set()
     
     def start(self):
         """Start polling loop"""
@@ -241,27 +971,34 @@ class PollingClient:
         print(f"Poll Interval: {self.poll_interval}s")
         print(f"{'='*50}\n")
         
-        # Send initial heartbeat
-        self.send_heartbeat()
-        
-        heartbeat_counter = 0
+        self.ir_sampler.start()
+        self.scheduler.start()
+        self.config.watch()
         
         try:
             while self.running:
-                # Poll for commands
-                command = self.poll_for_commands()
-                
-                if command:
-                    self.execute_command(command)
+                with self.profiler.section("poll"):
+                    if self.connectivity.online:
+                        # Poll for commands; they run on the scheduler so a
+                        # lock arriving mid-dispense is picked up on the
+                        # next poll
+                        command = self.poll_for_commands()
+                        
+                        if command:
+                            self.scheduler.submit(command)
+                    
+                    # Send heartbeat every heartbeat_interval (default 60s),
+                    # and straight away at startup and after an outage
+                    if time.monotonic() >= self._next_heartbeat:
+                        if self.connectivity.online:
+                            self.send_heartbeat()
+                        else:
+                            self.missed_heartbeats += 1
+                        self._next_heartbeat = time.monotonic() + self.heartbeat_interval
                 
-                # Send heartbeat every 60 seconds
-                heartbeat_counter += 1
-                if heartbeat_counter >= (60 / self.poll_interval):
-                    self.send_heartbeat()
-                    heartbeat_counter = 0
-                
-                # Wait before next poll
-                time.sleep(self.poll_interval)
+                # Wait before next poll (cut short when the connection is back)
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
         
         except KeyboardInterrupt:
             print("\n\nShutting down...")
@@ -270,23 +1007,96 @@ class PollingClient:
     def stop(self):
         """Stop polling and cleanup"""
         self.running = False
-        self.fingerprint.cleanup()
+        self._wakeup.set()
+        self.config.stop()
+        self.scheduler.stop()
+        self.uploader.stop()
+        if self._owns_connectivity:
+            self.connectivity.stop()
+        self.ir_sampler.stop()
+        self.profiler.stop()
+        self.events.close()
+        if self.fingerprint:
+            self.fingerprint.cleanup()
         self.infrared.cleanup()
-        self.motors.release_all()
+        self.motors.cleanup()
         print("✓ Cleanup complete")
 
 
 if __name__ == "__main__":
-    import sys
+    import argparse
+    from wire_encoding import parse_wire_format
+    
+    parser = argparse.ArgumentParser(
+        description="RITA pill dispenser polling client",
+        epilog="Example: python3 polling_client.py https://your-app.com pi-001 5"
+    )
+    parser.add_argument("backend_url", nargs="?",
+                        help="Hosted backend URL (or backend_url in --config)")
+    parser.add_argument("device_id", nargs="?",
+                        help="Unique device identifier, e.g. pi-001 (or device_id in --config)")
+    parser.add_argument("poll_interval", nargs="?", type=float,
+                        help="Seconds between polls (default: 5)")
+    parser.add_argument("--config", metavar="PATH",
+                        help="JSON settings file, watched and applied live (see config.py)")
+    parser.add_argument("--wire-format",
+                        help="Upload encoding: json, msgpack or cbor, optionally "
+                             "with +gzip or +zstd (default: json)")
+    parser.add_argument("--hardware-socket",
+                        help="Use the hardware daemon on this Unix socket instead "
+                             "of driving the hardware in this process")
+    parser.add_argument("--record-trace", metavar="PATH",
+                        help="Record hardware I/O to a trace file for replay "
+                             "(python3 -m hardware.trace replay PATH)")
+    parser.add_argument("--profile", nargs="?", type=float, const=0, metavar="SECONDS",
+                        help="Sample stacks of command execution and the poll loop, "
+                             "optionally only for SECONDS (SIGUSR1 toggles, SIGUSR2 "
+                             "writes a tracemalloc snapshot)")
+    parser.add_argument("--profile-dir", default="profiles",
+                        help="Directory for profiles (default: profiles)")
+    parser.add_argument("--event-dir", default="events",
+                        help="Directory of the local event log (default: events/<device_id>)")
+    parser.add_argument("--lean", action="store_true",
+                        help="Memory-lean mode for Pi Zero class devices: "
+                             "standard-library HTTP client instead of requests")
+    args = parser.parse_args()
+    
+    # Command-line values win over the file's startup settings
+    base = {"client.poll_interval": args.poll_interval} if args.poll_interval else {}
+    config = RuntimeConfig(args.config, base=base)
+    startup = config.startup
+    backend_url = args.backend_url or startup.get("backend_url")
+    device_id = args.device_id or startup.get("device_id")
+    hardware_socket = args.hardware_socket or startup.get("hardware_socket")
+    if not backend_url or not device_id:
+        parser.error("backend_url and device_id are required (as arguments or in --config)")
+    
+    try:
+        wire_format, compression = parse_wire_format(
+            args.wire_format or startup.get("wire_format") or "json"
+        )
+    except ValueError as e:
+        parser.error(str(e))
     
-    if len(sys.argv) < 3:
-        print("Usage: python3 polling_client.py <backend_url> <device_id> [poll_interval]")
-        print("Example: python3 polling_client.py https://your-app.com pi-001 5")
-        sys.exit(1)
+    recorder = None
+    if args.record_trace:
+        if hardware_socket:
+            parser.error("--record-trace records local hardware; pass it to the hardware daemon instead")
+        from hardware import trace
+        recorder = trace.record(args.record_trace)
     
-    backend_url = sys.argv[1]
-    device_id = sys.argv[2]
-    poll_interval = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    profiler = Profiler(args.profile_dir, duration=args.profile)
+    profiler.install_signal_handlers()
+    if args.profile is not None:
+        profiler.start()
     
-    client = PollingClient(backend_url, device_id, poll_interval)
-    client.start()
+    client = PollingClient(backend_url, device_id,
+                           wire_format=wire_format, compression=compression,
+                           hardware_socket=hardware_socket, profiler=profiler,
+                           lean=args.lean or bool(startup.get("lean")), config=config,
+                           events=EventLog(os.path.join(args.event_dir, device_id)))
+    try:
+        client.start()
+    finally:
+        if recorder:
+            recorder.close()
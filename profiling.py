@@ -0,0 +1,250 @@
+"""
+Sampling Profiler for the polling client
+Samples the stacks of threads inside profiled sections (command execution,
+the poll loop) from a background thread and writes them as collapsed-stack
+files, one line per stack:
+
+    command:dispense;_bootstrap (threading.py);...;onestep (stepper.py) 42
+
+Feed a file to flamegraph.pl or speedscope to see whether the time goes to
+HTTP, JSON, UART spinning or motor sleeps. Memory is inspected on demand
+with tracemalloc snapshots.
+
+Retention is bounded (stacks kept in memory per file, number of files on
+disk, optional time window) so profiling can stay on in production for a
+while. Enable with `polling_client.py --profile`, or at runtime:
+
+    kill -USR1 <pid>    start/stop stack sampling
+    kill -USR2 <pid>    write a tracemalloc snapshot (the first one starts tracing)
+"""
+
+import contextlib
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+
+class Profiler:
+    """Samples stacks of threads inside section() blocks while running"""
+
+    # Distinct stacks kept per file; further new stacks are counted together
+    MAX_STACKS = 5000
+    OVERFLOW_STACK = "[other stacks]"
+    # Top allocation sites written per tracemalloc snapshot
+    TOP_ALLOCATIONS = 30
+    TRACEMALLOC_FRAMES = 10
+
+    def __init__(self, output_dir: str = "profiles", interval: float = 0.01,
+                 flush_interval: float = 60, max_files: int = 30,
+                 duration: Optional[float] = None):
+        """
+        Initialize profiler (idle until start())
+
+        Args:
+            output_dir: Directory for .folded and tracemalloc files
+            interval: Seconds between stack samples (default: 0.01 = 100 Hz)
+            flush_interval: Seconds of samples per .folded file (default: 60)
+            max_files: Files of each kind kept; the oldest are deleted
+            duration: Stop sampling automatically after this many seconds
+                      (None or 0: until stop() / SIGUSR1)
+        """
+        self.output_dir = output_dir
+        self.interval = interval
+        self.flush_interval = flush_interval
+        self.max_files = max_files
+        self.duration = duration or None
+        self.running = False
+        self.samples = 0
+
+        # thread ident -> label of the section it is in
+        self._active = {}
+        self._counts = Counter()
+        self._counts_lock = threading.Lock()
+        self._frame_names = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+        self._tracing = False
+        self._last_snapshot = None
+
+    @contextlib.contextmanager
+    def section(self, label: str):
+        """Mark the current thread as profiled while the block runs"""
+        if not self.running:
+            yield
+            return
+
+        ident = threading.get_ident()
+        previous = self._active.get(ident)
+        self._active[ident] = label
+        try:
+            yield
+        finally:
+            if previous is None:
+                self._active.pop(ident, None)
+            else:
+                self._active[ident] = previous
+
+    def start(self):
+        """Start sampling"""
+        with self._lock:
+            if self.running:
+                return
+            self.running = True
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+            self._thread.start()
+        window = f" for {self.duration:g}s" if self.duration else ""
+        print(f"✓ Profiling{window}, writing to {self.output_dir}/")
+
+    def stop(self):
+        """Stop sampling, write what was collected and stop tracemalloc if we started it"""
+        with self._lock:
+            if not self.running:
+                thread = None
+            else:
+                self.running = False
+                self._stop.set()
+                thread = self._thread
+        if thread and thread is not threading.current_thread():
+            thread.join()
+        self._active.clear()
+        path = self.flush()
+        if path:
+            print(f"✓ Profile written: {path} ({self.samples} samples)")
+
+        if self._tracing:
+            import tracemalloc
+
+            tracemalloc.stop()
+            self._tracing = False
+            self._last_snapshot = None
+
+    def toggle(self):
+        """Start sampling if stopped, stop it if running (SIGUSR1)"""
+        if self.running:
+            self.stop()
+        else:
+            self.start()
+
+    def install_signal_handlers(self):
+        """SIGUSR1 toggles sampling, SIGUSR2 writes a tracemalloc snapshot"""
+        signal.signal(signal.SIGUSR1, lambda *_: self.toggle())
+        signal.signal(signal.SIGUSR2, lambda *_: self.snapshot_memory())
+
+    def _run(self):
+        started = time.monotonic()
+        next_flush = started + self.flush_interval
+
+        while not self._stop.wait(self.interval):
+            self._sample()
+            now = time.monotonic()
+            if now >= next_flush:
+                self.flush()
+                next_flush = now + self.flush_interval
+            if self.duration and now - started >= self.duration:
+                print("✓ Profiling window over")
+                threading.Thread(target=self.stop, daemon=True).start()
+                return
+
+    def _sample(self):
+        frames = sys._current_frames()
+        with self._counts_lock:
+            for ident, label in list(self._active.items()):
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+
+                names = []
+                while frame is not None:
+                    names.append(self._frame_name(frame.f_code))
+                    frame = frame.f_back
+                names.append(label)
+                stack = ";".join(reversed(names))
+
+                if stack in self._counts or len(self._counts) < self.MAX_STACKS:
+                    self._counts[stack] += 1
+                else:
+                    self._counts[self.OVERFLOW_STACK] += 1
+            self.samples += 1
+
+    def _frame_name(self, code):
+        name = self._frame_names.get(code)
+        if name is None:
+            # ';' separates frames in the collapsed format
+            filename = os.path.basename(code.co_filename).replace(";", "_")
+            name = self._frame_names[code] = f"{code.co_name} ({filename})"
+        return name
+
+    def flush(self) -> Optional[str]:
+        """Write the samples collected since the last flush; returns the file path"""
+        with self._counts_lock:
+            counts, self._counts = self._counts, Counter()
+        if not counts:
+            return None
+
+        path = self._new_file("stacks", "folded")
+        with open(path, "w") as f:
+            for stack, count in counts.most_common():
+                f.write(f"{stack} {count}\n")
+        self._prune("stacks")
+        return path
+
+    def snapshot_memory(self) -> Optional[str]:
+        """
+        Write the top allocation sites, and growth since the previous snapshot
+
+        The first call only starts tracemalloc (it slows every allocation
+        down, so it is off until asked for); stop() turns it off again.
+        Returns the file path, or None when tracing was just started.
+        """
+        import tracemalloc
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.TRACEMALLOC_FRAMES)
+            self._tracing = True
+            self._last_snapshot = tracemalloc.take_snapshot()
+            print("✓ tracemalloc started; the next snapshot shows growth since now")
+            return None
+
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        current, peak = tracemalloc.get_traced_memory()
+
+        path = self._new_file("memory", "txt")
+        with open(path, "w") as f:
+            f.write(f"traced: {current / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB\n")
+            f.write(f"\nTop {self.TOP_ALLOCATIONS} allocation sites:\n")
+            for stat in snapshot.statistics("lineno")[:self.TOP_ALLOCATIONS]:
+                f.write(f"  {stat}\n")
+            if self._last_snapshot is not None:
+                f.write("\nGrowth since previous snapshot:\n")
+                for stat in snapshot.compare_to(self._last_snapshot, "lineno")[:self.TOP_ALLOCATIONS]:
+                    f.write(f"  {stat}\n")
+        self._last_snapshot = snapshot
+        self._prune("memory")
+        print(f"✓ Memory snapshot written: {path}")
+        return path
+
+    def _new_file(self, prefix, extension):
+        os.makedirs(self.output_dir, exist_ok=True)
+        now = time.time()
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(now))
+        return os.path.join(self.output_dir, f"{prefix}-{stamp}-{int(now % 1 * 1000):03d}.{extension}")
+
+    def _prune(self, prefix):
+        """Keep only the newest max_files files of one kind"""
+        names = sorted(name for name in os.listdir(self.output_dir)
+                       if name.startswith(prefix + "-"))
+        for name in names[:-self.max_files]:
+            try:
+                os.remove(os.path.join(self.output_dir, name))
+            except OSError:
+                pass
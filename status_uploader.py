@@ -0,0 +1,161 @@
+"""
+Status Uploader for progress events
+Sends intermediate status events from a background thread so emitting
+them never blocks the hardware path
+"""
+
+import queue
+import threading
+import time
+
+# Queued by wake() to end a retry wait early
+_WAKE = object()
+
+
+class StatusUploader:
+    """Queues (status_type, data, timestamp) events and uploads them in batches"""
+
+    # Events sent per request at most
+    MAX_BATCH = 50
+    # Events kept while the backend is unreachable; the oldest are dropped
+    MAX_BACKLOG = 500
+    # Seconds between retries after a failed upload
+    RETRY_DELAY = 2
+
+    def __init__(self, send_batch, name: str = "status-uploader", connectivity=None):
+        """
+        Initialize uploader
+
+        Args:
+            send_batch: Called with a list of (status_type, data, timestamp)
+                        tuples, returns True if the backend accepted them
+                        (PollingClient.send_status_batch)
+            name: Worker thread name
+            connectivity: ConnectivityMonitor; while it is offline events
+                          are only queued, and wake() sends them at once
+        """
+        self.send_batch = send_batch
+        self.name = name
+        self.connectivity = connectivity
+        self.running = False
+        self.dropped = 0
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        # Events submitted but not yet uploaded or dropped
+        self._outstanding = 0
+        self._idle = threading.Condition()
+
+    def submit(self, status_type: str, data: dict, timestamp: float = None):
+        """Queue an event and return immediately (starts the worker on first use)"""
+        if timestamp is None:
+            timestamp = time.time()
+        with self._idle:
+            self._outstanding += 1
+        self._queue.put((status_type, data, timestamp))
+
+        if not self.running:
+            self.start()
+
+    def start(self):
+        """Start the upload thread"""
+        with self._lock:
+            if self.running:
+                return
+            self.running = True
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        """Retry queued events now (the connection is back)"""
+        if self.running:
+            self._queue.put(_WAKE)
+
+    @property
+    def pending(self) -> int:
+        """Events submitted but not yet uploaded or dropped"""
+        return self._outstanding
+
+    def _online(self):
+        return self.connectivity is None or self.connectivity.online
+
+    def flush(self, timeout: float = 2) -> bool:
+        """
+        Wait until every submitted event is uploaded (or dropped)
+
+        Used before a command's final status so the backend receives its
+        progress events first. Returns False if the timeout ran out.
+        """
+        with self._idle:
+            return self._idle.wait_for(lambda: self._outstanding == 0, timeout)
+
+    def _done(self, count):
+        with self._idle:
+            self._outstanding -= count
+            if self._outstanding <= 0:
+                self._idle.notify_all()
+
+    def stop(self, timeout: float = 5):
+        """Upload what is still queued (best effort) and stop"""
+        with self._lock:
+            if not self.running:
+                return
+            self.running = False
+        self._queue.put(None)
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _run(self):
+        pending = []
+        stopping = False
+
+        while not stopping or pending:
+            if not pending:
+                item = self._queue.get()
+                if item is None:
+                    return
+                if item is _WAKE:
+                    continue
+                pending.append(item)
+
+            # Whatever else is already queued goes in the same request
+            while len(pending) < self.MAX_BATCH:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                if item is not _WAKE:
+                    pending.append(item)
+
+            # After an outage the backlog goes out in back-to-back batches
+            batch = pending[:self.MAX_BATCH]
+            if self._online() and self.send_batch(batch):
+                del pending[:len(batch)]
+                self._done(len(batch))
+                continue
+
+            if stopping:
+                self._done(len(pending))
+                return
+
+            if len(pending) > self.MAX_BACKLOG:
+                overflow = len(pending) - self.MAX_BACKLOG
+                del pending[:overflow]
+                self.dropped += overflow
+                self._done(overflow)
+                print(f"⚠ Status backlog full, dropped {overflow} events")
+
+            # Back off (offline: until wake()), but keep collecting events
+            # while waiting
+            try:
+                item = self._queue.get(timeout=self.RETRY_DELAY if self._online() else None)
+                if item is None:
+                    stopping = True
+                elif item is not _WAKE:
+                    pending.append(item)
+            except queue.Empty:
+                pass
@@ -0,0 +1,158 @@
+"""
+Reference backend throughput benchmark
+
+Starts backend.server in-process on a temporary SQLite file, then drives it
+with keep-alive HTTP clients on several threads:
+
+    idle poll   - conditional GET /commands answered with 304
+    status      - POST /status (JSON)
+    command     - POST /commands followed by the GET that delivers it
+
+Also reports raw DeviceStore operations per second without HTTP.
+
+Usage: python3 tests/backend_throughput_benchmark.py [seconds_per_test] [threads]
+"""
+
+import http.client
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from backend.server import BackendServer  # noqa: E402
+from backend.store import DeviceStore  # noqa: E402
+
+DEVICES_PER_THREAD = 50
+
+
+def run_threads(threads, seconds, work):
+    """Run work(thread_index, stop_time) on each thread; return total ops"""
+    counts = [0] * threads
+    stop_at = time.perf_counter() + seconds
+
+    def runner(i):
+        counts[i] = work(i, stop_at)
+
+    workers = [threading.Thread(target=runner, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return sum(counts)
+
+
+def bench_http(port, threads, seconds):
+    results = {}
+
+    def idle_poll(i, stop_at):
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        etags = {}
+        ops = 0
+        while time.perf_counter() < stop_at:
+            device_id = f"bench-{i}-{ops % DEVICES_PER_THREAD}"
+            headers = {"If-None-Match": etags[device_id]} if device_id in etags else {}
+            conn.request("GET", f"/api/devices/{device_id}/commands", headers=headers)
+            response = conn.getresponse()
+            response.read()
+            etags[device_id] = response.getheader("ETag")
+            ops += 1
+        conn.close()
+        return ops
+
+    def status(i, stop_at):
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        body = json.dumps({
+            "device_id": f"bench-{i}",
+            "status_type": "pill_taken",
+            "timestamp": "2025-12-30T14:30:00",
+            "data": {"motor_id": 1, "segment": 5, "taken": True}
+        })
+        ops = 0
+        while time.perf_counter() < stop_at:
+            conn.request("POST", f"/api/devices/bench-{i}-{ops % DEVICES_PER_THREAD}/status",
+                         body, {"Content-Type": "application/json"})
+            conn.getresponse().read()
+            ops += 1
+        conn.close()
+        return ops
+
+    def command_roundtrip(i, stop_at):
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        body = json.dumps({"command": "dispense", "params": {"motor_id": 1, "segment": 5}})
+        ops = 0
+        while time.perf_counter() < stop_at:
+            device_id = f"bench-{i}-{ops % DEVICES_PER_THREAD}"
+            conn.request("POST", f"/api/devices/{device_id}/commands", body,
+                         {"Content-Type": "application/json"})
+            conn.getresponse().read()
+            conn.request("GET", f"/api/devices/{device_id}/commands")
+            conn.getresponse().read()
+            ops += 1
+        conn.close()
+        return ops
+
+    for name, work in (("idle poll (304)", idle_poll), ("status post", status),
+                       ("command enqueue+deliver", command_roundtrip)):
+        ops = run_threads(threads, seconds, work)
+        results[name] = ops / seconds
+    return results
+
+
+def bench_store(store, seconds):
+    results = {}
+
+    start = time.perf_counter()
+    ops = 0
+    while time.perf_counter() - start < seconds:
+        store.pop_command(f"store-{ops % 1000}")
+        ops += 1
+    results["pop (empty queue)"] = ops / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    ops = 0
+    while time.perf_counter() - start < seconds:
+        store.add_status(f"store-{ops % 1000}", "hand_check", None, {"detected": False})
+        ops += 1
+    store.flush(timeout=60)
+    results["add_status (incl. flush)"] = ops / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    ops = 0
+    while time.perf_counter() - start < seconds:
+        device_id = f"store-{ops % 1000}"
+        store.enqueue_command(device_id, "check_hand")
+        store.pop_command(device_id)
+        ops += 1
+    results["enqueue+pop (durable)"] = ops / (time.perf_counter() - start)
+    return results
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = DeviceStore(os.path.join(tmp, "bench.db"))
+
+        print(f"DeviceStore (no HTTP), {seconds:.0f}s each:")
+        for name, rate in bench_store(store, seconds).items():
+            print(f"  {name:<28} {rate:>10.0f} ops/s")
+
+        server = BackendServer(("127.0.0.1", 0), store)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        print(f"\nHTTP, {threads} keep-alive clients, {seconds:.0f}s each:")
+        for name, rate in bench_http(server.server_address[1], threads, seconds).items():
+            print(f"  {name:<28} {rate:>10.0f} req/s")
+
+        server.shutdown()
+        server.server_close()
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Fingerprint verification benchmark: 1:N match vs 1:1 compare
+
+Runs FingerprintSensor against the simulated module from hardware/simulated.py
+with a growing template library and reports the time per verification for
+each mode.
+
+Usage: python3 tests/fingerprint_match_benchmark.py [iterations]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from hardware import simulated
+
+simulated.install()
+
+from hardware.fingerprint_sensor import FingerprintSensor  # noqa: E402
+
+LIBRARY_SIZES = [1, 10, 100, 500, 1000]
+
+
+def time_verify(sensor, iterations, user_id=None):
+    """Average seconds per verify_user call"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        result = sensor.verify_user(user_id)
+        if not result["success"]:
+            raise RuntimeError(result["message"])
+    return (time.perf_counter() - start) / iterations
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    sensor = FingerprintSensor()
+    sensor.audio_player = simulated.SimulatedAudioPlayer()
+    module = sensor.ser
+
+    print(f"{'templates':>10} {'1:N (ms)':>10} {'1:1 (ms)':>10} {'speedup':>8}")
+    for size in LIBRARY_SIZES:
+        module.templates.clear()
+        module.permissions.clear()
+        module.fill_library(size)
+
+        # Worst case for the search: the last enrolled user
+        target = size
+        module.present_finger(f"finger-{target}")
+
+        one_to_n = time_verify(sensor, iterations)
+        one_to_one = time_verify(sensor, iterations, user_id=target)
+
+        print(f"{size:>10} {one_to_n * 1000:>10.1f} {one_to_one * 1000:>10.1f} "
+              f"{one_to_n / one_to_one:>7.2f}x")
+
+    sensor.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,414 @@
+"""
+On-device hardware microbenchmark
+
+Measures each component in isolation and writes a JSON report that can be
+compared across units (or against an earlier run of the same unit):
+
+    uart    - round-trip time per fingerprint command that needs no finger
+    motors  - highest step rate each motor holds its timing at, per style
+    ir      - GPIO read cost, sampler period jitter and detection latency
+              (measured with injected edges when simulated, bounded on hardware)
+    audio   - time until aplay is running, and its start/stop overhead
+
+A step rate counts as reliable while the p95 step interval stays within
+RELIABLE_TOLERANCE of the commanded interval. Missed steps can't be seen
+without position feedback: the benchmark turns each motor back by the
+same number of steps, so a stalling motor shows as a carousel that doesn't
+return to its mark.
+
+Usage:
+    python3 tests/hardware_benchmark.py [--simulate] [--json] [--output report.json]
+                                        [--baseline old.json] [--only uart,motors,ir,audio]
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import wave
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+SECTIONS = ("uart", "motors", "ir", "audio")
+
+# Commands that the module answers without a finger on the sensor
+UART_COMMANDS = {
+    "user_count": [0x09, 0, 0, 0, 0],
+    "compare_level_query": [0x28, 0, 0, 1, 0],
+}
+
+# Commanded delays between steps, slowest first (seconds)
+STEP_DELAYS = [0.01, 0.005, 0.003, 0.002, 0.0015, 0.001, 0.0005, 0.0]
+RELIABLE_TOLERANCE = 0.2
+
+# A metric more than this much worse than the baseline is flagged
+REGRESSION_THRESHOLD = 0.25
+
+
+def _stats(samples_ms):
+    """Summary of a list of millisecond samples"""
+    if not samples_ms:
+        return None
+    ordered = sorted(samples_ms)
+    return {
+        "n": len(ordered),
+        "min_ms": round(ordered[0], 3),
+        "mean_ms": round(statistics.fmean(ordered), 3),
+        "p50_ms": round(ordered[len(ordered) // 2], 3),
+        "p95_ms": round(ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)], 3),
+        "max_ms": round(ordered[-1], 3),
+        "jitter_ms": round(statistics.pstdev(ordered), 3),
+    }
+
+
+# -- UART --------------------------------------------------------------------
+
+def bench_uart(args):
+    from hardware.fingerprint_sensor import ACK_SUCCESS, FingerprintSensor
+
+    sensor = FingerprintSensor(args.fingerprint_port)
+    # 8-byte command + 8-byte reply, 10 bits per byte on the wire
+    wire_ms = 16 * 10 / sensor.ser.baudrate * 1000 if hasattr(sensor.ser, "baudrate") else None
+
+    results = {}
+    for name, command in UART_COMMANDS.items():
+        samples, failures = [], 0
+        for _ in range(args.iterations):
+            start = time.perf_counter()
+            r = sensor._tx_and_rx_cmd(list(command), 8, 1)
+            elapsed = (time.perf_counter() - start) * 1000
+            if r == ACK_SUCCESS:
+                samples.append(elapsed)
+            else:
+                failures += 1
+        results[name] = {"rtt": _stats(samples), "failures": failures}
+
+    sensor.cleanup()
+    return {"wire_time_ms": round(wire_ms, 3) if wire_ms else None, "commands": results}
+
+
+# -- motors ------------------------------------------------------------------
+
+def _step_trial(motor, steps, delay, direction, style):
+    """Step `steps` times; returns (achieved intervals ms, onestep call times ms)"""
+    intervals, calls = [], []
+    last = time.perf_counter()
+    for _ in range(steps):
+        start = time.perf_counter()
+        motor.onestep(direction=direction, style=style)
+        calls.append((time.perf_counter() - start) * 1000)
+        if delay:
+            time.sleep(delay)
+        now = time.perf_counter()
+        intervals.append((now - last) * 1000)
+        last = now
+    return intervals, calls
+
+
+def bench_motors(args):
+    from hardware.stepper_motor import StepperMotorController, stepper
+
+    controller = StepperMotorController(args.motor_address)
+    styles = {"single": stepper.SINGLE, "double": stepper.DOUBLE,
+              "interleave": stepper.INTERLEAVE, "microstep": stepper.MICROSTEP}
+
+    results = {}
+    for motor_id, motor in controller.motors.items():
+        if args.motors and motor_id not in args.motors:
+            continue
+        per_style = {}
+        for style_name, style in styles.items():
+            ladder = []
+            reliable = None
+            for delay in STEP_DELAYS:
+                intervals, calls = _step_trial(motor, args.steps, delay, stepper.FORWARD, style)
+                # Same distance back so the carousel ends where it started
+                _step_trial(motor, args.steps, delay, stepper.BACKWARD, style)
+                motor.release()
+
+                interval = _stats(intervals)
+                commanded_ms = delay * 1000 + statistics.fmean(calls)
+                ok = interval["p95_ms"] <= commanded_ms * (1 + RELIABLE_TOLERANCE)
+                rate = 1000 / interval["mean_ms"]
+                ladder.append({
+                    "delay_ms": delay * 1000,
+                    "steps_per_s": round(rate, 1),
+                    "interval": interval,
+                    "reliable": ok,
+                })
+                if ok:
+                    reliable = max(reliable or 0, rate)
+            per_style[style_name] = {
+                "max_reliable_steps_per_s": round(reliable, 1) if reliable else None,
+                "onestep_ms": _stats(calls),
+                "ladder": ladder,
+            }
+        results[str(motor_id)] = per_style
+
+    controller.cleanup()
+    return {"steps_per_trial": args.steps, "motors": results}
+
+
+# -- IR ----------------------------------------------------------------------
+
+def bench_ir(args, gpio=None):
+    from hardware.infrared_sensor import InfraredSensor
+    from hardware.ir_sampler import IRSampler
+
+    sensor = InfraredSensor(args.ir_pin)
+
+    reads = []
+    for _ in range(args.iterations * 50):
+        start = time.perf_counter()
+        sensor.is_hand_detected()
+        reads.append((time.perf_counter() - start) * 1000)
+
+    sampler = IRSampler(sensor, rate_hz=args.ir_rate)
+    periods = []
+    original_sample = sampler._sample
+    last = [None]
+
+    def timed_sample(now, raw):
+        if last[0] is not None:
+            periods.append((now - last[0]) * 1000)
+        last[0] = now
+        original_sample(now, raw)
+
+    sampler._sample = timed_sample
+    sampler.start()
+
+    latencies = []
+    if gpio is not None:
+        # Simulated: drive edges and time how long the filtered state takes
+        for _ in range(args.iterations):
+            time.sleep(0.05)
+            edge = time.monotonic()
+            gpio.set_input(args.ir_pin, gpio.LOW)
+            detected = sampler.wait_for_detection(edge, timeout=1)
+            if detected is not None:
+                latencies.append((detected - edge) * 1000)
+            gpio.set_input(args.ir_pin, gpio.HIGH)
+            time.sleep(0.05)
+    else:
+        time.sleep(max(1.0, args.iterations * 0.1))
+
+    sampler.stop()
+    sensor.cleanup()
+
+    period = _stats(periods)
+    # Worst case without a stimulus: the filter needs on_count samples
+    bound_ms = (period["p95_ms"] * sampler.on_count + statistics.fmean(reads)) if period else None
+    return {
+        "gpio_read": _stats(reads),
+        "sample_rate_hz": args.ir_rate,
+        "sample_period": period,
+        "filter_window": sampler.window,
+        "detection_latency": _stats(latencies),
+        "detection_latency_bound_ms": round(bound_ms, 3) if bound_ms else None,
+    }
+
+
+# -- audio -------------------------------------------------------------------
+
+def bench_audio(args, simulated_player=None):
+    from hardware.audio_alerts import AudioPlayer
+
+    player = simulated_player or AudioPlayer()
+
+    calls = []
+    for _ in range(args.iterations):
+        start = time.perf_counter()
+        player.play_sound("success")
+        calls.append((time.perf_counter() - start) * 1000)
+
+    result = {"play_call": _stats(calls), "aplay_overhead": None, "clip_ms": None}
+    aplay = shutil.which("aplay")
+    sound = getattr(player, "success_sound", None)
+    if simulated_player or not aplay or not sound or not os.path.exists(sound):
+        return result
+
+    with wave.open(sound) as clip:
+        clip_ms = clip.getnframes() / clip.getframerate() * 1000
+
+    # Start/stop overhead: wall time of a full play minus the clip length
+    overheads = []
+    for _ in range(args.iterations):
+        start = time.perf_counter()
+        subprocess.run([aplay, "-q", "-D", "plughw:CARD=Headphones,DEV=0", sound],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        overheads.append((time.perf_counter() - start) * 1000 - clip_ms)
+
+    result["clip_ms"] = round(clip_ms, 1)
+    result["aplay_overhead"] = _stats(overheads)
+    return result
+
+
+# -- report ------------------------------------------------------------------
+
+def _metrics(report):
+    """Headline numbers used for baseline comparison: name -> (value, higher_is_better)"""
+    metrics = {}
+    uart = report.get("uart") or {}
+    for name, result in (uart.get("commands") or {}).items():
+        if result["rtt"]:
+            metrics[f"uart.{name}.mean_ms"] = (result["rtt"]["mean_ms"], False)
+    for motor_id, styles in ((report.get("motors") or {}).get("motors") or {}).items():
+        for style, result in styles.items():
+            if result["max_reliable_steps_per_s"]:
+                metrics[f"motors.{motor_id}.{style}.max_reliable_steps_per_s"] = (
+                    result["max_reliable_steps_per_s"], True
+                )
+    ir = report.get("ir") or {}
+    if ir.get("sample_period"):
+        metrics["ir.sample_period.p95_ms"] = (ir["sample_period"]["p95_ms"], False)
+    if ir.get("detection_latency"):
+        metrics["ir.detection_latency.p95_ms"] = (ir["detection_latency"]["p95_ms"], False)
+    audio = report.get("audio") or {}
+    if audio.get("aplay_overhead"):
+        metrics["audio.aplay_overhead.mean_ms"] = (audio["aplay_overhead"]["mean_ms"], False)
+    return metrics
+
+
+def compare(report, baseline):
+    """Metrics more than REGRESSION_THRESHOLD worse than the baseline"""
+    current = _metrics(report)
+    regressions = []
+    for name, (old, higher_is_better) in _metrics(baseline).items():
+        if name not in current or not old:
+            continue
+        new = current[name][0]
+        change = (old - new) / old if higher_is_better else (new - old) / old
+        if change > REGRESSION_THRESHOLD:
+            regressions.append({"metric": name, "baseline": old, "current": new,
+                                "worse_by": f"{change:.0%}"})
+    return regressions
+
+
+def print_report(report):
+    print(f"Hardware benchmark: {report['unit']} "
+          f"({'simulated' if report['simulated'] else 'hardware'})")
+
+    uart = report.get("uart")
+    if uart:
+        print(f"\nUART (wire time {uart['wire_time_ms']} ms per command + reply)")
+        for name, result in uart["commands"].items():
+            rtt = result["rtt"]
+            if rtt:
+                print(f"  {name:<22} mean {rtt['mean_ms']:>7.2f} ms  p95 {rtt['p95_ms']:>7.2f} ms"
+                      f"  failures {result['failures']}")
+            else:
+                print(f"  {name:<22} ✗ no replies ({result['failures']} failures)")
+
+    motors = report.get("motors")
+    if motors:
+        print(f"\nMotors (max reliable steps/s, {motors['steps_per_trial']} steps per trial)")
+        for motor_id, styles in motors["motors"].items():
+            rates = "  ".join(f"{style} {r['max_reliable_steps_per_s']}"
+                              for style, r in styles.items())
+            print(f"  motor {motor_id}: {rates}")
+
+    ir = report.get("ir")
+    if ir:
+        print(f"\nIR (sampling at {ir['sample_rate_hz']} Hz)")
+        print(f"  gpio read            mean {ir['gpio_read']['mean_ms']:.4f} ms")
+        if ir["sample_period"]:
+            p = ir["sample_period"]
+            print(f"  sample period        mean {p['mean_ms']:.3f} ms  p95 {p['p95_ms']:.3f} ms"
+                  f"  jitter {p['jitter_ms']:.3f} ms")
+        if ir["detection_latency"]:
+            d = ir["detection_latency"]
+            print(f"  detection latency    mean {d['mean_ms']:.2f} ms  p95 {d['p95_ms']:.2f} ms")
+        print(f"  latency bound        {ir['detection_latency_bound_ms']} ms")
+
+    audio = report.get("audio")
+    if audio:
+        print("\nAudio")
+        print(f"  play_sound() returns mean {audio['play_call']['mean_ms']:.2f} ms")
+        if audio["aplay_overhead"]:
+            print(f"  aplay start/stop     mean {audio['aplay_overhead']['mean_ms']:.1f} ms"
+                  f" (clip {audio['clip_ms']} ms)")
+
+    for regression in report.get("regressions", []):
+        print(f"\n⚠ {regression['metric']}: {regression['current']} vs baseline "
+              f"{regression['baseline']} ({regression['worse_by']} worse)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dispenser hardware components")
+    parser.add_argument("--simulate", action="store_true",
+                        help="Run against hardware/simulated.py instead of real hardware")
+    parser.add_argument("--only", help=f"Comma-separated sections ({','.join(SECTIONS)})")
+    parser.add_argument("--iterations", type=int, default=20, help="Samples per measurement")
+    parser.add_argument("--steps", type=int, default=50, help="Steps per motor trial")
+    parser.add_argument("--motors", help="Comma-separated motor IDs (default: all)")
+    parser.add_argument("--motor-address", type=lambda v: int(v, 0), default=0x60)
+    parser.add_argument("--ir-pin", type=int, default=25)
+    parser.add_argument("--ir-rate", type=int, default=200, help="IR sampler rate (Hz)")
+    parser.add_argument("--fingerprint-port", default="/dev/serial0")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    parser.add_argument("--baseline", help="Earlier report to flag regressions against")
+    args = parser.parse_args()
+
+    sections = args.only.split(",") if args.only else list(SECTIONS)
+    unknown = set(sections) - set(SECTIONS)
+    if unknown:
+        parser.error(f"Unknown sections: {', '.join(sorted(unknown))}")
+    args.motors = [int(m) for m in args.motors.split(",")] if args.motors else None
+
+    gpio = player = None
+    if args.simulate:
+        from hardware import simulated
+        gpio = simulated.install()
+        player = simulated.SimulatedAudioPlayer()
+        # The fingerprint sensor plays sounds on failures too
+        import hardware.fingerprint_sensor as fingerprint_sensor
+        fingerprint_sensor.AudioPlayer = simulated.SimulatedAudioPlayer
+
+    report = {
+        "unit": socket.gethostname(),
+        "timestamp": datetime.now().isoformat(),
+        "simulated": args.simulate,
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+    }
+
+    runners = {
+        "uart": lambda: bench_uart(args),
+        "motors": lambda: bench_motors(args),
+        "ir": lambda: bench_ir(args, gpio),
+        "audio": lambda: bench_audio(args, player),
+    }
+    for section in sections:
+        if not args.json:
+            print(f"Running {section}...", file=sys.stderr)
+        try:
+            report[section] = runners[section]()
+        except Exception as e:
+            report[section] = None
+            report.setdefault("errors", {})[section] = f"{type(e).__name__}: {e}"
+            print(f"✗ {section} failed: {e}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["regressions"] = compare(report, json.load(f))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,638 @@
+"""
+Fleet-scale load generator for the backend API
+
+Spins up thousands of lightweight virtual dispensers in one asyncio process.
+Each one runs the same protocol as PollingClient: conditional command polls
+with ETags, status uploads through WireEncoder and a heartbeat every 60s.
+Commands are executed by PollingClient's own handlers in a worker thread,
+against simulated hardware with realistic timings, so the statuses and
+progress events match what a real dispenser sends. A controller issues a
+configurable mix of commands to idle devices and measures end-to-end
+latency from issuing a command to receiving its final status.
+
+Usage:
+    python3 tests/load_generator.py http://localhost:3000 --clients 2000 --duration 120
+    python3 tests/load_generator.py http://localhost:3000 --mix dispense=5,check_hand=3 \\
+        --latency-ms 80 --jitter-ms 40 --command-rate 20 --json report.json
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import os
+import random
+import ssl
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import polling_client  # noqa: E402
+from polling_client import PollingClient  # noqa: E402
+from profiling import Profiler  # noqa: E402
+from wire_encoding import WireEncoder, parse_wire_format  # noqa: E402
+
+# Thousands of devices logging every step would flood the terminal
+polling_client.print = lambda *args, **kwargs: None
+
+# Commands the simulated hardware below can run
+SIMULATED_COMMANDS = ("unlock", "lock", "dispense", "unlock_and_dispense",
+                      "register_fingerprint", "check_hand")
+
+DEFAULT_MIX = "unlock_and_dispense=3,check_hand=4,unlock=1,lock=1,dispense=1"
+
+# Simulated hardware timings in seconds (min, max)
+FINGERPRINT_TIME = (0.8, 2.5)
+SCAN_TIME = (1.0, 3.0)
+STEP_TIME = 0.011            # 10ms sleep + I2C write per step
+STEPS_PER_SEGMENT = 13
+HAND_TIME = (1.0, 8.0)
+HAND_TIMEOUT = 30
+
+FINGERPRINT_SUCCESS_RATE = 0.9
+HAND_DETECT_RATE = 0.95
+
+
+class AsyncHTTPConnection:
+    """Minimal keep-alive HTTP/1.1 client on asyncio streams"""
+
+    def __init__(self, base_url, latency=0.0, jitter=0.0):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.https = parts.scheme == "https"
+        self.port = parts.port or (443 if self.https else 80)
+        self.base_path = parts.path.rstrip("/")
+        self.latency = latency
+        self.jitter = jitter
+        self.reader = None
+        self.writer = None
+
+    async def _connect(self):
+        ctx = ssl.create_default_context() if self.https else None
+        self.reader, self.writer = await asyncio.open_connection(
+            self.host, self.port, ssl=ctx, server_hostname=self.host if ctx else None
+        )
+
+    async def _delay(self):
+        # Injected one-way network latency
+        if self.latency or self.jitter:
+            await asyncio.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+    async def close(self):
+        if self.writer:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except (ConnectionError, ssl.SSLError):
+                pass
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body=b"", headers=None, timeout=10):
+        """
+        Send a request, reconnecting once if the kept-alive socket died
+
+        Returns:
+            (status code, lower-cased headers dict, body bytes)
+        """
+        await self._delay()
+        for attempt in (1, 2):
+            try:
+                if self.writer is None:
+                    await self._connect()
+                result = await asyncio.wait_for(self._roundtrip(method, path, body, headers), timeout)
+                await self._delay()
+                return result
+            except (ConnectionError, asyncio.IncompleteReadError):
+                await self.close()
+                if attempt == 2:
+                    raise
+            except BaseException:
+                await self.close()
+                raise
+
+    async def _roundtrip(self, method, path, body, headers):
+        lines = [
+            f"{method} {self.base_path}{path} HTTP/1.1",
+            f"Host: {self.host}",
+            f"Content-Length: {len(body)}",
+        ]
+        for key, value in (headers or {}).items():
+            lines.append(f"{key}: {value}")
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("Connection closed by server")
+        status = int(status_line.split()[1])
+
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            response_headers[key.strip().lower()] = value.strip()
+
+        if status in (204, 304) or method == "HEAD":
+            data = b""
+        elif "content-length" in response_headers:
+            data = await self.reader.readexactly(int(response_headers["content-length"]))
+        elif response_headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await self.reader.readline()
+                    break
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readline()
+            data = b"".join(chunks)
+        else:
+            data = await self.reader.read()
+            response_headers["connection"] = "close"
+
+        if response_headers.get("connection", "").lower() == "close":
+            await self.close()
+
+        return status, response_headers, data
+
+
+class LoadStats:
+    """Counters and latency samples per endpoint and per command type"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.stopped = None
+        self.requests = {}
+        self.errors = {}
+        self.latencies = {}
+        self.command_latencies = {}
+        self.commands_issued = 0
+        self.commands_done = 0
+
+    def stop(self):
+        """End the measurement window; in-flight commands may still complete"""
+        self.stopped = time.monotonic()
+
+    def record(self, endpoint, latency, ok):
+        if self.stopped is not None:
+            return
+        self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+        if not ok:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+        self.latencies.setdefault(endpoint, []).append(latency)
+
+    def record_command(self, command, latency):
+        self.commands_done += 1
+        self.command_latencies.setdefault(command, []).append(latency)
+
+    @staticmethod
+    def percentiles(samples):
+        if not samples:
+            return {}
+        ordered = sorted(samples)
+        pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+        return {
+            "count": len(ordered),
+            "p50_ms": round(pick(0.50) * 1000, 1),
+            "p90_ms": round(pick(0.90) * 1000, 1),
+            "p99_ms": round(pick(0.99) * 1000, 1),
+            "max_ms": round(ordered[-1] * 1000, 1),
+        }
+
+    def report(self):
+        elapsed = (self.stopped or time.monotonic()) - self.started
+        total = sum(self.requests.values())
+        errors = sum(self.errors.values())
+        return {
+            "duration_s": round(elapsed, 1),
+            "requests": total,
+            "request_rate": round(total / elapsed, 1) if elapsed else 0,
+            "error_rate": round(errors / total, 4) if total else 0,
+            "endpoints": {
+                endpoint: {
+                    "rate": round(count / elapsed, 1),
+                    "errors": self.errors.get(endpoint, 0),
+                    **self.percentiles(self.latencies[endpoint]),
+                }
+                for endpoint, count in sorted(self.requests.items())
+            },
+            "commands_issued": self.commands_issued,
+            "commands_completed": self.commands_done,
+            "command_latency": {
+                command: self.percentiles(samples)
+                for command, samples in sorted(self.command_latencies.items())
+            },
+        }
+
+
+def _hardware_wait(seconds, cancel):
+    """Sleep for a simulated hardware wait; True if cancel cut it short"""
+    if cancel is None:
+        time.sleep(seconds)
+        return False
+    return cancel.wait(seconds)
+
+
+class SimulatedFingerprint:
+    """FingerprintSensor stand-in: scan times and match rate, no UART"""
+
+    def __init__(self, user_count):
+        self.user_count = user_count
+
+    def verify_user(self, user_id=None, cancel=None):
+        if _hardware_wait(random.uniform(*FINGERPRINT_TIME), cancel):
+            return {"success": False, "message": "Cancelled", "cancelled": True}
+        if random.random() < FINGERPRINT_SUCCESS_RATE:
+            return {"success": True, "message": "Fingerprint verified", "user_id": user_id or 1}
+        return {"success": False, "message": "Fingerprint not found in database"}
+
+    def add_user(self, cancel=None, on_progress=None):
+        new_id = self.user_count + 1
+        for scan in (1, 2):
+            if _hardware_wait(random.uniform(*SCAN_TIME), cancel):
+                return {"success": False, "message": "Cancelled", "cancelled": True}
+            if on_progress:
+                on_progress(f"scan_{scan}_ok", {"user_id": new_id})
+        self.user_count = new_id
+        return {
+            "success": True,
+            "message": f"Fingerprint registered successfully (ID: {new_id})",
+            "user_id": new_id
+        }
+
+
+class SimulatedMotors:
+    """StepperMotorController stand-in: two carousels, I2C step timing"""
+
+    SEGMENTS = 15
+
+    def __init__(self):
+        self.segments = {1: 0, 2: 0}
+
+    def _rotate(self, motor_id, segment):
+        steps = ((segment - self.segments[motor_id]) % self.SEGMENTS) * STEPS_PER_SEGMENT
+        time.sleep(steps * STEP_TIME)
+        self.segments[motor_id] = segment
+
+    def _check(self, motor_id, segment):
+        if motor_id not in self.segments:
+            return {"success": False, "message": f"Invalid motor ID: {motor_id}"}
+        if not isinstance(segment, int) or not 0 <= segment < self.SEGMENTS:
+            return {"success": False, "message": f"Invalid segment: {segment}"}
+        return None
+
+    def pre_position(self, motor_id, segment):
+        error = self._check(motor_id, segment)
+        if error:
+            return error
+        self._rotate(motor_id, (segment - 1) % self.SEGMENTS)
+        return {"success": True, "message": f"Motor {motor_id}: Pre-positioned"}
+
+    def dispense_pill(self, motor_id, segment):
+        error = self._check(motor_id, segment)
+        if error:
+            return error
+        self._rotate(motor_id, segment)
+        return {"success": True, "message": f"Dispensed from segment {segment}"}
+
+
+class SimulatedInfrared:
+    """InfraredSensor stand-in: a hand usually arrives within a few seconds"""
+
+    def wait_for_hand(self, timeout=30, cancel=None):
+        if random.random() < HAND_DETECT_RATE:
+            return not _hardware_wait(min(random.uniform(*HAND_TIME), timeout), cancel)
+        _hardware_wait(timeout, cancel)
+        return False
+
+    def is_hand_detected(self):
+        return random.random() < 0.2
+
+
+class _NoSampler:
+    running = False
+
+
+class _NoEventLog:
+    def log(self, event, data=None, timestamp=None):
+        pass
+
+
+class VirtualDevice(PollingClient):
+    """
+    PollingClient command handling on simulated hardware
+
+    None of PollingClient's threads, hardware or HTTP session are set up:
+    execute_command() runs the real handlers, and the statuses they send are
+    handed to the owning VirtualClient's event loop.
+    """
+
+    def __init__(self, client, profiler):
+        self.client = client
+        self.device_id = client.device_id
+        self.device_locked = True
+        self.pill_taken_timeout = HAND_TIMEOUT
+        self.fingerprint = SimulatedFingerprint(random.randint(1, 5))
+        self.motors = SimulatedMotors()
+        self.infrared = SimulatedInfrared()
+        self.ir_sampler = _NoSampler()
+        self.events = _NoEventLog()
+        self.profiler = profiler
+        self._cancel = None
+        self._queue_delay_ms = None
+        self._command_id = None
+        # Progress events waiting to go out ahead of the next status
+        self.progress = []
+
+    def emit_progress(self, status_type, data):
+        self.progress.append((status_type, self._with_command_context(data), time.time()))
+
+    def send_status(self, status_type, data):
+        # Like PollingClient, flush progress events before the status
+        statuses, self.progress = self.progress, []
+        statuses.append((status_type, self._with_command_context(data), time.time()))
+        asyncio.run_coroutine_threadsafe(
+            self.client.send_statuses(statuses), self.client.gen.loop
+        ).result()
+
+
+class VirtualClient:
+    """One simulated dispenser speaking the PollingClient protocol"""
+
+    def __init__(self, generator, device_id):
+        self.gen = generator
+        self.device_id = device_id
+        self.http = AsyncHTTPConnection(generator.backend_url, generator.latency, generator.jitter)
+        self.encoder = WireEncoder(generator.wire_format, generator.compression)
+        self.commands_etag = None
+        self.device = VirtualDevice(self, generator.profiler)
+
+    async def _call(self, endpoint, method, path, body=b"", headers=None):
+        start = time.monotonic()
+        try:
+            status, response_headers, data = await self.http.request(method, path, body, headers)
+        except Exception:
+            self.gen.stats.record(endpoint, time.monotonic() - start, False)
+            return None, {}, b""
+        ok = status in (200, 304)
+        self.gen.stats.record(endpoint, time.monotonic() - start, ok)
+        return status, response_headers, data
+
+    async def poll_for_commands(self):
+        headers = {"If-None-Match": self.commands_etag} if self.commands_etag else None
+        status, headers, data = await self._call(
+            "commands", "GET", f"/api/devices/{self.device_id}/commands", headers=headers
+        )
+        if status != 200:
+            return None
+        if headers.get("etag"):
+            self.commands_etag = headers["etag"]
+        command = json.loads(data)
+        return command if command.get("command") else None
+
+    async def send_statuses(self, statuses):
+        """Upload (status_type, data, timestamp) tuples: progress as one batch, then the status"""
+        progress, (status_type, data, timestamp) = statuses[:-1], statuses[-1]
+        path = f"/api/devices/{self.device_id}/status"
+        if progress:
+            payload = self.encoder.batch_payload([
+                self.encoder.status_payload(self.device_id, *event) for event in progress
+            ])
+            body, headers = self.encoder.encode(payload)
+            await self._call("progress", "POST", path, body, headers)
+        payload = self.encoder.status_payload(self.device_id, status_type, data, timestamp)
+        body, headers = self.encoder.encode(payload)
+        await self._call("status", "POST", path, body, headers)
+
+    async def send_heartbeat(self):
+        payload = self.encoder.heartbeat_payload(
+            self.device_id, "10.0.0.1", self.device.device_locked,
+            self.device.fingerprint.user_count
+        )
+        body, headers = self.encoder.encode(payload)
+        await self._call("heartbeat", "POST", f"/api/devices/{self.device_id}/heartbeat", body, headers)
+
+    async def execute_command(self, command):
+        """Run the command through PollingClient's handlers in a worker thread"""
+        await self.gen.loop.run_in_executor(
+            self.gen.executor, self.device.execute_command, command, self.gen.shutdown
+        )
+        self.gen.command_done(self.device_id, command.get("command"))
+
+    async def run(self):
+        # Stagger start-up so clients don't poll in lockstep
+        await asyncio.sleep(random.uniform(0, self.gen.poll_interval))
+        await self.send_heartbeat()
+        next_heartbeat = time.monotonic() + 60
+
+        while self.gen.running:
+            command = await self.poll_for_commands()
+            if command:
+                await self.execute_command(command)
+
+            if time.monotonic() >= next_heartbeat:
+                await self.send_heartbeat()
+                next_heartbeat = time.monotonic() + 60
+
+            await asyncio.sleep(self.gen.poll_interval)
+
+        await self.http.close()
+
+
+class LoadGenerator:
+    """Runs the virtual fleet and the command issuer"""
+
+    def __init__(self, backend_url, clients, duration, poll_interval, mix,
+                 command_rate, latency, jitter, wire_format, compression):
+        self.backend_url = backend_url.rstrip("/")
+        self.num_clients = clients
+        self.duration = duration
+        self.poll_interval = poll_interval
+        self.mix = mix
+        self.command_rate = command_rate
+        self.latency = latency
+        self.jitter = jitter
+        self.wire_format = wire_format
+        self.compression = compression
+
+        self.running = False
+        self.stats = LoadStats()
+        # Shared by every device's handlers; idle, so sections cost nothing
+        self.profiler = Profiler()
+        # One thread per command in progress (they mostly sleep in hardware waits)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=clients)
+        # Cancel event of every command: set at the end to cut hardware waits short
+        self.shutdown = threading.Event()
+        self.loop = None
+        # device_id -> (command, issued at) for commands not yet completed
+        self.outstanding = {}
+
+    def command_done(self, device_id, command):
+        issued = self.outstanding.pop(device_id, None)
+        if issued and issued[0] == command:
+            self.stats.record_command(command, time.monotonic() - issued[1])
+
+    def _random_command(self):
+        names, weights = zip(*self.mix.items())
+        command = random.choices(names, weights)[0]
+        if command == "dispense":
+            return command, {"motor_id": random.randint(1, 2), "segment": random.randint(0, 14)}
+        if command == "unlock_and_dispense":
+            count = random.randint(1, 3)
+            return command, {"dispenses": [
+                {"motor_id": random.randint(1, 2), "segment": random.randint(0, 14)}
+                for _ in range(count)
+            ]}
+        return command, None
+
+    async def issue_commands(self, device_ids):
+        """Post commands to idle devices at the configured rate"""
+        http = AsyncHTTPConnection(self.backend_url)
+        interval = 1.0 / self.command_rate
+
+        while self.running:
+            idle = [d for d in random.sample(device_ids, min(32, len(device_ids)))
+                    if d not in self.outstanding]
+            if idle:
+                device_id = idle[0]
+                command, params = self._random_command()
+                body = json.dumps({"command": command, "params": params}).encode()
+                start = time.monotonic()
+                try:
+                    status, _, _ = await http.request(
+                        "POST", f"/api/devices/{device_id}/commands", body,
+                        {"Content-Type": "application/json"}
+                    )
+                    ok = status == 200
+                except Exception:
+                    ok = False
+                self.stats.record("issue", time.monotonic() - start, ok)
+                if ok:
+                    self.outstanding[device_id] = (command, start)
+                    self.stats.commands_issued += 1
+            await asyncio.sleep(interval)
+
+        await http.close()
+
+    async def progress(self):
+        while self.running:
+            await asyncio.sleep(10)
+            report = self.stats.report()
+            print(f"[{report['duration_s']:>6.0f}s] {report['request_rate']:>8.1f} req/s  "
+                  f"errors {report['error_rate'] * 100:.2f}%  "
+                  f"commands {report['commands_completed']}/{report['commands_issued']}")
+
+    async def run(self):
+        self.running = True
+        self.loop = asyncio.get_running_loop()
+        device_ids = [f"load-{i:05d}" for i in range(self.num_clients)]
+        clients = [VirtualClient(self, device_id) for device_id in device_ids]
+
+        tasks = [asyncio.create_task(client.run()) for client in clients]
+        tasks.append(asyncio.create_task(self.progress()))
+        if self.command_rate > 0:
+            tasks.append(asyncio.create_task(self.issue_commands(device_ids)))
+
+        await asyncio.sleep(self.duration)
+        self.running = False
+        self.stats.stop()
+
+        # Let in-flight cycles finish, then cancel anything still waiting
+        done, pending = await asyncio.wait(tasks, timeout=self.poll_interval + 15)
+        for task in pending:
+            task.cancel()
+        self.shutdown.set()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+        return self.stats.report()
+
+
+def parse_mix(spec):
+    """Parse "dispense=5,check_hand=3" into a weights dict"""
+    mix = {}
+    for item in spec.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in SIMULATED_COMMANDS:
+            raise ValueError(f"--mix: {name!r} can't be simulated "
+                             f"(choose from {', '.join(SIMULATED_COMMANDS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def raise_fd_limit():
+    """Each virtual client holds a socket, so lift the soft open-files limit"""
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        return hard
+    except (ImportError, ValueError, OSError):
+        return None
+
+
+def print_report(report):
+    print(f"\n{'='*70}")
+    print(f"Duration: {report['duration_s']}s  Requests: {report['requests']}  "
+          f"Rate: {report['request_rate']} req/s  Error rate: {report['error_rate'] * 100:.2f}%")
+    print(f"\n{'endpoint':<12} {'req/s':>8} {'errors':>7} {'p50 ms':>8} {'p90 ms':>8} "
+          f"{'p99 ms':>8} {'max ms':>8}")
+    for endpoint, s in report["endpoints"].items():
+        print(f"{endpoint:<12} {s['rate']:>8} {s['errors']:>7} {s.get('p50_ms', '-'):>8} "
+              f"{s.get('p90_ms', '-'):>8} {s.get('p99_ms', '-'):>8} {s.get('max_ms', '-'):>8}")
+
+    print(f"\nCommands: {report['commands_completed']} completed / {report['commands_issued']} issued")
+    print(f"{'command':<22} {'count':>6} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for command, s in report["command_latency"].items():
+        print(f"{command:<22} {s['count']:>6} {s['p50_ms']:>9} {s['p90_ms']:>9} "
+              f"{s['p99_ms']:>9} {s['max_ms']:>9}")
+    print(f"{'='*70}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fleet-scale load generator for the RITA backend")
+    parser.add_argument("backend_url", help="Backend base URL")
+    parser.add_argument("--clients", type=int, default=1000, help="Virtual dispensers (default: 1000)")
+    parser.add_argument("--duration", type=float, default=60, help="Test length in seconds (default: 60)")
+    parser.add_argument("--poll-interval", type=float, default=5, help="Seconds between polls (default: 5)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Command weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--command-rate", type=float, default=5,
+                        help="Commands issued per second across the fleet (default: 5)")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Injected one-way latency")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Random +/- latency jitter")
+    parser.add_argument("--wire-format", default="json", help="Upload encoding (default: json)")
+    parser.add_argument("--json", metavar="PATH", help="Also write the report as JSON")
+    args = parser.parse_args()
+
+    try:
+        wire_format, compression = parse_wire_format(args.wire_format)
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    limit = raise_fd_limit()
+    if limit is not None and limit < args.clients + 100:
+        print(f"⚠ Open file limit is {limit}, some of the {args.clients} clients will fail to connect")
+
+    generator = LoadGenerator(
+        args.backend_url, args.clients, args.duration, args.poll_interval, mix,
+        args.command_rate, args.latency_ms / 1000, args.jitter_ms / 1000,
+        wire_format, compression
+    )
+    print(f"Starting {args.clients} virtual clients against {args.backend_url} for {args.duration:.0f}s...")
+    report = asyncio.run(generator.run())
+    print_report(report)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✓ Report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
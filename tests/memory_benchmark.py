@@ -0,0 +1,197 @@
+"""
+Memory benchmark for Pi Zero class deployments
+
+Runs the network side of the polling client in a fresh process per mode
+(standard: requests; lean: polling_client.py --lean) against the reference
+backend and reports:
+
+    import RSS      - resident memory after importing and creating the client
+    steady RSS      - resident memory after the idle polls
+    KiB per poll    - peak memory allocated while one idle (304) poll runs
+    retained B/poll - memory still held after each poll (should be ~0),
+                      measured over the second half of the polls so one-off
+                      allocations in the first ones (caches, dict growth)
+                      don't count
+
+The client is created as it runs next to the hardware daemon
+(--hardware-socket), so no hardware stack is imported; with --simulate it
+drives simulated local hardware instead.
+
+The lean numbers are checked against a budget; the exit code is 1 when
+any is over it, so the benchmark can gate changes.
+
+Usage:
+    python3 tests/memory_benchmark.py [--polls 200] [--simulate] [--json]
+                                      [--budget-rss-mb 26] [--budget-poll-kib 16]
+                                      [--budget-retained-bytes 32]
+"""
+
+import argparse
+import array
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, ROOT)
+
+MODES = ("standard", "lean")
+WARMUP_POLLS = 10
+# Fewer polls than this leave too few in the retained-memory window
+MIN_POLLS = 50
+
+
+def _rss_kib(field="VmRSS"):
+    with open("/proc/self/status") as f:
+        return int(re.search(rf"{field}:\s+(\d+)", f.read()).group(1))
+
+
+def run_child(mode, backend_url, polls, simulate):
+    """Measure one mode in this (fresh) process and print the result as JSON"""
+    import tracemalloc
+
+    start_rss = _rss_kib()
+    if simulate:
+        from hardware import simulated
+        simulated.install()
+    import polling_client
+
+    client = polling_client.PollingClient(
+        backend_url, f"mem-{mode}", lean=(mode == "lean"),
+        hardware_socket=None if simulate else "/nonexistent/rita-hardware.sock",
+    )
+    import_rss = _rss_kib()
+
+    for _ in range(WARMUP_POLLS):
+        client.poll_for_commands()
+
+    # Preallocated so recording a result doesn't count as retained memory
+    peaks = array.array("q", bytes(8 * polls))
+    half = polls // 2
+    tracemalloc.start()
+    started = time.perf_counter()
+    for i in range(polls):
+        if i == half:
+            before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        client.poll_for_commands()
+        _, peak = tracemalloc.get_traced_memory()
+        peaks[i] = peak - base
+    elapsed = time.perf_counter() - started
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(json.dumps({
+        "mode": mode,
+        "start_rss_mib": round(start_rss / 1024, 1),
+        "import_rss_mib": round(import_rss / 1024, 1),
+        "steady_rss_mib": round(_rss_kib() / 1024, 1),
+        "peak_rss_mib": round(_rss_kib("VmHWM") / 1024, 1),
+        "poll_kib": round(sum(peaks) / len(peaks) / 1024, 1),
+        "poll_kib_max": round(max(peaks) / 1024, 1),
+        "retained_bytes_per_poll": round((after - before) / (polls - half), 1),
+        "poll_ms": round(elapsed / polls * 1000, 2),
+    }))
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_backend():
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "backend.server", "--port", str(port), "--db", ":memory:"],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return server, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.1)
+    server.terminate()
+    raise SystemExit("✗ Reference backend did not start")
+
+
+def check_budget(lean, args):
+    """Budget violations of the lean run, as messages"""
+    failures = []
+    if lean["steady_rss_mib"] > args.budget_rss_mb:
+        failures.append(f"steady RSS {lean['steady_rss_mib']} MiB > {args.budget_rss_mb} MiB")
+    if lean["poll_kib"] > args.budget_poll_kib:
+        failures.append(f"{lean['poll_kib']} KiB per poll > {args.budget_poll_kib} KiB")
+    if lean["retained_bytes_per_poll"] > args.budget_retained_bytes:
+        failures.append(f"{lean['retained_bytes_per_poll']} B retained per poll "
+                        f"> {args.budget_retained_bytes} B")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RITA client memory benchmark")
+    parser.add_argument("--polls", type=int, default=200,
+                        help="Measured polls per mode (at least 50)")
+    parser.add_argument("--backend", help="Backend URL (default: start the reference backend)")
+    parser.add_argument("--simulate", action="store_true",
+                        help="Create simulated local hardware instead of daemon proxies")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    parser.add_argument("--budget-rss-mb", type=float, default=26)
+    parser.add_argument("--budget-poll-kib", type=float, default=16)
+    parser.add_argument("--budget-retained-bytes", type=float, default=32)
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.polls < MIN_POLLS:
+        parser.error(f"--polls must be at least {MIN_POLLS}")
+
+    if args.child:
+        run_child(args.child, args.backend, args.polls, args.simulate)
+        return
+
+    server = None
+    backend_url = args.backend
+    if not backend_url:
+        server, backend_url = _start_backend()
+
+    results = {}
+    try:
+        for mode in MODES:
+            command = [sys.executable, __file__, "--child", mode, "--backend", backend_url,
+                       "--polls", str(args.polls)]
+            if args.simulate:
+                command.append("--simulate")
+            output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+            results[mode] = json.loads(output.strip().splitlines()[-1])
+    finally:
+        if server:
+            server.terminate()
+
+    failures = check_budget(results["lean"], args)
+    report = {"polls": args.polls, "results": results, "budget_failures": failures}
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{'mode':<10} {'import RSS':>11} {'steady RSS':>11} {'KiB/poll':>9} "
+              f"{'max KiB':>8} {'retained B':>11} {'ms/poll':>8}")
+        for mode, r in results.items():
+            print(f"{mode:<10} {r['import_rss_mib']:>9} M {r['steady_rss_mib']:>9} M "
+                  f"{r['poll_kib']:>9} {r['poll_kib_max']:>8} "
+                  f"{r['retained_bytes_per_poll']:>11} {r['poll_ms']:>8}")
+        for failure in failures:
+            print(f"✗ Over budget: {failure}")
+        if not failures:
+            print("✓ Lean mode within budget")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Wire encoding benchmark
+
+Compares the current verbose JSON uploads with the compact encodings in
+wire_encoding.py. For a typical status, a heartbeat and a batch of 50
+statuses it reports bytes on the wire (body + content headers) and encode
+CPU time per event.
+
+Usage: python3 tests/wire_encoding_benchmark.py [iterations]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from wire_encoding import WireEncoder, available_formats, JSON  # noqa: E402
+
+DEVICE_ID = "pi-001"
+BATCH_SIZE = 50
+
+STATUS = ("pill_taken", {"motor_id": 1, "segment": 5, "taken": True})
+HEARTBEAT = ("192.168.1.50", True, 3)
+
+
+def wire_bytes(body, headers):
+    """Body size plus the Content-* header lines it needs"""
+    header_bytes = sum(len(f"{k}: {v}\r\n") for k, v in headers.items())
+    return len(body) + header_bytes
+
+
+def measure(encoder, build, events, iterations):
+    """Return (bytes per event, encode microseconds per event)"""
+    body, headers = encoder.encode(build())
+    size = wire_bytes(body, headers) / events
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        encoder.encode(build())
+    elapsed = time.perf_counter() - start
+    return size, elapsed / iterations / events * 1e6
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    formats, compressions = available_formats()
+    now = time.time()
+
+    variants = [(fmt, None) for fmt in formats]
+    variants += [(fmt, comp) for fmt in formats for comp in compressions]
+
+    print(f"{'encoding':<14} {'status B':>9} {'hb B':>6} {'batch B/ev':>11} "
+          f"{'status us':>10} {'batch us/ev':>12}")
+
+    baseline = None
+    for fmt, comp in variants:
+        # Compress everything that crosses the threshold, i.e. batches
+        encoder = WireEncoder(fmt, comp)
+
+        def status():
+            return encoder.status_payload(DEVICE_ID, STATUS[0], STATUS[1], now)
+
+        def heartbeat():
+            return encoder.heartbeat_payload(DEVICE_ID, *HEARTBEAT, timestamp=now)
+
+        def batch():
+            return encoder.batch_payload([
+                encoder.status_payload(DEVICE_ID, STATUS[0], STATUS[1], now + i)
+                for i in range(BATCH_SIZE)
+            ])
+
+        status_b, status_us = measure(encoder, status, 1, iterations)
+        hb_b, _ = measure(encoder, heartbeat, 1, iterations)
+        batch_b, batch_us = measure(encoder, batch, BATCH_SIZE, max(iterations // BATCH_SIZE, 10))
+
+        name = fmt + (f"+{comp}" if comp else "")
+        print(f"{name:<14} {status_b:>9.0f} {hb_b:>6.0f} {batch_b:>11.1f} "
+              f"{status_us:>10.1f} {batch_us:>12.2f}")
+
+        if fmt == JSON and comp is None:
+            baseline = (status_b, batch_b)
+
+    print(f"\nBaseline (current JSON): {baseline[0]:.0f} B per status, "
+          f"{baseline[1]:.1f} B per batched event")
+    print("Single statuses below the compression threshold are sent uncompressed.")
+
+
+if __name__ == "__main__":
+    main()
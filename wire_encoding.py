@@ -0,0 +1,325 @@
+"""
+Wire Encoding for status and heartbeat uploads
+Optional compact binary encoding (MessagePack / CBOR) with gzip or zstd
+compression for metered links
+
+JSON bodies keep the original verbose schema. Binary bodies use the compact
+schema below and are sent with a matching Content-Type, so the backend knows
+how to expand them:
+
+    status:    {"t": status_type, "ts": epoch_ms, "d": data}
+    heartbeat: {"ts": epoch_ms, "ip": ip_address, "l": locked, "fc": fingerprint_count}
+    batch:     {"b": [status, status, ...]}
+
+device_id is never repeated in binary bodies (it is already in the URL).
+"""
+
+import gzip
+import io
+import json
+import time
+import zlib
+from datetime import datetime
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+JSON = "json"
+MSGPACK = "msgpack"
+CBOR = "cbor"
+
+CONTENT_TYPES = {
+    JSON: "application/json",
+    MSGPACK: "application/msgpack",
+    CBOR: "application/cbor",
+}
+
+GZIP = "gzip"
+ZSTD = "zstd"
+
+# Largest body decode_body will decompress to: a gzip or zstd bomb fails
+# instead of filling memory
+MAX_DECODED_BYTES = 8 * 1024 * 1024
+
+# Bodies smaller than this are sent uncompressed: gzip/zstd framing costs
+# more than it saves on a single small status
+COMPRESS_MIN_BYTES = 256
+
+
+def available_formats():
+    """Formats and compressions usable with the installed packages"""
+    formats = [JSON]
+    if msgpack is not None:
+        formats.append(MSGPACK)
+    if cbor2 is not None:
+        formats.append(CBOR)
+    compressions = [GZIP]
+    if zstandard is not None:
+        compressions.append(ZSTD)
+    return formats, compressions
+
+
+def parse_wire_format(spec):
+    """
+    Parse a CLI wire format such as "json", "msgpack" or "msgpack+gzip"
+
+    Returns:
+        (format, compression) tuple, compression may be None
+    """
+    parts = spec.lower().split("+")
+    fmt = parts[0]
+    compression = parts[1] if len(parts) > 1 else None
+
+    if fmt not in CONTENT_TYPES:
+        raise ValueError(f"Unknown wire format: {fmt}")
+    if compression not in (None, GZIP, ZSTD):
+        raise ValueError(f"Unknown compression: {compression}")
+    return fmt, compression
+
+
+class WireEncoder:
+    """Builds request bodies and headers for status/heartbeat uploads"""
+
+    def __init__(self, fmt=JSON, compression=None, compress_min_bytes=COMPRESS_MIN_BYTES):
+        """
+        Initialize encoder
+
+        Args:
+            fmt: "json", "msgpack" or "cbor"
+            compression: None, "gzip" or "zstd"
+            compress_min_bytes: Only compress bodies at least this large
+
+        Formats or compressions whose package is not installed fall back
+        to JSON / gzip with a warning.
+        """
+        if fmt == MSGPACK and msgpack is None:
+            print("⚠ msgpack not installed, using JSON")
+            fmt = JSON
+        if fmt == CBOR and cbor2 is None:
+            print("⚠ cbor2 not installed, using JSON")
+            fmt = JSON
+        if compression == ZSTD and zstandard is None:
+            print("⚠ zstandard not installed, using gzip")
+            compression = GZIP
+
+        self.format = fmt
+        self.compression = compression
+        self.compress_min_bytes = compress_min_bytes
+        self._zstd = zstandard.ZstdCompressor(level=3) if compression == ZSTD else None
+        # Built once instead of per upload (json.dumps with arguments
+        # constructs a new encoder on every call)
+        self._json = json.JSONEncoder(separators=(",", ":"))
+        self._set_headers()
+
+    def _set_headers(self):
+        """Header dicts shared by every upload; callers must not modify them"""
+        content_type = {"Content-Type": CONTENT_TYPES[self.format]}
+        self._headers = content_type
+        self._compressed_headers = {**content_type, "Content-Encoding": self.compression}
+
+    @property
+    def is_compact(self):
+        return self.format != JSON
+
+    @property
+    def is_plain(self):
+        """Uncompressed JSON, which every backend accepts"""
+        return self.format == JSON and self.compression is None
+
+    def use_json(self):
+        """Fall back to plain JSON (e.g. after the backend answers 415)"""
+        print("⚠ Backend rejected the upload encoding, falling back to plain JSON")
+        self.format = JSON
+        self.compression = None
+        self._zstd = None
+        self._set_headers()
+
+    def status_payload(self, device_id, status_type, data, timestamp=None):
+        """Status payload in the schema matching the current format"""
+        timestamp = timestamp if timestamp is not None else time.time()
+        if self.is_compact:
+            return {"t": status_type, "ts": int(timestamp * 1000), "d": data}
+        return {
+            "device_id": device_id,
+            "status_type": status_type,
+            "timestamp": datetime.fromtimestamp(timestamp).isoformat(),
+            "data": data
+        }
+
+    def heartbeat_payload(self, device_id, ip_address, locked, fingerprint_count, timestamp=None):
+        """Heartbeat payload in the schema matching the current format"""
+        timestamp = timestamp if timestamp is not None else time.time()
+        if self.is_compact:
+            return {
+                "ts": int(timestamp * 1000),
+                "ip": ip_address,
+                "l": locked,
+                "fc": fingerprint_count
+            }
+        return {
+            "device_id": device_id,
+            "timestamp": datetime.fromtimestamp(timestamp).isoformat(),
+            "ip_address": ip_address,
+            "locked": locked,
+            "fingerprint_count": fingerprint_count
+        }
+
+    def batch_payload(self, statuses):
+        """Wrap a list of status payloads for a single upload"""
+        if self.is_compact:
+            return {"b": statuses}
+        return statuses
+
+    def encode(self, payload):
+        """
+        Serialize (and maybe compress) a payload
+
+        Returns:
+            (body bytes, headers dict) - the headers dict is shared between
+            calls, copy it before changing it
+        """
+        if self.format == MSGPACK:
+            body = msgpack.packb(payload, use_bin_type=True)
+        elif self.format == CBOR:
+            body = cbor2.dumps(payload)
+        else:
+            body = self._json.encode(payload).encode()
+
+        if self.compression and len(body) >= self.compress_min_bytes:
+            if self.compression == ZSTD:
+                body = self._zstd.compress(body)
+            else:
+                body = gzip.compress(body, compresslevel=6)
+            return body, self._compressed_headers
+
+        return body, self._headers
+
+
+class UnsupportedEncoding(ValueError):
+    """Body uses a content type or encoding this side can't decode"""
+
+
+class BodyTooLarge(ValueError):
+    """Body decompresses to more than the allowed size"""
+
+
+def gunzip(data, max_size=MAX_DECODED_BYTES):
+    """
+    Decompress gzip data, never producing more than max_size bytes
+
+    Raises:
+        BodyTooLarge: the data expands beyond max_size
+        ValueError: not gzip, or truncated
+    """
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    try:
+        data = decompressor.decompress(data, max_size + 1)
+    except zlib.error as e:
+        raise ValueError(f"Invalid gzip data: {e}")
+    if len(data) > max_size:
+        raise BodyTooLarge(f"Body expands to more than {max_size} bytes")
+    if not decompressor.eof:
+        raise ValueError("Truncated gzip data")
+    return data
+
+
+def unzstd(data, max_size=MAX_DECODED_BYTES):
+    """
+    Decompress zstd data, never producing more than max_size bytes
+
+    Raises:
+        UnsupportedEncoding: zstandard is not installed
+        BodyTooLarge: the data expands beyond max_size
+    """
+    if zstandard is None:
+        raise UnsupportedEncoding("zstd bodies need the zstandard package")
+    try:
+        with zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data)) as reader:
+            data = reader.read(max_size + 1)
+    except zstandard.ZstdError as e:
+        raise ValueError(f"Invalid zstd data: {e}")
+    if len(data) > max_size:
+        raise BodyTooLarge(f"Body expands to more than {max_size} bytes")
+    return data
+
+
+def decode_body(body, content_type=None, content_encoding=None, max_size=MAX_DECODED_BYTES):
+    """
+    Decode a request body produced by WireEncoder.encode
+
+    Args:
+        body: Raw request bytes
+        content_type: Content-Type header (default: application/json)
+        content_encoding: Content-Encoding header (default: identity)
+        max_size: Most bytes a compressed body may expand to
+
+    Raises:
+        UnsupportedEncoding: for unknown or uninstalled formats
+        BodyTooLarge: a compressed body expands beyond max_size
+        ValueError: for malformed bodies
+    """
+    content_type = (content_type or CONTENT_TYPES[JSON]).split(";")[0].strip().lower()
+    content_encoding = (content_encoding or "identity").strip().lower()
+
+    if content_encoding == GZIP:
+        body = gunzip(body, max_size)
+    elif content_encoding == ZSTD:
+        body = unzstd(body, max_size)
+    elif content_encoding != "identity":
+        raise UnsupportedEncoding(f"Unsupported content encoding: {content_encoding}")
+
+    if content_type == CONTENT_TYPES[JSON]:
+        return json.loads(body)
+    if content_type == CONTENT_TYPES[MSGPACK]:
+        if msgpack is None:
+            raise UnsupportedEncoding("msgpack bodies need the msgpack package")
+        return msgpack.unpackb(body, raw=False)
+    if content_type == CONTENT_TYPES[CBOR]:
+        if cbor2 is None:
+            raise UnsupportedEncoding("cbor bodies need the cbor2 package")
+        return cbor2.loads(body)
+    raise UnsupportedEncoding(f"Unsupported content type: {content_type}")
+
+
+def _iso_from_millis(ts):
+    return datetime.fromtimestamp(ts / 1000).isoformat() if isinstance(ts, (int, float)) else None
+
+
+def expand_statuses(payload):
+    """Decoded status body (single, batch or compact) -> list of verbose statuses"""
+    if isinstance(payload, list):
+        return payload
+    if isinstance(payload, dict) and isinstance(payload.get("b"), list):
+        return [expand_statuses(item)[0] for item in payload["b"]]
+    if isinstance(payload, dict) and "t" in payload:
+        return [{
+            "status_type": payload["t"],
+            "timestamp": _iso_from_millis(payload.get("ts")),
+            "data": payload.get("d") or {}
+        }]
+    return [payload]
+
+
+def expand_heartbeat(payload):
+    """Decoded heartbeat body (verbose or compact) -> verbose heartbeat"""
+    if isinstance(payload, dict) and "ts" in payload:
+        return {
+            "timestamp": _iso_from_millis(payload["ts"]),
+            "ip_address": payload.get("ip"),
+            "locked": payload.get("l"),
+            "fingerprint_count": payload.get("fc")
+        }
+    return payload